@@ -4,10 +4,14 @@ Git MCP Server for ChatAgent
 Provides git operations through MCP protocol
 """
 
+import atexit
 import json
 import subprocess
 import os
-from flask import Flask, request, jsonify
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 
 app = Flask(__name__)
@@ -16,6 +20,16 @@ CORS(app)
 # Git repository path (current project)
 REPO_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
+# Requests of a JSON-RPC batch run on this many threads; 1 runs them one after another
+BATCH_WORKERS = int(os.environ.get('MCP_BATCH_WORKERS', '4'))
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS) if BATCH_WORKERS > 1 else None
+
+# git_show_files returns at most this many bytes of each file
+MAX_FILE_BYTES = int(os.environ.get('MCP_MAX_FILE_BYTES', str(256 * 1024)))
+
+# A git_show_files request gives up after this many seconds, like the longest git commands
+CAT_FILE_TIMEOUT = 30
+
 def execute_git_command(*args, timeout=10):
     """Execute git command and return output"""
     try:
@@ -59,17 +73,218 @@ def execute_git_command(*args, timeout=10):
             'error': str(e)
         }
 
+class CatFileBatch:
+    """
+    Long-lived `git cat-file --batch` process for reading many files at once
+    Files are read one after another over its stdin/stdout instead of one
+    `git show` process each; requests share the process under a lock and
+    a new one is started if it exits. A request that runs past its timeout
+    kills the process, so a stalled read cannot hold the lock forever
+    """
+
+    command = ['git', 'cat-file', '--batch']
+
+    def __init__(self, repo_path, timeout=CAT_FILE_TIMEOUT):
+        self.repo_path = repo_path
+        self.timeout = timeout
+        self.process = None
+        self.lock = threading.Lock()
+
+    def _ensure_process(self):
+        if self.process is None or self.process.poll() is not None:
+            print(f"[DEBUG] Starting: {' '.join(self.command)}")
+            self.process = subprocess.Popen(
+                self.command,
+                cwd=self.repo_path,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL
+            )
+        return self.process
+
+    def close(self):
+        """Stops the process; the next request starts a new one"""
+        if self.process is not None:
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=5)
+            except Exception:
+                self.process.kill()
+                self.process.wait()
+            self.process = None
+
+    def _request(self, process, name, max_bytes):
+        """
+        Sends one object name; returns (object id, type, size, first max_bytes bytes)
+        or (None, None, 0, b'') if the object does not exist
+        """
+        process.stdin.write(name.encode('utf-8') + b'\n')
+        process.stdin.flush()
+
+        header = process.stdout.readline()
+        if not header:
+            raise EOFError("git cat-file exited")
+        header = header.decode('utf-8', 'replace').rstrip('\n')
+        # "<name> missing" / "<name> ambiguous" echo the name, which may contain spaces
+        if header.endswith((' missing', ' ambiguous')):
+            return None, None, 0, b''
+
+        # "<object id> <type> <size>"
+        object_id, object_type, size = header.split(' ')
+        size = int(size)
+        data = process.stdout.read(min(size, max_bytes))
+        # Skip the rest of the object and its trailing newline
+        remaining = size - len(data) + 1
+        while remaining > 0:
+            skipped = process.stdout.read(min(remaining, 65536))
+            if not skipped:
+                raise EOFError("git cat-file exited")
+            remaining -= len(skipped)
+        return object_id, object_type, size, data
+
+    def _read_files(self, process, commit, filepaths, max_bytes):
+        # Resolve the commit once so every file comes from the same commit
+        commit_id, object_type, _, _ = self._request(process, f"{commit}^{{commit}}", 0)
+        if object_type != 'commit':
+            return {'success': False, 'output': '', 'error': f"Unknown commit: {commit}"}
+
+        files = []
+        for filepath in filepaths:
+            _, object_type, size, data = self._request(process, f"{commit_id}:{filepath}", max_bytes)
+            entry = {'path': filepath, 'content': None, 'size': size, 'truncated': False, 'error': None}
+            if object_type is None:
+                entry['error'] = 'Not found'
+            elif object_type != 'blob':
+                entry['error'] = f"Not a file: {object_type}"
+            elif b'\0' in data[:8000]:
+                entry['error'] = 'Binary file'
+            else:
+                entry['content'] = data.decode('utf-8', 'replace')
+                entry['truncated'] = len(data) < size
+            files.append(entry)
+
+        print(f"[DEBUG] cat-file: {len(files)} files at {commit_id[:12]}")
+        return {
+            'success': True,
+            'output': json.dumps({'commit': commit_id, 'files': files}),
+            'error': None
+        }
+
+    def _read_files_until(self, deadline, commit, filepaths, max_bytes):
+        """Runs _read_files; a watchdog kills the process at deadline, which raises TimeoutError"""
+        process = self._ensure_process()
+        expired = threading.Event()
+
+        def kill():
+            expired.set()
+            process.kill()
+
+        watchdog = threading.Timer(max(0.0, deadline - time.monotonic()), kill)
+        watchdog.daemon = True
+        watchdog.start()
+        try:
+            return self._read_files(process, commit, filepaths, max_bytes)
+        except (OSError, EOFError, ValueError):
+            # Killed mid-read: the pipe is closed under the reader
+            if expired.is_set():
+                raise TimeoutError("git cat-file timeout")
+            raise
+        finally:
+            watchdog.cancel()
+
+    def read_files(self, commit, filepaths, max_bytes=MAX_FILE_BYTES):
+        """
+        Reads filepaths at commit, each capped at max_bytes
+        Returns an execute_git_command-style result whose output is JSON:
+        {"commit": ..., "files": [{"path", "content", "size", "truncated", "error"}, ...]}
+        """
+        if '\n' in commit or any('\n' in filepath for filepath in filepaths):
+            return {'success': False, 'output': '', 'error': 'Newlines are not allowed in commit or paths'}
+
+        with self.lock:
+            deadline = time.monotonic() + self.timeout
+            try:
+                return self._read_files_until(deadline, commit, filepaths, max_bytes)
+            except TimeoutError:
+                self.close()
+                return {'success': False, 'output': '', 'error': 'Command timeout'}
+            except (OSError, EOFError, ValueError) as e:
+                # The process died or the stream is out of sync; retry once with a new one
+                print(f"[DEBUG] git cat-file failed ({e}), restarting")
+                self.close()
+                try:
+                    return self._read_files_until(deadline, commit, filepaths, max_bytes)
+                except TimeoutError:
+                    self.close()
+                    return {'success': False, 'output': '', 'error': 'Command timeout'}
+                except (OSError, EOFError, ValueError) as e:
+                    self.close()
+                    return {'success': False, 'output': '', 'error': str(e)}
+
+
+cat_file = CatFileBatch(REPO_PATH)
+atexit.register(cat_file.close)
+
+
 @app.route('/', methods=['POST'])
 def handle_mcp_request():
-    """Handle MCP JSON-RPC requests"""
-    data = request.json
+    """
+    Handle MCP JSON-RPC requests
+    A JSON array is a JSON-RPC 2.0 batch: its requests run concurrently and
+    the responses come back in one array, in request order, matched by id
+    """
+    data = request.get_json(silent=True)
+
+    if data is None:
+        return jsonify(rpc_error(None, -32700, "Parse error")), 400
+
+    if not isinstance(data, list):
+        response, status = process_request(data)
+        return jsonify(response), status
+
+    if not data:
+        return jsonify(rpc_error(None, -32600, "Invalid Request: empty batch")), 400
+
+    print(f"[MCP] Batch of {len(data)} requests")
+    if batch_executor is not None and len(data) > 1:
+        results = list(batch_executor.map(process_request, data))
+    else:
+        results = [process_request(item) for item in data]
+
+    # Notifications (requests without an id) get no response
+    responses = [
+        response for item, (response, _) in zip(data, results)
+        if not isinstance(item, dict) or 'id' in item
+    ]
+    if not responses:
+        return Response(status=204)
+    return jsonify(responses)
+
+
+def rpc_error(request_id, code, message):
+    """JSON-RPC error response"""
+    return {
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "error": {
+            "code": code,
+            "message": message
+        }
+    }
+
+
+def process_request(data):
+    """Handles one JSON-RPC request; returns (response, HTTP status)"""
+    if not isinstance(data, dict):
+        return rpc_error(None, -32600, "Invalid Request"), 400
+
     method = data.get('method')
     request_id = data.get('id')
 
     print(f"[MCP] Received: {method}")
 
     if method == 'initialize':
-        return jsonify({
+        return {
             "jsonrpc": "2.0",
             "id": request_id,
             "result": {
@@ -82,10 +297,10 @@ def handle_mcp_request():
                     "tools": {}
                 }
             }
-        })
+        }, 200
 
     elif method == 'tools/list':
-        return jsonify({
+        return {
             "jsonrpc": "2.0",
             "id": request_id,
             "result": {
@@ -228,6 +443,30 @@ def handle_mcp_request():
                             "required": ["commit", "filepath"]
                         }
                     },
+                    {
+                        "name": "git_show_files",
+                        "description": "Show the content of many files at one commit (JSON, each file capped at max_bytes)",
+                        "inputSchema": {
+                            "type": "object",
+                            "properties": {
+                                "commit": {
+                                    "type": "string",
+                                    "description": "Commit reference"
+                                },
+                                "filepaths": {
+                                    "type": "array",
+                                    "items": {"type": "string"},
+                                    "description": "Paths to files"
+                                },
+                                "max_bytes": {
+                                    "type": "number",
+                                    "description": f"Bytes returned per file at most (default and limit: {MAX_FILE_BYTES})",
+                                    "default": MAX_FILE_BYTES
+                                }
+                            },
+                            "required": ["commit", "filepaths"]
+                        }
+                    },
                     {
                         "name": "git_pr_context",
                         "description": "Get PR context metadata (commit count, merge base, etc.)",
@@ -248,7 +487,7 @@ def handle_mcp_request():
                     }
                 ]
             }
-        })
+        }, 200
 
     elif method == 'tools/call':
         params = data.get('params', {})
@@ -282,14 +521,7 @@ def handle_mcp_request():
 
             # Security: only allow git commands
             if command != 'git':
-                return jsonify({
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "error": {
-                        "code": -32000,
-                        "message": f'Only git commands are allowed. Got: {command}'
-                    }
-                })
+                return rpc_error(request_id, -32000, f'Only git commands are allowed. Got: {command}'), 200
 
             result = execute_git_command(*args)
 
@@ -315,6 +547,19 @@ def handle_mcp_request():
 
             result = execute_git_command('show', f'{commit}:{filepath}')
 
+        elif tool_name == 'git_show_files':
+            commit = arguments.get('commit')
+            filepaths = arguments.get('filepaths', [])
+            max_bytes = arguments.get('max_bytes', MAX_FILE_BYTES)
+
+            if (not commit or not isinstance(filepaths, list) or not all(isinstance(f, str) for f in filepaths)
+                    or not isinstance(max_bytes, (int, float))):
+                return rpc_error(request_id, -32602, 'Invalid params: commit, a list of filepaths and a numeric max_bytes are required'), 200
+
+            # Never above the server cap
+            max_bytes = max(0, min(int(max_bytes), MAX_FILE_BYTES))
+            result = cat_file.read_files(commit, filepaths, max_bytes)
+
         elif tool_name == 'git_pr_context':
             base_branch = arguments.get('base_branch')
             head_branch = arguments.get('head_branch')
@@ -349,14 +594,7 @@ def handle_mcp_request():
                 }
 
         else:
-            return jsonify({
-                "jsonrpc": "2.0",
-                "id": request_id,
-                "error": {
-                    "code": -32000,
-                    "message": f'Unknown tool: {tool_name}'
-                }
-            })
+            return rpc_error(request_id, -32000, f'Unknown tool: {tool_name}'), 200
 
         # Format response
         if result['success']:
@@ -367,7 +605,7 @@ def handle_mcp_request():
 
         print(f"[Tool] Result: {response_text[:200]}...")
 
-        return jsonify({
+        return {
             "jsonrpc": "2.0",
             "id": request_id,
             "result": {
@@ -376,16 +614,9 @@ def handle_mcp_request():
                     "text": response_text
                 }]
             }
-        })
+        }, 200
 
-    return jsonify({
-        "jsonrpc": "2.0",
-        "id": request_id,
-        "error": {
-            "code": -32601,
-            "message": f"Method not found: {method}"
-        }
-    }), 404
+    return rpc_error(request_id, -32601, f"Method not found: {method}"), 404
 
 @app.route('/health', methods=['GET'])
 def health():
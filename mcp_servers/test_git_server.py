@@ -3,8 +3,13 @@
 Test Git MCP Server
 """
 
-import requests
 import json
+import os
+import subprocess
+import tempfile
+import time
+
+import requests
 
 BASE_URL = "http://localhost:3002"
 
@@ -134,6 +139,106 @@ def test_execute_command():
         print(data['content'][0]['text'])
     print()
 
+def test_batch():
+    """Test JSON-RPC batch"""
+    print("=" * 60)
+    print("Testing JSON-RPC Batch")
+    print("=" * 60)
+
+    batch = [
+        {"jsonrpc": "2.0", "id": 1, "method": "tools/call", "params": {"name": "git_current_branch", "arguments": {}}},
+        {"jsonrpc": "2.0", "id": 2, "method": "tools/call", "params": {"name": "git_log", "arguments": {"count": 3}}},
+        {"jsonrpc": "2.0", "id": 3, "method": "tools/call", "params": {"name": "git_remote", "arguments": {}}}
+    ]
+    response = requests.post(BASE_URL, json=batch)
+    data = response.json()
+
+    if not isinstance(data, list):
+        print("❌ Error: batch is not supported")
+        print(data)
+    else:
+        for item in sorted(data, key=lambda item: item['id']):
+            if 'error' in item:
+                print(f"❌ id {item['id']}: {item['error']['message']}")
+            else:
+                print(f"✓ id {item['id']}: {item['result']['content'][0]['text'].splitlines()[0]}")
+    print()
+
+def test_cat_file_batch():
+    """Test the git cat-file reader on a scratch repository (no server needed)"""
+    print("=" * 60)
+    print("Testing cat-file Batch Reader")
+    print("=" * 60)
+
+    from git_server import CatFileBatch
+
+    with tempfile.TemporaryDirectory() as repo:
+        files = {"a.txt": "alpha\n", "my file.txt": "with a space\n", "big.txt": "x" * 5000}
+        for name, content in files.items():
+            with open(os.path.join(repo, name), 'w') as f:
+                f.write(content)
+        for args in (["init", "-q"], ["add", "."], ["-c", "user.name=t", "-c", "user.email=t@t", "commit", "-qm", "init"]):
+            subprocess.run(["git"] + args, cwd=repo, check=True)
+
+        reader = CatFileBatch(repo)
+        result = reader.read_files("HEAD", ["a.txt", "my file.txt", "gone file.txt", "no such file.txt", "missing.txt", "big.txt"], 100)
+        reader.close()
+
+    assert result['success'], result
+    entries = {entry['path']: entry for entry in json.loads(result['output'])['files']}
+    assert entries['a.txt']['content'] == "alpha\n"
+    assert entries['my file.txt']['content'] == "with a space\n"
+    # A missing path is reported per file, whatever its spaces
+    assert entries['gone file.txt']['error'] == 'Not found'
+    assert entries['no such file.txt']['error'] == 'Not found'
+    assert entries['missing.txt']['error'] == 'Not found'
+    assert entries['big.txt']['truncated'] and entries['big.txt']['size'] == 5000
+    assert entries['big.txt']['content'] == "x" * 100
+    print("✓ Per-file results, missing paths with spaces included")
+
+    # A stalled process is killed at the deadline instead of blocking later requests
+    class StalledCatFile(CatFileBatch):
+        command = ['sleep', '30']
+
+    reader = StalledCatFile(os.getcwd(), timeout=0.2)
+    start = time.monotonic()
+    result = reader.read_files("HEAD", ["a.txt"])
+    assert result == {'success': False, 'output': '', 'error': 'Command timeout'}, result
+    assert time.monotonic() - start < 5
+    assert reader.process is None
+    print("✓ Stalled reads time out")
+    print()
+
+def test_show_files():
+    """Test bulk file contents"""
+    print("=" * 60)
+    print("Testing Show Files")
+    print("=" * 60)
+
+    response = requests.post(
+        BASE_URL,
+        json={
+            "jsonrpc": "2.0", "id": 1, "method": "tools/call",
+            "params": {
+                "name": "git_show_files",
+                "arguments": {"commit": "HEAD", "filepaths": ["mcp_servers/git_server.py", "missing.txt", "missing file.txt"], "max_bytes": 1000}
+            }
+        }
+    )
+    data = response.json()
+
+    if 'error' in data:
+        print(f"❌ Error: {data['error']['message']}")
+    else:
+        result = json.loads(data['result']['content'][0]['text'])
+        for entry in result['files']:
+            if entry['error']:
+                print(f"✓ {entry['path']}: {entry['error']}")
+            else:
+                print(f"✓ {entry['path']}: {len(entry['content'])} of {entry['size']} bytes"
+                      f"{' (truncated)' if entry['truncated'] else ''}")
+    print()
+
 if __name__ == '__main__':
     print()
     print("=" * 60)
@@ -142,6 +247,9 @@ if __name__ == '__main__':
     print()
 
     try:
+        # Needs no running server
+        test_cat_file_batch()
+
         # Test health first
         git_available = test_health()
 
@@ -156,6 +264,8 @@ if __name__ == '__main__':
         test_git_current_branch()
         test_git_log()
         test_execute_command()
+        test_batch()
+        test_show_files()
 
         print("=" * 60)
         print("🎉 All tests completed!")
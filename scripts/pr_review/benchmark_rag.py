@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for rag_engine on reproducible synthetic corpora
+For every corpus size it measures tokenize, fit, transform, index_documents
+and search: wall time, throughput and peak traced memory. Results are
+written as JSON and can be compared with a baseline run to catch regressions
+
+Usage:
+    python benchmark_rag.py --sizes 1000,10000,100000 --output results.json
+    python benchmark_rag.py --sizes 1000000 --no-memory   (several GB of RAM; traced runs are slow)
+    python benchmark_rag.py --baseline results.json --threshold 0.15
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from itertools import accumulate
+from typing import Callable, Dict, List, Optional, Tuple
+
+from rag_engine import DocumentIndexer, TfidfVectorizer, chunk_text, np
+
+# Syllables for synthetic words; words are drawn with Zipf frequencies like natural text
+_SYLLABLES = [c + v for c in "bcdfgklmnprstvz" for v in "aeiou"]
+
+# Metrics compared against a baseline; lower is better for all of them
+COMPARED_METRICS = ("seconds", "p50_ms", "p95_ms", "peak_memory_mb", "p50_vs_exact")
+
+
+def make_vocabulary(size: int, seed: int) -> List[str]:
+    """Returns size distinct synthetic words, the same for the same seed"""
+    rng = random.Random(seed)
+    words = list(TfidfVectorizer.STOP_WORDS)
+    seen = set(words)
+    while len(words) < size:
+        word = ''.join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+def generate_documents(
+    num_chunks: int,
+    chunks_per_doc: int = 50,
+    vocabulary_size: int = 50000,
+    seed: int = 0
+) -> List[Tuple[str, str]]:
+    """
+    Generates markdown documents that chunk into exactly num_chunks chunks
+    Returns list of (filename, content); the output depends only on the arguments
+    """
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(vocabulary_size, seed)
+    cum_weights = list(accumulate(1.0 / (rank + 1) ** 1.1 for rank in range(len(vocabulary))))
+    step = DocumentIndexer.CHUNK_SIZE - DocumentIndexer.CHUNK_OVERLAP
+
+    documents = []
+    remaining = num_chunks
+    while remaining > 0:
+        doc_chunks = min(chunks_per_doc, remaining)
+        # chunk_text() yields n chunks for step * (n - 1) + CHUNK_SIZE characters
+        length = step * (doc_chunks - 1) + DocumentIndexer.CHUNK_SIZE
+        parts = [f"# Document {len(documents)}\n"]
+        size = len(parts[0])
+        while size < length:
+            words = rng.choices(vocabulary, cum_weights=cum_weights, k=12)
+            if rng.random() < 0.05:
+                line = f"\n## {words[0].title()} {words[1]}\n"
+            else:
+                line = ' '.join(words) + ".\n"
+            parts.append(line)
+            size += len(line)
+        documents.append((f"doc_{len(documents):06d}.md", ''.join(parts)[:length]))
+        remaining -= doc_chunks
+
+    return documents
+
+
+def generate_queries(terms: List[str], num_queries: int, seed: int = 0) -> List[str]:
+    """Generates one to four word queries over terms, e.g. a fitted vocabulary"""
+    rng = random.Random(seed + 1)
+    return [' '.join(rng.choice(terms) for _ in range(rng.randint(1, 4))) for _ in range(num_queries)]
+
+
+def measure(run: Callable[[], object], repeat: int, memory: bool) -> Dict[str, float]:
+    """
+    Best wall time of repeat runs, then one traced run for peak memory
+    Tracing slows Python allocations, so it never overlaps the timed runs
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+
+    result = {"seconds": best}
+    if memory:
+        tracemalloc.start()
+        try:
+            run()
+            result["peak_memory_mb"] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def benchmark_size(
+    num_chunks: int,
+    repeat: int = 3,
+    num_queries: int = 200,
+    top_k: int = 5,
+    modes: Tuple[str, ...] = ("exact", "ann"),
+    memory: bool = True,
+    seed: int = 0,
+    use_numpy: bool = True
+) -> List[Dict]:
+    """
+    Runs every stage on one synthetic corpus; returns one result dict per stage
+    The engine's progress output is discarded so it does not skew the timings
+    Search modes other than exact also report p50_vs_exact (their p50 over the
+    exact p50, above 1 when slower) and recall_vs_exact (top_k overlap)
+    """
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        documents = generate_documents(num_chunks, seed=seed)
+        chunks = [chunk for _, content in documents
+                  for chunk in chunk_text(content, DocumentIndexer.CHUNK_SIZE, DocumentIndexer.CHUNK_OVERLAP)]
+        num_bytes = sum(len(chunk.encode('utf-8')) for chunk in chunks)
+        fitted = TfidfVectorizer()
+        fitted.fit_counts(chunks)
+
+        def record(stage: str, measured: Dict[str, float], items: int) -> Dict:
+            result = {"num_chunks": num_chunks, "stage": stage}
+            result.update(measured)
+            result["chunks_per_second"] = items / measured["seconds"] if measured["seconds"] else 0.0
+            result["mb_per_second"] = num_bytes / 2 ** 20 / measured["seconds"] if measured["seconds"] else 0.0
+            return result
+
+        results = [
+            record("tokenize", measure(lambda: fitted.tokenize_batch(chunks), repeat, memory), len(chunks)),
+            record("fit", measure(lambda: TfidfVectorizer().fit_counts(chunks), repeat, memory), len(chunks)),
+            record("transform", measure(lambda: fitted.transform_batch(chunks, sparse=True), repeat, memory), len(chunks)),
+        ]
+
+        with tempfile.TemporaryDirectory() as corpus_dir:
+            for filename, content in documents:
+                with open(os.path.join(corpus_dir, filename), 'w', encoding='utf-8') as f:
+                    f.write(content)
+            del documents
+
+            def index(ann_lists: Optional[int] = None) -> DocumentIndexer:
+                indexer = DocumentIndexer(corpus_dir, use_numpy=use_numpy, ann_lists=ann_lists, query_cache_size=0)
+                indexer.index_documents()
+                return indexer
+
+            results.append(record("index_documents", measure(index, repeat, memory), len(chunks)))
+            indexer = index(ann_lists=0 if "ann" in modes else None)
+
+            queries = generate_queries(sorted(fitted.vocabulary, key=fitted.vocabulary.get), num_queries, seed=seed)
+            exact_ids = [
+                {(r.filename, r.chunk_index) for r in indexer.search(query, top_k=top_k)} for query in queries
+            ]
+            exact_p50 = None
+            for mode in modes:
+                # The first query of a mode may build its index; it is not part of the latency
+                indexer.search(queries[0], top_k=top_k, mode=mode)
+                latencies = []
+                for query in queries:
+                    start = time.perf_counter()
+                    indexer.search(query, top_k=top_k, mode=mode)
+                    latencies.append(time.perf_counter() - start)
+
+                latencies.sort()
+                total = sum(latencies)
+                p50 = percentile(latencies, 0.50)
+                comparison = {}
+                if mode == "exact":
+                    exact_p50 = p50
+                elif mode != "bm25":
+                    # BM25 ranks by a different score, so only ANN is compared with exact search
+                    found = sum(
+                        len(expected & {(r.filename, r.chunk_index) for r in indexer.search(query, top_k=top_k, mode=mode)})
+                        for query, expected in zip(queries, exact_ids)
+                    )
+                    comparison["recall_vs_exact"] = found / max(1, sum(len(expected) for expected in exact_ids))
+                    if exact_p50:
+                        comparison["p50_vs_exact"] = p50 / exact_p50
+                results.append({
+                    "num_chunks": num_chunks,
+                    "stage": f"search_{mode}",
+                    "queries": len(latencies),
+                    "seconds": total,
+                    "mean_ms": total / len(latencies) * 1000,
+                    "p50_ms": p50 * 1000,
+                    "p95_ms": percentile(latencies, 0.95) * 1000,
+                    "p99_ms": percentile(latencies, 0.99) * 1000,
+                    "queries_per_second": len(latencies) / total if total else 0.0,
+                    **comparison
+                })
+
+    return results
+
+
+def compare_results(results: List[Dict], baseline: List[Dict], threshold: float) -> List[Dict]:
+    """
+    Compares results with a baseline run of the same sizes and stages
+    Returns one entry per compared metric; regression is True when the
+    current value exceeds the baseline by more than threshold (a fraction)
+    """
+    baseline_by_key = {(entry["num_chunks"], entry["stage"]): entry for entry in baseline}
+    comparisons = []
+    for entry in results:
+        previous = baseline_by_key.get((entry["num_chunks"], entry["stage"]))
+        if previous is None:
+            continue
+        for metric in COMPARED_METRICS:
+            if metric not in entry or not previous.get(metric):
+                continue
+            ratio = entry[metric] / previous[metric]
+            comparisons.append({
+                "num_chunks": entry["num_chunks"],
+                "stage": entry["stage"],
+                "metric": metric,
+                "baseline": previous[metric],
+                "current": entry[metric],
+                "ratio": ratio,
+                "regression": ratio > 1 + threshold
+            })
+    return comparisons
+
+
+def environment() -> Dict:
+    """Describes the interpreter and machine the numbers come from"""
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__ if np is not None else None,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+
+
+def print_results(results: List[Dict]) -> None:
+    """Prints a table of the stage results"""
+    columns = [("chunks/s", "chunks_per_second", 12, ".0f"), ("MB/s", "mb_per_second", 8, ".1f"),
+               ("qps", "queries_per_second", 9, ".0f"), ("p50 ms", "p50_ms", 9, ".3f"),
+               ("p95 ms", "p95_ms", 9, ".3f"), ("vs exact", "p50_vs_exact", 10, ".2f"),
+               ("recall", "recall_vs_exact", 8, ".3f"), ("peak MB", "peak_memory_mb", 9, ".1f")]
+    print(f"{'chunks':>9} {'stage':<16}{'seconds':>10}" + ''.join(f"{title:>{width}}" for title, _, width, _ in columns))
+    for entry in results:
+        cells = [
+            f"{entry[key]:>{width}{spec}}" if key in entry else f"{'-':>{width}}"
+            for _, key, width, spec in columns
+        ]
+        print(f"{entry['num_chunks']:>9} {entry['stage']:<16}{entry['seconds']:>10.3f}" + ''.join(cells))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="rag_engine benchmark suite on synthetic corpora")
+    parser.add_argument('--sizes', default='1000,10000,100000',
+                        help="Comma-separated corpus sizes in chunks (up to 1000000)")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs per stage; the best is reported")
+    parser.add_argument('--queries', type=int, default=200, help="Queries per search mode")
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--modes', default='exact,ann', help="Comma-separated search modes: exact, ann, bm25")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-numpy', action='store_true', help="Benchmark the pure Python postings")
+    parser.add_argument('--no-memory', action='store_true', help="Skip the traced run for peak memory")
+    parser.add_argument('--output', help="Write results to this JSON file")
+    parser.add_argument('--baseline', help="Compare with the results JSON of an earlier run")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="Allowed slowdown before a metric counts as a regression (fraction)")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    modes = tuple(mode.strip() for mode in args.modes.split(','))
+
+    results = []
+    for num_chunks in sizes:
+        print(f"[benchmark_rag] {num_chunks} chunks...", file=sys.stderr)
+        results.extend(benchmark_size(
+            num_chunks,
+            repeat=args.repeat,
+            num_queries=args.queries,
+            top_k=args.top_k,
+            modes=modes,
+            memory=not args.no_memory,
+            seed=args.seed,
+            use_numpy=not args.no_numpy
+        ))
+
+    report = {
+        "environment": environment(),
+        "config": {"sizes": sizes, "repeat": args.repeat, "queries": args.queries, "top_k": args.top_k,
+                   "modes": list(modes), "seed": args.seed, "use_numpy": not args.no_numpy},
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "results": results
+    }
+    print_results(results)
+
+    for entry in results:
+        if entry.get("p50_vs_exact", 0) > 1:
+            print(f"[WARNING] {entry['num_chunks']} chunks {entry['stage']} is slower than exact search "
+                  f"({entry['p50_vs_exact']:.2f}x p50)")
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        comparisons = compare_results(results, baseline["results"], args.threshold)
+        report["comparison"] = comparisons
+
+        regressions = [c for c in comparisons if c["regression"]]
+        print(f"\nCompared {len(comparisons)} metrics with {args.baseline}: {len(regressions)} regressions")
+        for c in regressions:
+            print(f"[WARNING] {c['num_chunks']} chunks {c['stage']} {c['metric']}: "
+                  f"{c['baseline']:.4g} -> {c['current']:.4g} ({c['ratio']:.2f}x)")
+        if regressions:
+            exit_code = 1
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n[benchmark_rag] Wrote {args.output}")
+
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
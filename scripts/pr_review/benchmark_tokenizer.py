@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Tokenizer micro-benchmark on the shipped docs
+Compares TfidfVectorizer.tokenize() and its variants with the original
+implementation and checks that every variant returns identical tokens
+
+Usage: python benchmark_tokenizer.py [docs_path] [--repeat N]
+"""
+
+import argparse
+import re
+import time
+from collections import Counter
+from typing import Callable, List
+
+from rag_engine import DocumentIndexer, TfidfVectorizer
+
+
+def reference_tokenize(text: str) -> List[str]:
+    """The original tokenizer: lowercase, replace non-alphanumeric, split, filter"""
+    text = text.lower()
+    text = re.sub(r'[^a-z0-9\s]', ' ', text)
+    tokens = text.split()
+    return [
+        token for token in tokens
+        if len(token) >= TfidfVectorizer.MIN_WORD_LENGTH and token not in TfidfVectorizer.STOP_WORDS
+    ]
+
+
+def load_chunks(docs_path: str) -> List[str]:
+    """Chunks every document the indexer would load"""
+    indexer = DocumentIndexer(docs_path, max_workers=1)
+    return [chunk for _, _, doc_chunks in indexer._load_documents() for chunk in doc_chunks]
+
+
+def time_per_pass(run: Callable[[], object], repeat: int) -> float:
+    """Best wall time of repeat runs, in milliseconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tokenizer micro-benchmark")
+    parser.add_argument('docs_path', nargs='?', default='../../app/src/main/assets/docs')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    chunks = load_chunks(args.docs_path)
+    vectorizer = TfidfVectorizer()
+
+    expected = [reference_tokenize(chunk) for chunk in chunks]
+    assert [vectorizer.tokenize(chunk) for chunk in chunks] == expected
+    assert [list(vectorizer.iter_tokens(chunk)) for chunk in chunks] == expected
+    assert vectorizer.tokenize_batch(chunks) == expected
+
+    num_tokens = sum(len(tokens) for tokens in expected)
+    print(f"{len(chunks)} chunks, {sum(len(c) for c in chunks)} chars, {num_tokens} tokens")
+    print(f"Best of {args.repeat} passes; all variants return identical tokens\n")
+
+    cases = [
+        ("reference tokenize", lambda: [reference_tokenize(chunk) for chunk in chunks]),
+        ("tokenize", lambda: [vectorizer.tokenize(chunk) for chunk in chunks]),
+        ("tokenize_batch", lambda: vectorizer.tokenize_batch(chunks)),
+        ("reference + Counter", lambda: [Counter(reference_tokenize(chunk)) for chunk in chunks]),
+        ("iter_tokens + Counter", lambda: [Counter(vectorizer.iter_tokens(chunk)) for chunk in chunks]),
+        ("tokenize + Counter", lambda: [Counter(vectorizer.tokenize(chunk)) for chunk in chunks]),
+    ]
+
+    baseline = None
+    print(f"{'variant':<24}{'ms/pass':>10}{'Mtok/s':>10}{'speedup':>10}")
+    for name, run in cases:
+        elapsed = time_per_pass(run, args.repeat)
+        if name.startswith("reference"):
+            baseline = elapsed
+        print(f"{name:<24}{elapsed:>10.2f}{num_tokens / elapsed / 1000:>10.2f}{baseline / elapsed:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
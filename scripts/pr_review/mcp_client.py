@@ -4,11 +4,39 @@ MCP Client for CI environment
 Simple HTTP client for calling MCP Git Server tools
 """
 
+import asyncio
+import functools
+import itertools
 import json
+import random
+import threading
+import time
 import requests
-from typing import Dict, Any, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from typing import Dict, Any, List, Optional, Tuple, Union
 from dataclasses import dataclass
 
+# Read-only tools: safe to send again after a connection error or timeout
+IDEMPOTENT_TOOLS = frozenset({
+    "git_status", "git_log", "git_diff", "git_branch", "git_current_branch", "git_remote",
+    "git_diff_unified", "git_diff_files", "git_show_file", "git_show_files", "git_pr_context"
+})
+
+# Per-tool (connect, read) timeouts in seconds; the read timeout covers the server's git
+# timeouts: 10s per git command, 30s for git_diff_unified and git_show_files,
+# and git_pr_context runs three 10s git commands one after another
+DEFAULT_TIMEOUT = (3.05, 15)
+TOOL_TIMEOUTS = {
+    "git_diff_unified": (3.05, 35),
+    "git_show_files": (3.05, 35),
+    "git_pr_context": (3.05, 35),
+    "execute_command": (3.05, 60)
+}
+
+# Gateway and overload statuses that are worth retrying
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
 
 @dataclass
 class FileChange:
@@ -20,21 +48,84 @@ class FileChange:
 class McpClient:
     """
     MCP Client for calling Git MCP Server from CI
+    Each calling thread gets its own requests.Session (Session is not
+    guaranteed thread-safe), which keeps its connections alive between calls;
+    idempotent tools are retried with jittered exponential backoff
     """
 
-    def __init__(self, mcp_url: str = "http://localhost:3002"):
-        self.mcp_url = mcp_url
-        self.request_id = 0
-
-    def _call_tool(self, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    def __init__(
+        self,
+        mcp_url: str = "http://localhost:3002",
+        pool_size: int = 10,
+        max_retries: int = 3,
+        backoff_base: float = 0.25,
+        backoff_max: float = 4.0,
+        timeouts: Optional[Dict[str, Tuple[float, float]]] = None
+    ):
         """
-        Call MCP tool and return result
+        Args:
+            mcp_url: MCP Git Server URL
+            pool_size: Connections kept alive to the server by each calling thread's session
+            max_retries: Retries of an idempotent tool call after a connection error,
+                timeout or 429/502/503/504 response
+            backoff_base: Upper bound of the first retry delay in seconds; doubles per retry
+            backoff_max: Cap on the retry delay in seconds
+            timeouts: Per-tool (connect, read) timeouts overriding TOOL_TIMEOUTS
         """
-        self.request_id += 1
-
-        payload = {
+        self.mcp_url = mcp_url
+        self.request_id = 0
+        # next() on a count is atomic, so ids stay unique when calls come from several threads
+        self._request_ids = itertools.count(1)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeouts = dict(TOOL_TIMEOUTS, **(timeouts or {}))
+
+        self.pool_size = pool_size
+        self._local = threading.local()
+        self._sessions: List[requests.Session] = []
+        self._sessions_lock = threading.Lock()
+
+    @property
+    def session(self) -> requests.Session:
+        """The calling thread's session, created on its first call"""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.headers["Content-Type"] = "application/json"
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._local.session = session
+            with self._sessions_lock:
+                self._sessions.append(session)
+        return session
+
+    def close(self) -> None:
+        """Closes the pooled connections of every thread's session"""
+        with self._sessions_lock:
+            sessions, self._sessions = self._sessions, []
+        for session in sessions:
+            session.close()
+        self._local = threading.local()
+
+    def __enter__(self) -> 'McpClient':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _backoff_delay(self, attempt: int) -> float:
+        """Full jitter: uniform in [0, min(backoff_max, backoff_base * 2^attempt)]"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _tool_request(self, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """JSON-RPC tools/call request with a new id"""
+        request_id = self.request_id = next(self._request_ids)
+
+        return {
             "jsonrpc": "2.0",
-            "id": self.request_id,
+            "id": request_id,
             "method": "tools/call",
             "params": {
                 "name": tool_name,
@@ -42,34 +133,104 @@ class McpClient:
             }
         }
 
-        try:
-            response = requests.post(
-                self.mcp_url,
-                json=payload,
-                headers={"Content-Type": "application/json"},
-                timeout=60
-            )
-            response.raise_for_status()
+    def _call_tool(
+        self,
+        tool_name: str,
+        arguments: Dict[str, Any],
+        timeout: Optional[Union[float, Tuple[float, float]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Call MCP tool and return result
+        timeout overrides the tool's (connect, read) timeout for this call
+        """
+        payload = self._tool_request(tool_name, arguments)
 
-            result = response.json()
+        if timeout is None:
+            timeout = self.timeouts.get(tool_name, DEFAULT_TIMEOUT)
+        retries = self.max_retries if tool_name in IDEMPOTENT_TOOLS else 0
 
-            if "error" in result:
-                raise Exception(f"MCP Error: {result['error']['message']}")
+        return _tool_result(self._post(payload, timeout, retries, tool_name))
+
+    def call_tools(
+        self,
+        calls: List[Tuple[str, Dict[str, Any]]],
+        timeout: Optional[Union[float, Tuple[float, float]]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Calls several tools in one HTTP round trip (JSON-RPC 2.0 batch)
+        Responses are matched to the calls by id and returned in call order;
+        a call that failed on the server has success False and an "error"
+        The batch is retried like one call only if every tool is idempotent
+
+        Args:
+            calls: (tool name, arguments) pairs
+            timeout: (connect, read) timeout for the whole batch; by default the
+                sum of the tools' read timeouts, as the server may run them one by one
+        """
+        if not calls:
+            return []
 
-            # Extract text from content
-            content = result.get("result", {}).get("content", [])
-            if content and len(content) > 0:
-                return {"success": True, "output": content[0]["text"]}
+        payloads = [self._tool_request(tool_name, arguments) for tool_name, arguments in calls]
+
+        if timeout is None:
+            tool_timeouts = [self.timeouts.get(tool_name, DEFAULT_TIMEOUT) for tool_name, _ in calls]
+            tool_timeouts = [t if isinstance(t, tuple) else (t, t) for t in tool_timeouts]
+            timeout = (max(t[0] for t in tool_timeouts), sum(t[1] for t in tool_timeouts))
+        retries = self.max_retries if all(tool_name in IDEMPOTENT_TOOLS for tool_name, _ in calls) else 0
+
+        replies = self._post(payloads, timeout, retries, f"batch of {len(calls)} calls")
+        if not isinstance(replies, list):
+            # A server without batch support answers with a single error
+            message = replies.get("error", {}).get("message", "unexpected reply") if isinstance(replies, dict) else replies
+            raise Exception(f"MCP Error: {message}")
+
+        replies_by_id = {reply.get("id"): reply for reply in replies if isinstance(reply, dict)}
+        results = []
+        for payload in payloads:
+            reply = replies_by_id.get(payload["id"])
+            try:
+                if reply is None:
+                    raise Exception(f"MCP Error: no response for request {payload['id']}")
+                results.append(_tool_result(reply))
+            except Exception as e:
+                results.append({"success": False, "output": "", "error": str(e)})
+        return results
+
+    def _post(self, payload: Any, timeout, retries: int, label: str) -> Any:
+        """
+        POSTs a JSON-RPC request or batch and returns the decoded reply
+        Retries up to retries times after connection errors, timeouts and RETRY_STATUSES
+        """
+        attempt = 0
+        while True:
+            try:
+                response = self.session.post(self.mcp_url, json=payload, timeout=timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt >= retries:
+                    raise Exception(f"Failed to call MCP server: {e}")
+                error = str(e)
+            except requests.exceptions.RequestException as e:
+                raise Exception(f"Failed to call MCP server: {e}")
             else:
-                return {"success": False, "output": ""}
+                if response.status_code not in RETRY_STATUSES or attempt >= retries:
+                    break
+                error = f"HTTP {response.status_code}"
+
+            delay = self._backoff_delay(attempt)
+            attempt += 1
+            print(f"[WARNING] {label} failed ({error}), retry {attempt}/{retries} in {delay:.2f}s")
+            time.sleep(delay)
 
+        try:
+            response.raise_for_status()
+            return response.json()
         except requests.exceptions.RequestException as e:
             raise Exception(f"Failed to call MCP server: {e}")
 
-    def health_check(self) -> bool:
-        """Check if MCP server is healthy"""
+    def health_check(self, timeout: float = 5) -> bool:
+        """Check if MCP server is healthy (one attempt, no retries)"""
         try:
-            response = requests.get(f"{self.mcp_url}/health", timeout=5)
+            response = self.session.get(f"{self.mcp_url}/health", timeout=timeout)
             response.raise_for_status()
             data = response.json()
             return data.get("status") == "healthy"
@@ -94,13 +255,7 @@ class McpClient:
                 "head": head,
                 "context_lines": context_lines
             })
-
-            if result["success"]:
-                output = result["output"]
-                if output == "(empty output)":
-                    return ""
-                return output
-            return None
+            return _parse_diff(result)
 
         except Exception as e:
             print(f"[ERROR] Failed to get PR diff: {e}")
@@ -122,26 +277,7 @@ class McpClient:
                 "base": base,
                 "head": head
             })
-
-            if not result["success"]:
-                return []
-
-            output = result["output"]
-            if output == "(empty output)" or not output:
-                return []
-
-            # Parse output: "M\tfile.txt\nA\tfile2.txt"
-            changes = []
-            for line in output.strip().split('\n'):
-                if not line:
-                    continue
-
-                parts = line.split('\t', 1)
-                if len(parts) == 2:
-                    status, filepath = parts
-                    changes.append(FileChange(status=status, filepath=filepath))
-
-            return changes
+            return _parse_changed_files(result)
 
         except Exception as e:
             print(f"[ERROR] Failed to get changed files: {e}")
@@ -163,15 +299,45 @@ class McpClient:
                 "commit": commit,
                 "filepath": filepath
             })
-
-            if result["success"]:
-                return result["output"]
-            return None
+            return _parse_file_content(result)
 
         except Exception as e:
             print(f"[ERROR] Failed to get file content: {e}")
             return None
 
+    def get_file_contents(
+        self,
+        commit: str,
+        filepaths: List[str],
+        max_bytes: Optional[int] = None
+    ) -> Dict[str, Optional[str]]:
+        """
+        Get the content of many files at one commit in one call (git_show_files)
+        The server reads them all through one git cat-file process
+
+        Args:
+            commit: Commit reference
+            filepaths: Paths to files
+            max_bytes: Bytes per file at most; longer files are truncated (default: server limit)
+
+        Returns:
+            {filepath: content, or None if missing, binary or failed}
+        """
+        if not filepaths:
+            return {}
+
+        arguments = {"commit": commit, "filepaths": list(filepaths)}
+        if max_bytes is not None:
+            arguments["max_bytes"] = max_bytes
+
+        try:
+            result = self._call_tool("git_show_files", arguments)
+        except Exception as e:
+            print(f"[ERROR] Failed to get file contents: {e}")
+            return {filepath: None for filepath in filepaths}
+
+        return _parse_file_contents(result, filepaths)
+
     def get_pr_context(self, base_branch: str, head_branch: str) -> Optional[Dict[str, Any]]:
         """
         Get PR context metadata
@@ -188,25 +354,229 @@ class McpClient:
                 "base_branch": base_branch,
                 "head_branch": head_branch
             })
+            return _parse_pr_context(result)
 
-            if not result["success"]:
-                return None
-
-            output = result["output"]
+        except Exception as e:
+            print(f"[ERROR] Failed to get PR context: {e}")
+            return None
 
-            # Parse output
-            context = {}
-            for line in output.split('\n'):
-                if ': ' in line:
-                    key, value = line.split(': ', 1)
-                    context[key.lower().replace(' ', '_')] = value
+    def get_pr_data(
+        self,
+        base: str,
+        head: str,
+        filepaths: Optional[List[str]] = None,
+        context_lines: int = 3,
+        include_context: bool = True
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Gets the diff, changed files, PR context and file contents at head
+        in one HTTP round trip (see call_tools()); files come from one git_show_files call
+        include_context=False leaves git_pr_context (three git commands) out of the batch
 
-            return context
+        Returns:
+            Dictionary with diff, changed_files, context (None if not included) and
+            files ({filepath: content or None}), each parsed like the single-call methods;
+            None if the batch failed
+        """
+        filepaths = filepaths or []
+        calls = [
+            ("git_diff_unified", {"base": base, "head": head, "context_lines": context_lines}),
+            ("git_diff_files", {"base": base, "head": head}),
+        ]
+        if include_context:
+            calls.append(("git_pr_context", {"base_branch": base, "head_branch": head}))
+        if filepaths:
+            calls.append(("git_show_files", {"commit": head, "filepaths": filepaths}))
 
+        try:
+            results = self.call_tools(calls)
         except Exception as e:
-            print(f"[ERROR] Failed to get PR context: {e}")
+            print(f"[ERROR] Failed to get PR data: {e}")
             return None
 
+        by_tool = {}
+        for (tool_name, _), result in zip(calls, results):
+            if "error" in result:
+                print(f"[ERROR] {tool_name} failed: {result['error']}")
+            by_tool[tool_name] = result
+
+        return {
+            "diff": _parse_diff(by_tool["git_diff_unified"]),
+            "changed_files": _parse_changed_files(by_tool["git_diff_files"]),
+            "context": _parse_pr_context(by_tool["git_pr_context"]) if include_context else None,
+            "files": _parse_file_contents(by_tool["git_show_files"], filepaths) if filepaths else {}
+        }
+
+
+def _tool_result(reply: Dict[str, Any]) -> Dict[str, Any]:
+    """Extracts the text result of a tools/call reply; raises on a JSON-RPC error"""
+    if "error" in reply:
+        raise Exception(f"MCP Error: {reply['error']['message']}")
+
+    # Extract text from content
+    content = reply.get("result", {}).get("content", [])
+    if content and len(content) > 0:
+        return {"success": True, "output": content[0]["text"]}
+    else:
+        return {"success": False, "output": ""}
+
+
+def _parse_diff(result: Dict[str, Any]) -> Optional[str]:
+    """git_diff_unified result -> diff text ("" when empty), None if failed"""
+    if result["success"]:
+        output = result["output"]
+        if output == "(empty output)":
+            return ""
+        return output
+    return None
+
+
+def _parse_changed_files(result: Dict[str, Any]) -> List[FileChange]:
+    """git_diff_files result -> FileChange list"""
+    if not result["success"]:
+        return []
+
+    output = result["output"]
+    if output == "(empty output)" or not output:
+        return []
+
+    # Parse output: "M\tfile.txt\nA\tfile2.txt"
+    changes = []
+    for line in output.strip().split('\n'):
+        if not line:
+            continue
+
+        parts = line.split('\t', 1)
+        if len(parts) == 2:
+            status, filepath = parts
+            changes.append(FileChange(status=status, filepath=filepath))
+
+    return changes
+
+
+def _parse_file_content(result: Dict[str, Any]) -> Optional[str]:
+    """git_show_file result -> file content, None if failed"""
+    if result["success"]:
+        return result["output"]
+    return None
+
+
+def _parse_file_contents(result: Dict[str, Any], filepaths: List[str]) -> Dict[str, Optional[str]]:
+    """git_show_files result -> {filepath: content or None}"""
+    files = {filepath: None for filepath in filepaths}
+    try:
+        entries = json.loads(result["output"])["files"] if result["success"] else []
+    except (ValueError, KeyError, TypeError):
+        print(f"[ERROR] git_show_files failed: {result['output'][:200]}")
+        return files
+
+    for entry in entries:
+        if entry.get("truncated"):
+            print(f"[WARNING] {entry['path']} truncated to {len(entry['content'])} of {entry['size']} bytes")
+        files[entry["path"]] = entry.get("content")
+    return files
+
+
+def _parse_pr_context(result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """git_pr_context result -> {merge_base, commits, files_changed, ...}, None if failed"""
+    if not result["success"]:
+        return None
+
+    # Parse output
+    context = {}
+    for line in result["output"].split('\n'):
+        if ': ' in line:
+            key, value = line.split(': ', 1)
+            context[key.lower().replace(' ', '_')] = value
+
+    return context
+
+
+class AsyncMcpClient:
+    """
+    asyncio variant of McpClient with the same tool methods as coroutines
+    Calls run on a pool of max_concurrency threads, each with its own
+    McpClient keep-alive session, so independent calls overlap and at most
+    max_concurrency requests are in flight; retries and timeouts are McpClient's
+    """
+
+    def __init__(self, mcp_url: str = "http://localhost:3002", max_concurrency: int = 4, **client_options):
+        """
+        Args:
+            mcp_url: MCP Git Server URL
+            max_concurrency: Requests in flight at most (one keep-alive connection per worker thread)
+            client_options: Retry and timeout options passed to McpClient
+        """
+        self.max_concurrency = max_concurrency
+        self.client = McpClient(mcp_url, **client_options)
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="mcp-client")
+
+    async def _run(self, method, *args, **kwargs):
+        """Runs a blocking McpClient method on the pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(method, *args, **kwargs))
+
+    async def close(self) -> None:
+        """Waits for calls in flight, then closes the pool and its connections"""
+        await asyncio.get_running_loop().run_in_executor(None, self.executor.shutdown)
+        self.client.close()
+
+    async def __aenter__(self) -> 'AsyncMcpClient':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def call_tool(
+        self,
+        tool_name: str,
+        arguments: Dict[str, Any],
+        timeout: Optional[Union[float, Tuple[float, float]]] = None
+    ) -> Dict[str, Any]:
+        """Calls an MCP tool; see McpClient._call_tool()"""
+        return await self._run(self.client._call_tool, tool_name, arguments, timeout)
+
+    async def health_check(self, timeout: float = 5) -> bool:
+        return await self._run(self.client.health_check, timeout)
+
+    async def get_pr_diff(self, base: str, head: str, context_lines: int = 3) -> Optional[str]:
+        return await self._run(self.client.get_pr_diff, base, head, context_lines)
+
+    async def get_changed_files(self, base: str, head: str) -> List[FileChange]:
+        return await self._run(self.client.get_changed_files, base, head)
+
+    async def get_file_content(self, commit: str, filepath: str) -> Optional[str]:
+        return await self._run(self.client.get_file_content, commit, filepath)
+
+    async def get_file_contents(
+        self,
+        commit: str,
+        filepaths: List[str],
+        max_bytes: Optional[int] = None
+    ) -> Dict[str, Optional[str]]:
+        return await self._run(self.client.get_file_contents, commit, filepaths, max_bytes)
+
+    async def get_pr_context(self, base_branch: str, head_branch: str) -> Optional[Dict[str, Any]]:
+        return await self._run(self.client.get_pr_context, base_branch, head_branch)
+
+    async def call_tools(
+        self,
+        calls: List[Tuple[str, Dict[str, Any]]],
+        timeout: Optional[Union[float, Tuple[float, float]]] = None
+    ) -> List[Dict[str, Any]]:
+        """Calls several tools in one round trip; see McpClient.call_tools()"""
+        return await self._run(self.client.call_tools, calls, timeout)
+
+    async def get_pr_data(
+        self,
+        base: str,
+        head: str,
+        filepaths: Optional[List[str]] = None,
+        context_lines: int = 3,
+        include_context: bool = True
+    ) -> Optional[Dict[str, Any]]:
+        return await self._run(self.client.get_pr_data, base, head, filepaths, context_lines, include_context)
+
 
 if __name__ == '__main__':
     # Test the MCP client
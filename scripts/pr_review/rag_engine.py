@@ -4,12 +4,60 @@ RAG Engine - TF-IDF based document indexing and search
 Port from Kotlin: app/src/main/java/com/example/chatagent/data/util/TfidfVectorizer.kt
 """
 
+import bisect
+import codecs
+import contextlib
+import fnmatch
+import hashlib
+import heapq
+import json
 import math
 import re
 import os
-from typing import List, Dict, Tuple, Optional
+import random
+import time
+import zlib
+from array import array
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Dict, Tuple, Optional, Iterable, Iterator
 from dataclasses import dataclass
 
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, search falls back to pure Python
+    np = None
+
+
+# Files indexed when no include patterns are given
+DEFAULT_INCLUDE = ('*.md', '*.txt')
+
+
+@dataclass
+class TextChunk:
+    """Chunk produced by the streaming chunker"""
+    text: str
+    byte_start: int  # offset of the first byte in the file
+    byte_end: int    # offset just past the last byte
+
+
+@dataclass
+class ChunkMetadata:
+    """Filterable attributes of a chunk"""
+    path: str  # relative to docs_path, same as the filename
+    directory: str  # "" for the top level
+    doc_type: str  # lowercase file extension without the dot
+    heading: str  # markdown heading in effect where the chunk starts, "" before the first one
+
+    @staticmethod
+    def from_path(path: str, heading: str = "") -> 'ChunkMetadata':
+        return ChunkMetadata(
+            path=path,
+            directory=os.path.dirname(path),
+            doc_type=os.path.splitext(path)[1].lstrip('.').lower(),
+            heading=heading
+        )
+
 
 @dataclass
 class SearchResult:
@@ -19,6 +67,803 @@ class SearchResult:
     chunk_index: int
     similarity: float
     rank: int
+    chunk_span: int = 1  # consecutive chunks merged into this result, starting at chunk_index
+    metadata: Optional[ChunkMetadata] = None
+
+
+class SparseVector:
+    """
+    TF-IDF vector that stores only non-zero terms
+    Indices are vocabulary positions in ascending order, values are the weights
+    """
+
+    __slots__ = ('indices', 'values', 'dim')
+
+    def __init__(self, indices, values, dim: int):
+        self.indices = array('i', indices)
+        self.values = array('d', values)
+        self.dim = dim
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def items(self):
+        """Iterates (index, weight) pairs"""
+        return zip(self.indices, self.values)
+
+    def dot(self, other: 'SparseVector') -> float:
+        """Dot product with another sparse vector"""
+        if len(other) < len(self):
+            return other.dot(self)
+        weights = dict(other.items())
+        return sum(value * weights.get(index, 0.0) for index, value in self.items())
+
+    def to_dense(self) -> List[float]:
+        """Expands to a dense list of length dim"""
+        vector = [0.0] * self.dim
+        for index, value in self.items():
+            vector[index] = value
+        return vector
+
+
+class SparseMatrix:
+    """
+    Compressed sparse row (CSR) matrix of TF-IDF vectors
+    Row i holds indices[indptr[i]:indptr[i + 1]] and the matching data values
+    Arrays are numpy arrays when numpy is available, otherwise Python arrays
+    """
+
+    __slots__ = ('indptr', 'indices', 'data', 'shape')
+
+    def __init__(self, indptr, indices, data, shape: Tuple[int, int]):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.shape = shape
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def row(self, i: int) -> SparseVector:
+        """Returns row i as a SparseVector"""
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return SparseVector(self.indices[start:end], self.data[start:end], self.shape[1])
+
+    def to_dense(self):
+        """Expands to a dense float32 matrix (or a list of float lists without numpy)"""
+        if np is not None and isinstance(self.data, np.ndarray):
+            dense = np.zeros(self.shape, dtype=np.float32)
+            rows = np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+            dense[rows, self.indices] = self.data
+            return dense
+        return [self.row(i).to_dense() for i in range(self.shape[0])]
+
+    @staticmethod
+    def vstack(matrices: List['SparseMatrix'], dim: int) -> 'SparseMatrix':
+        """Stacks matrices with the same number of columns"""
+        num_rows = sum(len(m) for m in matrices)
+        if matrices and all(np is not None and isinstance(m.data, np.ndarray) for m in matrices):
+            offsets = np.cumsum([0] + [int(m.indptr[-1]) for m in matrices[:-1]])
+            indptr = np.concatenate([matrices[0].indptr[:1]] + [
+                m.indptr[1:] + offset for m, offset in zip(matrices, offsets)
+            ])
+            return SparseMatrix(
+                indptr,
+                np.concatenate([m.indices for m in matrices]),
+                np.concatenate([m.data for m in matrices]),
+                (num_rows, dim)
+            )
+
+        indptr, indices, data = array('q', [0]), array('i'), array('d')
+        for m in matrices:
+            offset = indptr[-1]
+            indptr.extend(offset + p for p in m.indptr[1:])
+            indices.extend(m.indices)
+            data.extend(m.data)
+        return SparseMatrix(indptr, indices, data, (num_rows, dim))
+
+
+class InvertedIndex:
+    """
+    Inverted index from vocabulary term index to postings
+    Each posting list holds the ids of the vectors containing the term and the term weights
+    """
+
+    # Upper bound on queries x documents accumulator cells per score_many() block
+    SCORE_MANY_CELLS = 1 << 22
+
+    def __init__(self, use_numpy: bool = True):
+        self.use_numpy = use_numpy and np is not None
+        self.postings: Dict[int, tuple] = {}  # term index -> (doc ids, weights)
+        self.num_docs = 0
+
+    def build(self, vectors: List[SparseVector]) -> None:
+        """Builds postings from a list of sparse vectors; vector position is the doc id"""
+        ids: Dict[int, array] = {}
+        weights: Dict[int, array] = {}
+
+        for doc_id, vector in enumerate(vectors):
+            for index, value in vector.items():
+                if index not in ids:
+                    ids[index] = array('i')
+                    weights[index] = array('d')
+                ids[index].append(doc_id)
+                weights[index].append(value)
+
+        if self.use_numpy:
+            self.postings = {
+                index: (np.frombuffer(ids[index], dtype=np.int32), np.asarray(weights[index], dtype=np.float32))
+                for index in ids
+            }
+        else:
+            self.postings = {index: (ids[index], weights[index]) for index in ids}
+        self.num_docs = len(vectors)
+
+    def add(self, vectors: List[SparseVector]) -> None:
+        """Appends vectors; they get doc ids num_docs, num_docs + 1, ..."""
+        ids: Dict[int, List[int]] = {}
+        weights: Dict[int, List[float]] = {}
+
+        for doc_id, vector in enumerate(vectors, self.num_docs):
+            for index, value in vector.items():
+                ids.setdefault(index, []).append(doc_id)
+                weights.setdefault(index, []).append(value)
+
+        # Only posting lists of terms present in the new vectors are touched
+        for index in ids:
+            if self.use_numpy:
+                new_ids = np.asarray(ids[index], dtype=np.int32)
+                new_weights = np.asarray(weights[index], dtype=np.float32)
+                if index in self.postings:
+                    old_ids, old_weights = self.postings[index]
+                    new_ids = np.concatenate((old_ids, new_ids))
+                    new_weights = np.concatenate((old_weights, new_weights))
+                self.postings[index] = (new_ids, new_weights)
+            else:
+                posting = self.postings.setdefault(index, (array('i'), array('d')))
+                posting[0].extend(ids[index])
+                posting[1].extend(weights[index])
+
+        self.num_docs += len(vectors)
+
+    def remove(self, doc_ids: List[int]) -> None:
+        """Removes docs and shifts the remaining ids down to stay contiguous"""
+        if not doc_ids:
+            return
+        removed = sorted(set(doc_ids))
+
+        if self.use_numpy:
+            removed_array = np.asarray(removed, dtype=np.int32)
+            for index in list(self.postings):
+                ids, weights = self.postings[index]
+                keep = ~np.isin(ids, removed_array)
+                ids = ids[keep]
+                if len(ids) == 0:
+                    del self.postings[index]
+                    continue
+                ids = ids - np.searchsorted(removed_array, ids).astype(np.int32)
+                self.postings[index] = (ids, weights[keep])
+        else:
+            removed_set = set(removed)
+            for index in list(self.postings):
+                ids, weights = self.postings[index]
+                kept = [(doc_id, w) for doc_id, w in zip(ids, weights) if doc_id not in removed_set]
+                if not kept:
+                    del self.postings[index]
+                    continue
+                self.postings[index] = (
+                    array('i', (doc_id - bisect.bisect_left(removed, doc_id) for doc_id, _ in kept)),
+                    array('d', (w for _, w in kept))
+                )
+
+        self.num_docs -= len(removed)
+
+    def _range_bounds(self, ranges: Optional[List[Tuple[int, int]]]):
+        """Splits sorted, disjoint [start, end) doc id ranges into (starts, ends)"""
+        if ranges is None:
+            return None
+        starts = [start for start, _ in ranges]
+        ends = [end for _, end in ranges]
+        if self.use_numpy:
+            return np.asarray(starts, dtype=np.int64), np.asarray(ends, dtype=np.int64)
+        return starts, ends
+
+    def _posting(self, index: int, bounds):
+        """
+        Posting of a term, restricted to the doc id ranges in bounds if given
+        Ids are sorted, so each range is a slice found by binary search and
+        the work shrinks with the ranges instead of scanning the whole list
+        """
+        posting = self.postings.get(index)
+        if posting is None or bounds is None:
+            return posting
+
+        ids, weights = posting
+        starts, ends = bounds
+        if self.use_numpy:
+            lows = np.searchsorted(ids, starts)
+            lengths = np.searchsorted(ids, ends) - lows
+            total = int(lengths.sum())
+            if not total:
+                return None
+            # Positions of all slices: arange shifted by each slice's start
+            offsets = np.cumsum(lengths) - lengths
+            positions = np.arange(total) + np.repeat(lows - offsets, lengths)
+            return ids[positions], weights[positions]
+
+        kept_ids, kept_weights = array('i'), array('d')
+        for start, end in zip(starts, ends):
+            low = bisect.bisect_left(ids, start)
+            high = bisect.bisect_left(ids, end, low)
+            kept_ids.extend(ids[low:high])
+            kept_weights.extend(weights[low:high])
+        return (kept_ids, kept_weights) if kept_ids else None
+
+    def score(self, query: SparseVector, ranges: Optional[List[Tuple[int, int]]] = None):
+        """
+        Scores only the documents sharing at least one term with the query
+        ranges limits scoring to doc ids in sorted, disjoint [start, end) ranges
+        Returns (doc ids in ascending order, scores)
+        """
+        bounds = self._range_bounds(ranges)
+
+        if self.use_numpy:
+            hits = [(self._posting(index, bounds), value) for index, value in query.items()]
+            hits = [(posting, value) for posting, value in hits if posting is not None]
+            if not hits:
+                return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+
+            doc_ids = np.concatenate([ids for (ids, _), _ in hits])
+            contributions = np.concatenate([weights * np.float32(value) for (_, weights), value in hits])
+            candidates, positions = np.unique(doc_ids, return_inverse=True)
+            scores = np.bincount(positions, weights=contributions).astype(np.float32)
+            return candidates, scores
+
+        accumulator: Dict[int, float] = {}
+        for index, value in query.items():
+            posting = self._posting(index, bounds)
+            if posting is None:
+                continue
+            for doc_id, weight in zip(*posting):
+                accumulator[doc_id] = accumulator.get(doc_id, 0.0) + value * weight
+
+        candidates = sorted(accumulator)
+        return candidates, [accumulator[doc_id] for doc_id in candidates]
+
+    def score_many(self, queries: List[SparseVector], ranges: Optional[List[Tuple[int, int]]] = None) -> List[Tuple]:
+        """
+        Scores several queries in one pass: each posting list of the union of
+        query terms is read once and scattered to every query using the term
+        Returns score(query, ranges) for every query, with identical values
+        """
+        bounds = self._range_bounds(ranges)
+
+        # term index -> [(query number, query weight)], terms visited in ascending order like score()
+        columns: Dict[int, List[Tuple[int, float]]] = {}
+        for query_id, query in enumerate(queries):
+            for index, value in query.items():
+                if index in self.postings:
+                    columns.setdefault(index, []).append((query_id, value))
+
+        if self.use_numpy:
+            results = []
+            # Dense accumulators, a block of queries at a time to bound memory
+            block_size = max(1, self.SCORE_MANY_CELLS // max(self.num_docs, 1))
+            for block_start in range(0, len(queries), block_size):
+                block_end = min(block_start + block_size, len(queries))
+                accumulator = np.zeros((block_end - block_start, self.num_docs), dtype=np.float64)
+                touched = np.zeros(accumulator.shape, dtype=bool)
+                for index in sorted(columns):
+                    block = [(query_id - block_start, value) for query_id, value in columns[index]
+                             if block_start <= query_id < block_end]
+                    if not block:
+                        continue
+                    posting = self._posting(index, bounds)
+                    if posting is None:
+                        continue
+                    ids, weights = posting
+                    rows = np.asarray([row for row, _ in block], dtype=np.int64)[:, None]
+                    values = np.asarray([value for _, value in block], dtype=np.float32)[:, None]
+                    # Doc ids are unique within a posting list, so no cell is hit twice here;
+                    # summing float32 products in float64 in term order matches score()
+                    accumulator[rows, ids] += values * weights
+                    touched[rows, ids] = True
+
+                for row in range(block_end - block_start):
+                    candidates = np.flatnonzero(touched[row]).astype(np.int32)
+                    results.append((candidates, accumulator[row, candidates].astype(np.float32)))
+            return results
+
+        accumulators: List[Dict[int, float]] = [{} for _ in queries]
+        for index in sorted(columns):
+            posting = self._posting(index, bounds)
+            if posting is None:
+                continue
+            ids, weights = posting
+            for query_id, value in columns[index]:
+                accumulator = accumulators[query_id]
+                for doc_id, weight in zip(ids, weights):
+                    accumulator[doc_id] = accumulator.get(doc_id, 0.0) + value * weight
+
+        results = []
+        for accumulator in accumulators:
+            candidates = sorted(accumulator)
+            results.append((candidates, [accumulator[doc_id] for doc_id in candidates]))
+        return results
+
+
+class IvfIndex:
+    """
+    Inverted-file (IVF) index for approximate nearest-neighbour search
+    Chunks are clustered with spherical k-means; a query scores only the chunks
+    in the num_probes clusters whose centroids are most similar to it.
+    More lists make each list shorter (faster), more probes raise recall.
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        num_lists: int = 0,
+        num_probes: int = 4,
+        iterations: int = 10,
+        seed: int = 42,
+        use_numpy: bool = True
+    ):
+        """
+        Args:
+            dim: Vector dimension
+            num_lists: Number of clusters; 0 picks about sqrt(number of vectors)
+            num_probes: Clusters scanned per query
+            iterations: k-means iterations at build time
+            seed: Seed for the initial centroids
+            use_numpy: Use numpy for clustering when available
+        """
+        self.dim = dim
+        self.num_lists = num_lists
+        self.num_probes = num_probes
+        self.iterations = iterations
+        self.seed = seed
+        self.use_numpy = use_numpy and np is not None
+
+        self.centroids = []                  # unit-length centroid per list
+        self.assignments: List[int] = []     # list number per doc id
+        self.lists: List[List[int]] = []     # doc ids per list, ascending
+        # numpy: the vectors as one CSR matrix with the rows of each list contiguous; see score()
+        self._blocks = None
+
+    def params(self) -> Dict:
+        """Parameters that determine the clustering"""
+        return {
+            "dim": self.dim,
+            "num_lists": self.num_lists,
+            "iterations": self.iterations,
+            "seed": self.seed
+        }
+
+    def build(self, vectors: List[SparseVector]) -> None:
+        """Clusters the vectors and fills the lists"""
+        if not vectors:
+            self.centroids, self.assignments, self.lists = [], [], []
+            return
+
+        num_lists = self.num_lists or max(1, int(math.sqrt(len(vectors))))
+        num_lists = min(num_lists, len(vectors))
+
+        # Initial centroids: distinct random vectors
+        rng = random.Random(self.seed)
+        centroids = [vectors[i].to_dense() for i in sorted(rng.sample(range(len(vectors)), num_lists))]
+        if self.use_numpy:
+            centroids = np.asarray(centroids, dtype=np.float32)
+
+        flat = self._flatten(vectors) if self.use_numpy else None
+        assignments: List[int] = []
+        for _ in range(max(1, self.iterations)):
+            new_assignments = self._assign(vectors, centroids, flat)
+            if new_assignments == assignments:
+                break
+            assignments = new_assignments
+            centroids = self._update_centroids(vectors, assignments, centroids, flat)
+
+        self.centroids = centroids
+        self.assignments = assignments
+        self._rebuild_lists()
+
+    def restore(self, centroids: List[List[float]], assignments: List[int]) -> None:
+        """Restores a previously built clustering"""
+        self.centroids = np.asarray(centroids, dtype=np.float32) if self.use_numpy else centroids
+        self.assignments = list(assignments)
+        self._rebuild_lists()
+
+    def to_dict(self) -> Dict:
+        """Centroids and assignments for persistence"""
+        centroids = self.centroids.tolist() if self.use_numpy else self.centroids
+        return {"centroids": centroids, "assignments": self.assignments}
+
+    def add(self, vectors: List[SparseVector]) -> None:
+        """Assigns new vectors to their nearest lists; doc ids continue after the existing ones"""
+        if len(self.centroids) == 0:
+            self.build(vectors)
+            return
+        for list_number in self._assign(vectors, self.centroids):
+            self.lists[list_number].append(len(self.assignments))
+            self.assignments.append(list_number)
+        self._blocks = None
+
+    def remove(self, doc_ids: List[int]) -> None:
+        """Removes docs and shifts the remaining ids down to stay contiguous"""
+        removed = set(doc_ids)
+        self.assignments = [a for doc_id, a in enumerate(self.assignments) if doc_id not in removed]
+        self._rebuild_lists()
+
+    def _probes(self, query: SparseVector) -> List[int]:
+        """Numbers of the num_probes lists whose centroids are most similar to the query"""
+        if len(self.centroids) == 0:
+            return []
+        num_probes = min(self.num_probes, len(self.centroids))
+        if self.use_numpy:
+            # Highest similarity first; ties go to the lower list number
+            similarities = self.centroids[:, np.asarray(query.indices, dtype=np.int64)] @ np.asarray(
+                query.values, dtype=np.float32
+            )
+            return np.argsort(-similarities, kind='stable')[:num_probes].tolist()
+        similarities = self._centroid_similarities(query)
+        return heapq.nlargest(
+            num_probes,
+            range(len(similarities)),
+            key=lambda i: similarities[i]
+        )
+
+    def candidates(self, query: SparseVector) -> List[int]:
+        """Ids of docs in the lists closest to the query, ascending"""
+        return sorted(doc_id for list_number in self._probes(query) for doc_id in self.lists[list_number])
+
+    def score(self, query: SparseVector, vectors, ranges: Optional[List[Tuple[int, int]]] = None):
+        """
+        Scores the docs in the lists closest to the query; vectors are the indexed vectors by doc id
+        ranges limits scoring to doc ids in sorted, disjoint [start, end) ranges
+        Returns (doc ids in ascending order, scores) of the docs with a positive score, like InvertedIndex.score()
+        """
+        probes = self._probes(query)
+
+        if not self.use_numpy:
+            query_weights = dict(query.items())
+            doc_ids = sorted(doc_id for list_number in probes for doc_id in self.lists[list_number])
+            if ranges is not None:
+                starts = [start for start, _ in ranges]
+                doc_ids = [doc_id for doc_id in doc_ids if in_ranges(doc_id, ranges, starts)]
+            candidates, scores = [], []
+            for doc_id in doc_ids:
+                vector = vectors[doc_id]
+                score = sum(value * query_weights.get(index, 0.0) for index, value in vector.items())
+                if score > 0:
+                    candidates.append(doc_id)
+                    scores.append(score)
+            return candidates, scores
+
+        order, list_ptr, row_ptr, rows, indices, data = self._ensure_blocks(vectors)
+        dense_query = np.zeros(self.dim, dtype=np.float32)
+        dense_query[np.asarray(query.indices, dtype=np.int64)] = np.asarray(query.values, dtype=np.float32)
+
+        # Each probed list is a contiguous slice of rows: gather, multiply and sum per row
+        doc_parts, score_parts = [], []
+        for list_number in probes:
+            first, last = int(list_ptr[list_number]), int(list_ptr[list_number + 1])
+            if first == last:
+                continue
+            low, high = int(row_ptr[first]), int(row_ptr[last])
+            products = data[low:high] * dense_query[indices[low:high]]
+            doc_parts.append(order[first:last])
+            score_parts.append(np.bincount(rows[low:high], weights=products, minlength=last - first))
+        if not doc_parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        doc_ids = np.concatenate(doc_parts)
+        scores = np.concatenate(score_parts)
+        keep = scores > 0
+        if ranges is not None:
+            starts = np.asarray([start for start, _ in ranges], dtype=np.int64)
+            ends = np.asarray([end for _, end in ranges], dtype=np.int64)
+            positions = np.searchsorted(starts, doc_ids, side='right') - 1
+            keep &= (positions >= 0) & (doc_ids < ends[np.maximum(positions, 0)])
+        doc_ids, scores = doc_ids[keep], scores[keep]
+        ascending = np.argsort(doc_ids, kind='stable')
+        return doc_ids[ascending], scores[ascending].astype(np.float32)
+
+    def _ensure_blocks(self, vectors):
+        """
+        Builds the list-ordered CSR matrix if the lists changed since it was built:
+        (doc id per row, first row per list, first entry per row, row within its list per entry,
+        term indices, weights)
+        """
+        if self._blocks is None:
+            order = np.fromiter(
+                (doc_id for ids in self.lists for doc_id in ids), dtype=np.int64, count=len(self.assignments)
+            )
+            list_ptr = np.zeros(len(self.lists) + 1, dtype=np.int64)
+            np.cumsum([len(ids) for ids in self.lists], out=list_ptr[1:])
+            rows, indices, data = self._flatten([vectors[int(doc_id)] for doc_id in order])
+            row_ptr = np.searchsorted(rows, np.arange(len(order) + 1))
+            # Row numbers within their list, so each list's slice sums straight into its own rows
+            list_sizes = np.diff(list_ptr)
+            rows = rows - np.repeat(list_ptr[:-1], list_sizes)[rows]
+            self._blocks = (order, list_ptr, row_ptr, rows, indices, data.astype(np.float32))
+        return self._blocks
+
+    def _rebuild_lists(self) -> None:
+        self.lists = [[] for _ in range(len(self.centroids))]
+        for doc_id, list_number in enumerate(self.assignments):
+            self.lists[list_number].append(doc_id)
+        self._blocks = None
+
+    def _centroid_similarities(self, vector: SparseVector):
+        if self.use_numpy:
+            indices = np.asarray(vector.indices, dtype=np.int64)
+            values = np.asarray(vector.values, dtype=np.float32)
+            return (self.centroids[:, indices] @ values).tolist()
+        return [sum(centroid[i] * v for i, v in vector.items()) for centroid in self.centroids]
+
+    def _assign(self, vectors: List[SparseVector], centroids, flat=None) -> List[int]:
+        """
+        Nearest centroid (highest dot product) for each vector
+        flat: optional precomputed _flatten(vectors)
+        """
+        if not self.use_numpy:
+            assignments = []
+            for vector in vectors:
+                similarities = [sum(centroid[i] * v for i, v in vector.items()) for centroid in centroids]
+                assignments.append(max(range(len(similarities)), key=similarities.__getitem__))
+            return assignments
+
+        rows, indices, data = flat if flat is not None else self._flatten(vectors)
+        assignments = np.empty(len(vectors), dtype=np.int64)
+
+        # Densify in batches to bound memory
+        batch_size = 1024
+        for start in range(0, len(vectors), batch_size):
+            end = min(start + batch_size, len(vectors))
+            lo, hi = np.searchsorted(rows, [start, end])
+            dense = np.zeros((end - start, self.dim), dtype=np.float32)
+            dense[rows[lo:hi] - start, indices[lo:hi]] = data[lo:hi]
+            assignments[start:end] = np.argmax(dense @ centroids.T, axis=1)
+        return assignments.tolist()
+
+    def _update_centroids(self, vectors: List[SparseVector], assignments: List[int], centroids, flat=None):
+        """Mean of each list, normalized; empty lists keep their centroid"""
+        num_lists = len(centroids)
+
+        if self.use_numpy:
+            rows, indices, data = flat if flat is not None else self._flatten(vectors)
+            labels = np.asarray(assignments, dtype=np.int64)
+            sums = np.zeros((num_lists, self.dim), dtype=np.float64)
+            np.add.at(sums, (labels[rows], indices), data)
+            magnitudes = np.linalg.norm(sums, axis=1)
+            keep = magnitudes == 0
+            magnitudes[keep] = 1.0
+            updated = (sums / magnitudes[:, None]).astype(np.float32)
+            updated[keep] = centroids[keep]
+            return updated
+
+        sums = [[0.0] * self.dim for _ in range(num_lists)]
+        for vector, list_number in zip(vectors, assignments):
+            total = sums[list_number]
+            for i, v in vector.items():
+                total[i] += v
+
+        updated = []
+        for list_number in range(num_lists):
+            magnitude = math.sqrt(sum(v * v for v in sums[list_number]))
+            if magnitude == 0:
+                updated.append(list(centroids[list_number]))
+            else:
+                updated.append([v / magnitude for v in sums[list_number]])
+        return updated
+
+    @staticmethod
+    def _flatten(vectors: List[SparseVector]):
+        """Row ids, term indices and weights of all non-zero entries as numpy arrays"""
+        lengths = np.fromiter((len(vector) for vector in vectors), dtype=np.int64, count=len(vectors))
+        rows = np.repeat(np.arange(len(vectors)), lengths)
+        indices = np.fromiter(
+            (index for vector in vectors for index in vector.indices), dtype=np.int64, count=int(lengths.sum())
+        )
+        data = np.fromiter(
+            (value for vector in vectors for value in vector.values), dtype=np.float64, count=int(lengths.sum())
+        )
+        return rows, indices, data
+
+
+class Bm25Index:
+    """
+    BM25 index over the full token vocabulary (not limited to MAX_FEATURES)
+    Postings hold doc ids in ascending order and term frequencies. Top-k
+    search uses MaxScore pruning: documents that only contain low-impact
+    terms whose combined upper bounds cannot beat the current k-th score are
+    never scored.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Tuple[array, array]] = {}  # term -> (doc ids, term frequencies)
+        self.doc_lengths = array('i')
+        self.total_length = 0
+        # Per-term bounds for MaxScore; they may go stale (looser) after removals but stay valid
+        self.max_tf: Dict[str, int] = {}
+        self.min_length: Dict[str, int] = {}
+
+    @property
+    def num_docs(self) -> int:
+        return len(self.doc_lengths)
+
+    def build(self, doc_counts: List[Dict[str, int]]) -> None:
+        """Builds postings from per-document term counts; list position is the doc id"""
+        self.postings = {}
+        self.doc_lengths = array('i')
+        self.total_length = 0
+        self.max_tf = {}
+        self.min_length = {}
+        self.add(doc_counts)
+
+    def add(self, doc_counts: List[Dict[str, int]]) -> None:
+        """Appends documents; they get doc ids after the existing ones"""
+        for counts in doc_counts:
+            doc_id = len(self.doc_lengths)
+            length = sum(counts.values())
+            self.doc_lengths.append(length)
+            self.total_length += length
+
+            for term, tf in counts.items():
+                posting = self.postings.get(term)
+                if posting is None:
+                    posting = self.postings[term] = (array('i'), array('i'))
+                    self.max_tf[term] = tf
+                    self.min_length[term] = length
+                else:
+                    self.max_tf[term] = max(self.max_tf[term], tf)
+                    self.min_length[term] = min(self.min_length[term], length)
+                posting[0].append(doc_id)
+                posting[1].append(tf)
+
+    def remove(self, doc_ids: List[int]) -> None:
+        """Removes docs and shifts the remaining ids down to stay contiguous"""
+        removed = sorted(set(doc_ids))
+        removed_set = set(removed)
+
+        for term in list(self.postings):
+            ids, tfs = self.postings[term]
+            kept = [(doc_id, tf) for doc_id, tf in zip(ids, tfs) if doc_id not in removed_set]
+            if not kept:
+                del self.postings[term]
+                del self.max_tf[term]
+                del self.min_length[term]
+                continue
+            if len(kept) != len(ids):
+                ids = array('i', (doc_id for doc_id, _ in kept))
+                tfs = array('i', (tf for _, tf in kept))
+            self.postings[term] = (
+                array('i', (doc_id - bisect.bisect_left(removed, doc_id) for doc_id in ids)),
+                tfs
+            )
+
+        self.total_length -= sum(self.doc_lengths[doc_id] for doc_id in removed)
+        self.doc_lengths = array('i', (length for doc_id, length in enumerate(self.doc_lengths)
+                                       if doc_id not in removed_set))
+
+    def idf(self, term: str) -> float:
+        """BM25 IDF, always positive: log(1 + (N - df + 0.5) / (df + 0.5))"""
+        df = len(self.postings[term][0])
+        return math.log(1.0 + (self.num_docs - df + 0.5) / (df + 0.5))
+
+    def search(
+        self,
+        terms: List[str],
+        top_k: int,
+        prune: bool = True,
+        ranges: Optional[List[Tuple[int, int]]] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Returns up to top_k (doc id, score) pairs, best first, ties by doc id
+        prune=False scores every document containing a query term (for comparison)
+        ranges limits results to doc ids in sorted, disjoint [start, end) ranges;
+        the cursors jump over the gaps instead of visiting them
+        """
+        if top_k <= 0 or not self.num_docs:
+            return []
+
+        k1, b = self.k1, self.b
+        average_length = self.total_length / self.num_docs or 1.0
+        doc_lengths = self.doc_lengths
+
+        # (upper bound, idf, doc ids, tfs) per distinct query term present in the index
+        lists = []
+        for term in dict.fromkeys(terms):
+            if term not in self.postings:
+                continue
+            idf = self.idf(term)
+            max_tf = self.max_tf[term]
+            norm = k1 * (1.0 - b + b * self.min_length[term] / average_length)
+            upper_bound = idf * max_tf * (k1 + 1.0) / (max_tf + norm)
+            ids, tfs = self.postings[term]
+            lists.append((upper_bound if prune else math.inf, idf, ids, tfs))
+
+        if not lists:
+            return []
+
+        # Lowest upper bounds first; cumulative[i] = sum of bounds of lists[0..i]
+        lists.sort(key=lambda item: item[0])
+        cumulative = []
+        total = 0.0
+        for upper_bound, _, _, _ in lists:
+            total += upper_bound
+            cumulative.append(total)
+
+        pointers = [0] * len(lists)
+        range_starts = [start for start, _ in ranges] if ranges is not None else None
+        heap: List[Tuple[float, int]] = []  # (score, -doc id); heap[0] is the current k-th best
+        threshold = -math.inf
+        first_essential = 0  # lists[:first_essential] cannot lift a document into the top k on their own
+
+        def contribution(idf: float, tf: int, doc_id: int) -> float:
+            norm = k1 * (1.0 - b + b * doc_lengths[doc_id] / average_length)
+            return idf * tf * (k1 + 1.0) / (tf + norm)
+
+        while True:
+            # Next candidate: smallest current doc id among the essential lists
+            doc_id = None
+            for i in range(first_essential, len(lists)):
+                ids = lists[i][2]
+                if pointers[i] < len(ids) and (doc_id is None or ids[pointers[i]] < doc_id):
+                    doc_id = ids[pointers[i]]
+            if doc_id is None:
+                break
+
+            if ranges is not None:
+                position = bisect.bisect_right(range_starts, doc_id) - 1
+                if position < 0 or doc_id >= ranges[position][1]:
+                    # Outside the ranges: move the essential cursors to the next range
+                    if position + 1 == len(ranges):
+                        break
+                    next_start = range_starts[position + 1]
+                    for i in range(first_essential, len(lists)):
+                        pointers[i] = bisect.bisect_left(lists[i][2], next_start, pointers[i])
+                    continue
+
+            parts = []
+            for i in range(first_essential, len(lists)):
+                _, idf, ids, tfs = lists[i]
+                position = pointers[i]
+                if position < len(ids) and ids[position] == doc_id:
+                    parts.append(contribution(idf, tfs[position], doc_id))
+                    pointers[i] = position + 1
+            score = sum(parts)
+
+            # Non-essential lists, highest bound first, while the document can still make it
+            for i in range(first_essential - 1, -1, -1):
+                if score + cumulative[i] <= threshold:
+                    break
+                _, idf, ids, tfs = lists[i]
+                position = bisect.bisect_left(ids, doc_id, pointers[i])
+                pointers[i] = position
+                if position < len(ids) and ids[position] == doc_id:
+                    parts.append(contribution(idf, tfs[position], doc_id))
+                    score += parts[-1]
+
+            # Exactly rounded, so the score does not depend on the order lists were visited
+            score = math.fsum(parts)
+
+            if len(heap) < top_k:
+                heapq.heappush(heap, (score, -doc_id))
+            elif score > threshold:
+                heapq.heapreplace(heap, (score, -doc_id))
+            else:
+                continue
+
+            if len(heap) == top_k:
+                threshold = heap[0][0]
+                while first_essential < len(lists) and cumulative[first_essential] <= threshold:
+                    first_essential += 1
+
+        return [(-neg_id, score) for score, neg_id in sorted(heap, key=lambda item: (-item[0], -item[1]))]
 
 
 class TfidfVectorizer:
@@ -40,64 +885,97 @@ class TfidfVectorizer:
         "been", "being", "do", "does", "did", "doing"
     }
 
+    # Joins a batch of texts for tokenization; whitespace, so it never ends up inside a token
+    BATCH_SEPARATOR = '\x1c'
+
     def __init__(self):
+        # Maximal runs of [a-z0-9] that are long enough; see tokenize()
+        self._token_pattern = re.compile(r'[a-z0-9]{%d,}' % max(1, self.MIN_WORD_LENGTH))
         self.vocabulary: Dict[str, int] = {}
         self.idf_scores: Dict[str, float] = {}
         self.num_documents = 0
+        # Counts over all terms (not only the vocabulary), kept for partial_fit()
+        self.document_frequency: Dict[str, int] = {}
+        self.total_frequency: Dict[str, int] = {}
+        # Prints a line after every fit when True
+        self.verbose = True
 
     def tokenize(self, text: str) -> List[str]:
         """
         Tokenizes and cleans text
-        Port from Kotlin tokenize() method
+        Port from Kotlin tokenize() method: lowercase, replace everything but
+        a-z, 0-9 and whitespace with spaces, split, drop short and stop words.
+        Matching the runs of [a-z0-9] directly gives the same tokens in one pass
         """
-        # Lowercase
-        text = text.lower()
-
-        # Replace non-alphanumeric with spaces (keep only a-z, 0-9, spaces)
-        text = re.sub(r'[^a-z0-9\s]', ' ', text)
-
-        # Split on whitespace
-        tokens = text.split()
-
-        # Filter by length and stop words
-        tokens = [
-            token for token in tokens
-            if len(token) >= self.MIN_WORD_LENGTH and token not in self.STOP_WORDS
+        stop_words = self.STOP_WORDS
+        return [token for token in self._token_pattern.findall(text.lower()) if token not in stop_words]
+
+    def iter_tokens(self, text: str) -> Iterator[str]:
+        """Yields the tokens of tokenize() one at a time without building the list"""
+        stop_words = self.STOP_WORDS
+        for match in self._token_pattern.finditer(text.lower()):
+            token = match.group()
+            if token not in stop_words:
+                yield token
+
+    def tokenize_batch(self, texts: List[str]) -> List[List[str]]:
+        """
+        Tokenizes many texts with one lower() over the joined batch
+        Returns the same tokens as tokenize() for each text
+        """
+        separator = self.BATCH_SEPARATOR
+        if any(separator in text for text in texts):
+            return [self.tokenize(text) for text in texts]
+
+        findall = self._token_pattern.findall
+        stop_words = self.STOP_WORDS
+        return [
+            [token for token in findall(part) if token not in stop_words]
+            for part in separator.join(texts).lower().split(separator)
         ]
 
-        return tokens
-
     def fit(self, documents: List[str]) -> None:
         """
         Builds vocabulary and IDF scores from document collection
         Port from Kotlin fit() method
         """
+        self.fit_counts(documents)
+
+    def fit_counts(self, documents: Iterable[str]) -> List[Counter]:
+        """
+        Fits the vocabulary and returns the per-document term counts
+        (all terms, not only the vocabulary); see transform_counts()
+        documents may be any iterable, e.g. a stream of chunks; it is consumed once
+        """
         self.vocabulary.clear()
         self.idf_scores.clear()
-        self.num_documents = len(documents)
-
-        if not documents:
-            return
+        self.document_frequency = {}
+        self.total_frequency = {}
+        self.num_documents = 0
 
         # Count document frequency AND total frequency for each term
-        document_frequency: Dict[str, int] = {}
-        total_frequency: Dict[str, int] = {}
+        doc_counts = self._update_counts(documents, 1)
 
-        for doc in documents:
-            tokens = self.tokenize(doc)
+        if not doc_counts:
+            return []
 
-            # Count total occurrences across all documents
-            for token in tokens:
-                total_frequency[token] = total_frequency.get(token, 0) + 1
+        self.fit_vocabulary()
+        if self.verbose:
+            print(f"[TfidfVectorizer] Fitted on {len(doc_counts)} documents, vocabulary size: {len(self.vocabulary)}")
 
-            # Count in how many documents each term appears
-            unique_tokens = set(tokens)
-            for token in unique_tokens:
-                document_frequency[token] = document_frequency.get(token, 0) + 1
+        return doc_counts
+
+    def fit_vocabulary(self) -> None:
+        """
+        Builds the vocabulary and IDF scores from the current frequency counts
+        Ties in total frequency keep the order in which terms were first counted
+        """
+        self.vocabulary = {}
+        self.idf_scores = {}
 
         # Sort by TOTAL frequency (not document frequency) and take top MAX_FEATURES
         sorted_terms = sorted(
-            total_frequency.items(),
+            self.total_frequency.items(),
             key=lambda x: x[1],
             reverse=True
         )[:self.MAX_FEATURES]
@@ -105,49 +983,211 @@ class TfidfVectorizer:
         # Build vocabulary and calculate IDF
         for index, (term, _) in enumerate(sorted_terms):
             self.vocabulary[term] = index
-            df = document_frequency.get(term, 1)
-            # IDF = log((N + 1) / (df + 1)) + 1 to avoid zero and negative values
-            self.idf_scores[term] = math.log10((self.num_documents + 1) / (df + 1)) + 1.0
+            self.idf_scores[term] = self._idf(term)
+
+    def _idf(self, term: str) -> float:
+        """IDF of a term from the current document frequency counts"""
+        df = self.document_frequency.get(term, 0)
+        # IDF = log((N + 1) / (df + 1)) + 1 to avoid zero and negative values
+        return math.log10((self.num_documents + 1) / (df + 1)) + 1.0
 
-        print(f"[TfidfVectorizer] Fitted on {len(documents)} documents, vocabulary size: {len(self.vocabulary)}")
+    def _update_counts(self, documents: Iterable[str], sign: int) -> List[Counter]:
+        """
+        Adds (sign=1) or subtracts (sign=-1) documents from the frequency counts
+        Returns the term counts of each document
+        """
+        document_frequency = self.document_frequency
+        total_frequency = self.total_frequency
+        doc_counts = []
+
+        for doc in documents:
+            counts = self.count_terms(doc)
+            doc_counts.append(counts)
+
+            for token, count in counts.items():
+                # Count total occurrences across all documents
+                total_frequency[token] = total_frequency.get(token, 0) + sign * count
+                # Count in how many documents each term appears
+                document_frequency[token] = document_frequency.get(token, 0) + sign
+
+            if sign < 0:
+                for token in counts:
+                    if total_frequency[token] <= 0:
+                        del total_frequency[token]
+                    if document_frequency[token] <= 0:
+                        del document_frequency[token]
+
+        self.num_documents += sign * len(doc_counts)
+        return doc_counts
+
+    def count_terms(self, text: str) -> Counter:
+        """Term counts of one document"""
+        # Counter keeps first-occurrence order, so new terms are added in token order
+        return Counter(self.tokenize(text))
+
+    def partial_fit(self, documents: List[str]) -> None:
+        """
+        Adds documents to the frequency counts without touching the fitted
+        vocabulary and IDF scores; see idf_drift() and count_new_top_terms()
+        """
+        self._update_counts(documents, 1)
+
+    def partial_fit_counts(self, documents: List[str]) -> List[Counter]:
+        """partial_fit() that also returns the per-document term counts"""
+        return self._update_counts(documents, 1)
+
+    def partial_fit_transform_sparse(self, documents: List[str]) -> List[SparseVector]:
+        """partial_fit() plus transform_sparse() of the same documents, tokenizing each once"""
+        return [self.transform_counts(counts) for counts in self.partial_fit_counts(documents)]
+
+    def partial_forget(self, documents: List[str]) -> None:
+        """Removes previously counted documents from the frequency counts"""
+        self._update_counts(documents, -1)
+
+    def idf_drift(self) -> float:
+        """
+        Largest relative difference between the fitted IDF scores and the
+        IDF scores implied by the current counts
+        """
+        drift = 0.0
+        for term, fitted_idf in self.idf_scores.items():
+            drift = max(drift, abs(self._idf(term) - fitted_idf) / fitted_idf)
+        return drift
+
+    def count_new_top_terms(self) -> int:
+        """Number of terms in the current top MAX_FEATURES missing from the vocabulary"""
+        top_terms = heapq.nlargest(
+            self.MAX_FEATURES,
+            self.total_frequency.items(),
+            key=lambda x: x[1]
+        )
+        return sum(1 for term, _ in top_terms if term not in self.vocabulary)
 
     def transform(self, text: str) -> List[float]:
         """
         Transforms a single document into a TF-IDF vector
         Port from Kotlin transform() method
         """
-        if not self.vocabulary:
+        if not self.idf_scores:
             # If not fitted, return zero vector
             print("[WARNING] Vectorizer not fitted! Returning zero vector")
             return [0.0] * self.MAX_FEATURES
 
-        tokens = self.tokenize(text)
-        term_frequency: Dict[str, int] = {}
+        return self.transform_sparse(text).to_dense()
+
+    def transform_sparse(self, text: str) -> SparseVector:
+        """
+        Transforms a single document into a sparse TF-IDF vector
+        Same weights as transform(), without the zero entries
+        """
+        if not self.idf_scores:
+            return SparseVector([], [], self.MAX_FEATURES)
 
-        # Count term frequency
-        found_terms = 0
-        for token in tokens:
-            if token in self.vocabulary:
-                term_frequency[token] = term_frequency.get(token, 0) + 1
-                found_terms += 1
+        return self.transform_counts(self.count_terms(text))
 
-        # Calculate TF-IDF vector
-        vector = [0.0] * self.MAX_FEATURES
+    def transform_counts(self, counts: Dict[str, int]) -> SparseVector:
+        """Builds the normalized sparse TF-IDF vector from a document's term counts"""
+        total_tokens = sum(counts.values())
 
-        for term, tf in term_frequency.items():
-            if term not in self.vocabulary:
+        # Calculate TF-IDF weights
+        weights: Dict[int, float] = {}
+        for term, tf in counts.items():
+            index = self.vocabulary.get(term)
+            if index is None:
                 continue
-
-            index = self.vocabulary[term]
             idf = self.idf_scores.get(term, 0.0)
             # TF-IDF = (tf / total_tokens) * idf
-            tfidf = (tf / len(tokens)) * idf if len(tokens) > 0 else 0.0
-            vector[index] = tfidf
+            weights[index] = (tf / total_tokens) * idf
+
+        indices = sorted(weights)
+        values = [weights[index] for index in indices]
 
         # Normalize vector to unit length
-        normalized = self._normalize_vector(vector)
+        magnitude = math.sqrt(sum(v * v for v in values))
+        if magnitude > 0:
+            values = [v / magnitude for v in values]
+
+        return SparseVector(indices, values, self.MAX_FEATURES)
 
-        return normalized
+    def transform_batch(self, texts: Iterable[str], sparse: bool = False, batch_size: int = 1024):
+        """
+        Transforms many texts at once
+        Returns a float32 matrix (num_texts x MAX_FEATURES), or a SparseMatrix if sparse=True
+        Without numpy the dense result is a list of float lists
+        Texts are processed batch_size at a time to bound intermediate memory
+        """
+        batches = list(self.iter_transform_batch(texts, sparse=sparse, batch_size=batch_size))
+
+        if sparse:
+            return SparseMatrix.vstack(batches, self.MAX_FEATURES)
+        if np is not None:
+            if not batches:
+                return np.zeros((0, self.MAX_FEATURES), dtype=np.float32)
+            return np.concatenate(batches)
+        return [row for batch in batches for row in batch]
+
+    def iter_transform_batch(self, texts: Iterable[str], sparse: bool = False, batch_size: int = 1024) -> Iterator:
+        """Yields transform_batch() results for consecutive batches of batch_size texts"""
+        batch: List[str] = []
+        for text in texts:
+            batch.append(text)
+            if len(batch) >= batch_size:
+                matrix = self._transform_batch(batch)
+                yield matrix if sparse else matrix.to_dense()
+                batch = []
+
+        if batch:
+            matrix = self._transform_batch(batch)
+            yield matrix if sparse else matrix.to_dense()
+
+    def _transform_batch(self, texts: List[str]) -> SparseMatrix:
+        """Builds the normalized CSR matrix for one batch"""
+        if not self.idf_scores:
+            print("[WARNING] Vectorizer not fitted! Returning zero vectors")
+
+        vocabulary = self.vocabulary
+        idf_scores = self.idf_scores
+        indptr, indices, data = [0], [], []
+
+        for tokens in self.tokenize_batch(texts):
+            # Raw TF-IDF weights = (tf / total_tokens) * idf, sorted by vocabulary index
+            weights: Dict[int, float] = {}
+            for term, tf in Counter(tokens).items():
+                index = vocabulary.get(term)
+                if index is not None:
+                    weights[index] = (tf / len(tokens)) * idf_scores.get(term, 0.0)
+
+            for index in sorted(weights):
+                indices.append(index)
+                data.append(weights[index])
+            indptr.append(len(indices))
+
+        shape = (len(texts), self.MAX_FEATURES)
+
+        if np is None:
+            # Normalize each row to unit length
+            for i in range(len(texts)):
+                start, end = indptr[i], indptr[i + 1]
+                magnitude = math.sqrt(sum(v * v for v in data[start:end]))
+                if magnitude > 0:
+                    data[start:end] = [v / magnitude for v in data[start:end]]
+            return SparseMatrix(array('q', indptr), array('i', indices), array('d', data), shape)
+
+        indptr_array = np.asarray(indptr, dtype=np.int64)
+        data_array = np.asarray(data, dtype=np.float64)
+
+        # Normalize all rows to unit length at once
+        rows = np.repeat(np.arange(len(texts)), np.diff(indptr_array))
+        magnitudes = np.sqrt(np.bincount(rows, weights=data_array * data_array, minlength=len(texts)))
+        magnitudes[magnitudes == 0] = 1.0
+        data_array /= magnitudes[rows]
+
+        return SparseMatrix(
+            indptr_array,
+            np.asarray(indices, dtype=np.int32),
+            data_array.astype(np.float32),
+            shape
+        )
 
     def _normalize_vector(self, vector: List[float]) -> List[float]:
         """
@@ -166,8 +1206,14 @@ class TfidfVectorizer:
         Fits and transforms documents in one step
         Port from Kotlin fitTransform() method
         """
-        self.fit(documents)
-        return [self.transform(doc) for doc in documents]
+        return [vector.to_dense() for vector in self.fit_transform_sparse(documents)]
+
+    def fit_transform_sparse(self, documents: Iterable[str]) -> List[SparseVector]:
+        """
+        Fits and transforms documents into sparse vectors
+        Reuses the term counts from the fit pass, so each document is tokenized once
+        """
+        return [self.transform_counts(counts) for counts in self.fit_counts(documents)]
 
     def cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
         """
@@ -185,6 +1231,849 @@ class TfidfVectorizer:
         """Returns the vocabulary size"""
         return len(self.vocabulary)
 
+    def full_similarity(self, query_counts: Dict, doc_counts: Dict) -> float:
+        """
+        Cosine similarity of TF-IDF weights over every counted term, not only
+        the MAX_FEATURES vocabulary, with IDF from the current counts
+        Slower than the embeddings; meant for rescoring a few candidates
+        """
+        query_total = sum(query_counts.values())
+        doc_total = sum(doc_counts.values())
+        if not query_total or not doc_total:
+            return 0.0
+
+        idf = {term: self._idf(term) for term in query_counts.keys() | doc_counts.keys()}
+        query_weights = {term: tf / query_total * idf[term] for term, tf in query_counts.items()}
+        doc_weights = {term: tf / doc_total * idf[term] for term, tf in doc_counts.items()}
+
+        dot = sum(weight * doc_weights.get(term, 0.0) for term, weight in query_weights.items())
+        query_norm = math.sqrt(sum(w * w for w in query_weights.values()))
+        doc_norm = math.sqrt(sum(w * w for w in doc_weights.values()))
+        return dot / (query_norm * doc_norm)
+
+    def to_dict(self) -> Dict:
+        """Fitted state and frequency counts as JSON-serializable data"""
+        return {
+            "vocabulary": self.vocabulary,
+            "idf_scores": self.idf_scores,
+            "num_documents": self.num_documents,
+            "document_frequency": self.document_frequency,
+            "total_frequency": self.total_frequency
+        }
+
+    def load_dict(self, data: Dict) -> None:
+        """Restores the state written by to_dict()"""
+        self.vocabulary = data["vocabulary"]
+        self.idf_scores = data["idf_scores"]
+        self.num_documents = data["num_documents"]
+        self.document_frequency = data["document_frequency"]
+        self.total_frequency = data["total_frequency"]
+
+
+class HashingTfidfVectorizer(TfidfVectorizer):
+    """
+    TF-IDF over hashed terms: each term maps to one of n_features buckets
+    through a stable hash (CRC32), so there is no vocabulary to fit or keep
+    in memory, and any term can be embedded
+
+    IDF is kept per bucket. Document frequencies are plain counts, so a
+    corpus can be streamed in one pass and vectorizers fitted on separate
+    shards can be merged. Buckets never seen in the corpus get the IDF of
+    df = 0 instead of being dropped, so vectors can be re-weighted exactly
+    when the counts change (see reweight())
+    """
+
+    def __init__(self, n_features: int = 1 << 18):
+        super().__init__()
+        self.MAX_FEATURES = n_features
+        # Keys of document_frequency, total_frequency and idf_scores are bucket indices
+        self.unseen_idf = 1.0
+
+    def bucket(self, term: str) -> int:
+        """Bucket index of a term; stable across processes and runs"""
+        return zlib.crc32(term.encode('utf-8')) % self.MAX_FEATURES
+
+    def count_terms(self, text: str) -> Counter:
+        """Bucket counts of one document"""
+        n_features = self.MAX_FEATURES
+        crc32 = zlib.crc32
+        return Counter(crc32(token.encode('utf-8')) % n_features for token in self.tokenize(text))
+
+    def fit_counts(self, documents: Iterable[str]) -> List[Counter]:
+        """
+        Counts bucket frequencies and fixes the IDF scores
+        Returns the per-document bucket counts; see transform_counts()
+        """
+        self.document_frequency = {}
+        self.total_frequency = {}
+        self.num_documents = 0
+
+        doc_counts = self._update_counts(documents, 1)
+        self.fix_idf()
+
+        if self.verbose:
+            print(f"[HashingTfidfVectorizer] Fitted on {len(doc_counts)} documents, {len(self.idf_scores)} buckets in use")
+
+        return doc_counts
+
+    def fit_transform_sparse(self, documents: Iterable[str]) -> List[SparseVector]:
+        """
+        Fits and transforms a stream in one pass without holding term counts:
+        each document is embedded with unit IDF as it is read, then all
+        vectors are re-weighted once the document frequencies are known
+        """
+        self.idf_scores = {}
+        self.unseen_idf = 1.0
+        self.document_frequency = {}
+        self.total_frequency = {}
+        self.num_documents = 0
+
+        vectors = []
+        for doc in documents:
+            counts = self._update_counts([doc], 1)[0]
+            vectors.append(self.transform_counts(counts))
+
+        self.fix_idf()
+        if self.verbose:
+            print(f"[HashingTfidfVectorizer] Fitted on {len(vectors)} documents, {len(self.idf_scores)} buckets in use")
+
+        return self.reweight(vectors, {}, 1.0)
+
+    def fix_idf(self) -> None:
+        """Sets the IDF scores used by transform_counts() from the current counts"""
+        self.idf_scores = {bucket: self._idf(bucket) for bucket in self.document_frequency}
+        self.unseen_idf = math.log10(self.num_documents + 1) + 1.0
+
+    def count_new_top_terms(self) -> int:
+        """Always 0: there is no vocabulary that new terms could be missing from"""
+        return 0
+
+    def transform_sparse(self, text: str) -> SparseVector:
+        """Transforms a single document into a sparse TF-IDF vector over the buckets"""
+        return self.transform_counts(self.count_terms(text))
+
+    def transform_counts(self, counts: Dict[int, int]) -> SparseVector:
+        """Builds the normalized sparse TF-IDF vector from a document's bucket counts"""
+        total_tokens = sum(counts.values())
+        idf_scores = self.idf_scores
+        unseen_idf = self.unseen_idf
+
+        indices = sorted(counts)
+        values = [(counts[bucket] / total_tokens) * idf_scores.get(bucket, unseen_idf) for bucket in indices]
+
+        magnitude = math.sqrt(sum(v * v for v in values))
+        if magnitude > 0:
+            values = [v / magnitude for v in values]
+
+        return SparseVector(indices, values, self.MAX_FEATURES)
+
+    def _transform_batch(self, texts: List[str]) -> SparseMatrix:
+        """Builds the normalized CSR matrix for one batch"""
+        n_features = self.MAX_FEATURES
+        indptr, indices, data = [0], [], []
+
+        for tokens in self.tokenize_batch(texts):
+            vector = self.transform_counts(Counter(zlib.crc32(token.encode('utf-8')) % n_features for token in tokens))
+            indices.extend(vector.indices)
+            data.extend(vector.values)
+            indptr.append(len(indices))
+
+        shape = (len(texts), n_features)
+        if np is None:
+            return SparseMatrix(array('q', indptr), array('i', indices), array('d', data), shape)
+        return SparseMatrix(
+            np.asarray(indptr, dtype=np.int64),
+            np.asarray(indices, dtype=np.int32),
+            np.asarray(data, dtype=np.float32),
+            shape
+        )
+
+    def reweight(self, vectors: List[SparseVector], old_idf_scores: Dict[int, float],
+                 old_unseen_idf: float) -> List[SparseVector]:
+        """
+        Re-weights vectors made with other IDF scores to the current ones
+        TF-IDF vectors are TF scaled by IDF and normalized, so scaling each
+        entry by new / old IDF and normalizing again gives the same vector
+        as transforming the original text, without re-tokenizing it
+        """
+        idf_scores = self.idf_scores
+        unseen_idf = self.unseen_idf
+        reweighted = []
+
+        for vector in vectors:
+            values = [
+                value * idf_scores.get(bucket, unseen_idf) / old_idf_scores.get(bucket, old_unseen_idf)
+                for bucket, value in vector.items()
+            ]
+            magnitude = math.sqrt(sum(v * v for v in values))
+            if magnitude > 0:
+                values = [v / magnitude for v in values]
+            reweighted.append(SparseVector(vector.indices, values, self.MAX_FEATURES))
+
+        return reweighted
+
+    def merge(self, other: 'HashingTfidfVectorizer') -> None:
+        """
+        Adds the frequency counts of a vectorizer fitted on another shard and
+        fixes the IDF scores of the combined corpus
+        """
+        if other.MAX_FEATURES != self.MAX_FEATURES:
+            raise ValueError(f"Cannot merge {other.MAX_FEATURES} buckets into {self.MAX_FEATURES}")
+
+        for bucket, df in other.document_frequency.items():
+            self.document_frequency[bucket] = self.document_frequency.get(bucket, 0) + df
+        for bucket, tf in other.total_frequency.items():
+            self.total_frequency[bucket] = self.total_frequency.get(bucket, 0) + tf
+        self.num_documents += other.num_documents
+        self.fix_idf()
+
+    def get_vocabulary_size(self) -> int:
+        """Returns the number of buckets in use"""
+        return len(self.document_frequency)
+
+    def to_dict(self) -> Dict:
+        """Fitted state and frequency counts as JSON-serializable data (bucket keys as lists)"""
+        return {
+            "n_features": self.MAX_FEATURES,
+            "idf_scores": list(self.idf_scores.items()),
+            "unseen_idf": self.unseen_idf,
+            "num_documents": self.num_documents,
+            "document_frequency": list(self.document_frequency.items()),
+            "total_frequency": list(self.total_frequency.items())
+        }
+
+    def load_dict(self, data: Dict) -> None:
+        """Restores the state written by to_dict()"""
+        self.MAX_FEATURES = data["n_features"]
+        self.idf_scores = {bucket: idf for bucket, idf in data["idf_scores"]}
+        self.unseen_idf = data["unseen_idf"]
+        self.num_documents = data["num_documents"]
+        self.document_frequency = {bucket: df for bucket, df in data["document_frequency"]}
+        self.total_frequency = {bucket: tf for bucket, tf in data["total_frequency"]}
+
+
+def chunk_text(text: str, chunk_size: int, chunk_overlap: int) -> List[str]:
+    """
+    Chunks text with overlap
+    Port from DocumentRepositoryImpl.kt chunkText() method
+    """
+    if len(text) <= chunk_size:
+        return [text]
+
+    chunks = []
+    start = 0
+
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        chunk = text[start:end]
+        chunks.append(chunk)
+
+        # Move start by (chunk_size - chunk_overlap) for next chunk
+        start += (chunk_size - chunk_overlap)
+
+        # Break if we've covered the entire text
+        if end >= len(text):
+            break
+
+    return chunks
+
+
+# Universal newlines, as in open(path, 'r')
+_NEWLINE_PATTERN = re.compile(r'\r\n|\r')
+
+
+def iter_file_chunks(
+    filepath: str,
+    chunk_size: int,
+    chunk_overlap: int,
+    block_size: int = 65536,
+    hasher=None
+) -> Iterator[TextChunk]:
+    """
+    Streams chunks of a UTF-8 file with the same boundaries as chunk_text()
+    on the file read in text mode, holding at most chunk_size + block_size
+    characters in memory
+    If hasher is given (e.g. hashlib.sha256()), it is updated with the raw bytes
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    step = chunk_size - chunk_overlap
+
+    buffer = ''          # text from the current chunk start onwards, newlines translated
+    buffer_byte = 0      # file offset of buffer[0]
+    crlf: List[int] = []  # buffer positions of '\n' that were '\r\n' in the file (one extra byte each)
+    pending_cr = False   # block ended with '\r' that may start a '\r\n'
+    eof = False
+
+    def byte_length(length: int) -> int:
+        """Bytes in the file covered by buffer[:length]"""
+        return len(buffer[:length].encode('utf-8')) + bisect.bisect_left(crlf, length)
+
+    with open(filepath, 'rb') as f:
+        while True:
+            # Read until we know whether the chunk at buffer[0] is the last one
+            while not eof and len(buffer) <= chunk_size:
+                block = f.read(block_size)
+                if hasher is not None and block:
+                    hasher.update(block)
+                text = decoder.decode(block, final=not block)
+                eof = not block
+
+                if pending_cr:
+                    text = '\r' + text
+                pending_cr = not eof and text.endswith('\r')
+                if pending_cr:
+                    text = text[:-1]
+
+                pieces = []
+                position = len(buffer)
+                last = 0
+                for match in _NEWLINE_PATTERN.finditer(text):
+                    pieces.append(text[last:match.start()])
+                    position += match.start() - last
+                    if match.group() == '\r\n':
+                        crlf.append(position)
+                    pieces.append('\n')
+                    position += 1
+                    last = match.end()
+                pieces.append(text[last:])
+                buffer += ''.join(pieces)
+
+            if len(buffer) <= chunk_size:
+                # Last chunk (or the whole file if it fits in one chunk)
+                yield TextChunk(buffer, buffer_byte, buffer_byte + byte_length(len(buffer)))
+                return
+
+            yield TextChunk(buffer[:chunk_size], buffer_byte, buffer_byte + byte_length(chunk_size))
+
+            # Move start by (chunk_size - chunk_overlap) for next chunk
+            buffer_byte += byte_length(step)
+            drop = bisect.bisect_left(crlf, step)
+            crlf = [position - step for position in crlf[drop:]]
+            buffer = buffer[step:]
+
+
+# A complete markdown heading line ("## Title"); the text is group 1
+_HEADING_PATTERN = re.compile(r'^#{1,6}[ \t]+(.*?)[ \t#]*\n', re.MULTILINE)
+
+
+def chunk_start_heading(text: str, previous_text: Optional[str], step: int) -> Optional[str]:
+    """
+    Last heading starting at or before the start of a chunk, looking only at
+    the chunk itself (a heading at its very start) and the previous chunk,
+    which begins step characters earlier; None if neither has one
+    """
+    # A chunk may start mid-line; then its first characters are no heading
+    starts_line = previous_text is None or previous_text[step - 1:step] == '\n'
+    match = _HEADING_PATTERN.match(text)
+    if match and starts_line:
+        return match.group(1)
+
+    heading = None
+    if previous_text is not None:
+        # Position 0 of the previous chunk was checked when it was the current one
+        for match in _HEADING_PATTERN.finditer(previous_text, 1):
+            if match.start() > step:
+                break
+            heading = match.group(1)
+    return heading
+
+
+def chunk_headings(texts: List[str], step: int) -> List[str]:
+    """
+    Headings in effect at the start of each consecutive chunk of one document
+    step is chunk_size - chunk_overlap, the distance between chunk starts
+    """
+    headings = []
+    current = ""
+    previous = None
+    for text in texts:
+        heading = chunk_start_heading(text, previous, step)
+        if heading is not None:
+            current = heading
+        headings.append(current)
+        previous = text
+    return headings
+
+
+def bitset_ranges(bits: int) -> List[Tuple[int, int]]:
+    """Runs of set bits in an int bitset as sorted [start, end) ranges"""
+    ranges = []
+    offset = 0
+    while bits:
+        # Skip the zeros, then count the ones
+        zeros = (bits & -bits).bit_length() - 1
+        bits >>= zeros
+        offset += zeros
+        ones = (~bits & (bits + 1)).bit_length() - 1
+        ranges.append((offset, offset + ones))
+        bits >>= ones
+        offset += ones
+    return ranges
+
+
+def in_ranges(doc_id: int, ranges: List[Tuple[int, int]], starts: List[int]) -> bool:
+    """Whether doc_id lies in one of the sorted [start, end) ranges; starts lists their starts"""
+    position = bisect.bisect_right(starts, doc_id) - 1
+    return position >= 0 and doc_id < ranges[position][1]
+
+
+def ranges_bitset(ids: Iterable[int]) -> int:
+    """Int bitset of doc ids; consecutive ids are set a run at a time"""
+    bits = 0
+    run_start = run_end = None
+    for doc_id in ids:
+        if doc_id == run_end:
+            run_end += 1
+            continue
+        if run_start is not None:
+            bits |= ((1 << (run_end - run_start)) - 1) << run_start
+        run_start, run_end = doc_id, doc_id + 1
+    if run_start is not None:
+        bits |= ((1 << (run_end - run_start)) - 1) << run_start
+    return bits
+
+
+class MetadataIndex:
+    """
+    Bitsets of chunk ids per metadata value, so filters are resolved before scoring
+    Bitsets are Python ints (bit i = chunk i); the chunks of a document are
+    contiguous ids, so every bitset is a few runs of ones and converts to a
+    handful of id ranges for the scorers
+    """
+
+    FIELDS = ("path", "directory", "doc_type", "heading")
+
+    def __init__(self):
+        self.metadata: List[ChunkMetadata] = []
+        self.bitsets: Dict[str, Dict[str, int]] = {field: {} for field in self.FIELDS}
+
+    def build(self, metadata: List[ChunkMetadata]) -> None:
+        """Builds the bitsets; list position is the chunk id"""
+        self.metadata = metadata
+        ids: Dict[str, Dict[str, List[int]]] = {field: {} for field in self.FIELDS}
+        for doc_id, chunk_metadata in enumerate(metadata):
+            for field in self.FIELDS:
+                ids[field].setdefault(getattr(chunk_metadata, field), []).append(doc_id)
+        self.bitsets = {
+            field: {value: ranges_bitset(value_ids) for value, value_ids in ids[field].items()}
+            for field in self.FIELDS
+        }
+
+    def values(self, field: str) -> List[str]:
+        """Distinct values of a field"""
+        return sorted(self.bitsets[field])
+
+    def select(self, filters: Dict) -> int:
+        """
+        Bitset of the chunks matching every field in filters
+        A field matches any of its values: a string or a list of strings,
+        each an exact value or an fnmatch pattern ("API_*.md")
+        """
+        selected = (1 << len(self.metadata)) - 1
+        for field, wanted in filters.items():
+            if field not in self.bitsets:
+                raise ValueError(f"Unknown metadata field: {field} (expected one of {', '.join(self.FIELDS)})")
+            patterns = [wanted] if isinstance(wanted, str) else list(wanted)
+            bitsets = self.bitsets[field]
+            matched = 0
+            for pattern in patterns:
+                if pattern in bitsets:
+                    matched |= bitsets[pattern]
+                elif any(char in pattern for char in '*?['):
+                    for value in fnmatch.filter(bitsets, pattern):
+                        matched |= bitsets[value]
+            selected &= matched
+        return selected
+
+
+def discover_files(docs_path: str, include: List[str], exclude: List[str]) -> List[str]:
+    """
+    Walks docs_path recursively and returns the paths relative to it that
+    match an include pattern and no exclude pattern
+    Paths use '/' separators and are sorted, so index order does not depend on the file system
+    """
+    paths = []
+
+    for root, dirs, files in os.walk(docs_path):
+        dirs.sort()
+        for name in files:
+            relative = os.path.relpath(os.path.join(root, name), docs_path).replace(os.sep, '/')
+            if not any(fnmatch.fnmatch(relative, pattern) for pattern in include):
+                continue
+            if any(fnmatch.fnmatch(relative, pattern) for pattern in exclude):
+                continue
+            paths.append(relative)
+
+    return sorted(paths)
+
+
+def _load_and_chunk(filepath: str, filename: str, chunk_size: int, chunk_overlap: int):
+    """
+    Streams, hashes and chunks one file (runs in a worker thread or process)
+    Returns (filename, sha256 of the file bytes, chunks, error message)
+    """
+    hasher = hashlib.sha256()
+    try:
+        chunks = [chunk.text for chunk in iter_file_chunks(filepath, chunk_size, chunk_overlap, hasher=hasher)]
+    except Exception as e:
+        return filename, None, [], str(e)
+
+    return filename, hasher.hexdigest(), chunks, None
+
+
+def reciprocal_rank_fusion(result_lists: List[List[SearchResult]], top_k: int, k: int = 60) -> List[SearchResult]:
+    """
+    Fuses ranked result lists: each chunk scores sum(1 / (k + rank)) over the lists it appears in
+    Chunks are deduplicated by (filename, chunk_index) and keep their best similarity
+    Ties are broken by first appearance
+    """
+    fused: Dict[Tuple[str, int], float] = {}
+    best: Dict[Tuple[str, int], SearchResult] = {}
+    for results in result_lists:
+        for result in results:
+            key = (result.filename, result.chunk_index)
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + result.rank)
+            if key not in best or result.similarity > best[key].similarity:
+                best[key] = result
+
+    order = {key: position for position, key in enumerate(fused)}
+    ranked = sorted(fused, key=lambda key: (-fused[key], order[key]))[:top_k]
+    return [
+        SearchResult(
+            text=best[key].text,
+            filename=best[key].filename,
+            chunk_index=best[key].chunk_index,
+            similarity=best[key].similarity,
+            rank=rank,
+            chunk_span=best[key].chunk_span,
+            metadata=best[key].metadata
+        )
+        for rank, key in enumerate(ranked, 1)
+    ]
+
+
+def filter_by_similarity(results: List[SearchResult], threshold: float) -> List[SearchResult]:
+    """
+    Drops results below the similarity threshold
+    Port from RagComparisonViewModel.kt filterChunksBySimilarity()
+    """
+    return [result for result in results if result.similarity >= threshold]
+
+
+def rerank_results(results: List[SearchResult]) -> List[SearchResult]:
+    """
+    Re-scores results with document diversity, chunk length and position bonuses
+    Port from RagComparisonViewModel.kt rerankChunks(); see RAG_RERANKING_FILTERING.md
+    Results must be ordered by similarity; returns them ordered by the new score
+    """
+    seen_files = set()
+    reranked = []
+    for result in results:
+        score = result.similarity
+
+        # First chunk from each document
+        if result.filename not in seen_files:
+            seen_files.add(result.filename)
+            score += 0.05
+
+        length = len(result.text)
+        if length < 50:
+            score -= 0.05
+        elif length > 1000:
+            score -= 0.03
+        elif 100 <= length <= 500:
+            score += 0.02
+
+        score += max(0, (10 - result.chunk_index) * 0.002)
+
+        reranked.append(SearchResult(
+            text=result.text,
+            filename=result.filename,
+            chunk_index=result.chunk_index,
+            similarity=min(1.0, max(0.0, score)),
+            rank=result.rank,
+            chunk_span=result.chunk_span,
+            metadata=result.metadata
+        ))
+
+    reranked.sort(key=lambda result: -result.similarity)
+    for rank, result in enumerate(reranked, 1):
+        result.rank = rank
+    return reranked
+
+
+def merge_adjacent_chunks(results: List[SearchResult], chunk_overlap: int) -> List[SearchResult]:
+    """
+    Merges results that are consecutive chunks of the same file into one
+    result, dropping the text they share through the chunk overlap
+    A merged result takes the position and the highest similarity of its parts
+    """
+    by_file: Dict[str, List[SearchResult]] = {}
+    for result in results:
+        by_file.setdefault(result.filename, []).append(result)
+
+    merged: List[Tuple[int, SearchResult]] = []  # (best position of the parts, result)
+    positions = {id(result): position for position, result in enumerate(results)}
+    for file_results in by_file.values():
+        file_results.sort(key=lambda result: result.chunk_index)
+        run = [file_results[0]]
+        for result in file_results[1:] + [None]:
+            last = run[-1]
+            if result is not None and result.chunk_index == last.chunk_index + last.chunk_span:
+                run.append(result)
+                continue
+
+            text = run[0].text
+            for part in run[1:]:
+                overlap = part.text[:chunk_overlap]
+                text += part.text[chunk_overlap:] if overlap and text.endswith(overlap) else "\n" + part.text
+            merged.append((min(positions[id(part)] for part in run), SearchResult(
+                text=text,
+                filename=run[0].filename,
+                chunk_index=run[0].chunk_index,
+                similarity=max(part.similarity for part in run),
+                rank=0,
+                chunk_span=sum(part.chunk_span for part in run),
+                metadata=run[0].metadata
+            )))
+            run = [result]
+
+    merged.sort(key=lambda item: item[0])
+    for rank, (_, result) in enumerate(merged, 1):
+        result.rank = rank
+    return [result for _, result in merged]
+
+
+class LruCache:
+    """Bounded least-recently-used mapping with hit/miss counters"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """Returns the cached value and marks it as recently used"""
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value) -> None:
+        """Stores value, evicting the least recently used entry when full"""
+        if self.max_size <= 0:
+            return
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drops all entries; counters are kept"""
+        self.entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self.entries), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+class LatencyHistogram:
+    """Cumulative-bucket latency histogram, as exported to Prometheus"""
+
+    # Upper bounds in seconds; observations above the last one fall in +Inf
+    BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, fraction: float) -> float:
+        """
+        Estimates a quantile by linear interpolation inside its bucket
+        Values in the +Inf bucket are reported as the largest finite bound
+        """
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            if count and cumulative + count >= rank:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def to_dict(self) -> Dict:
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            buckets[_prometheus_number(bound)] = cumulative
+        return {
+            "count": self.count,
+            "sum_seconds": self.sum,
+            "mean_seconds": self.sum / self.count if self.count else 0.0,
+            "p50_seconds": self.quantile(0.50),
+            "p95_seconds": self.quantile(0.95),
+            "p99_seconds": self.quantile(0.99),
+            "buckets": buckets
+        }
+
+
+class IndexerStats:
+    """
+    Per-stage timings, counters, gauges and latency histograms of a DocumentIndexer
+    Stages are timed with timer(); tracked LRU caches are read when a snapshot is taken
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, Dict[str, float]] = {}  # stage -> runs, total and last seconds
+        self.counters: Dict[str, float] = {}
+        self.gauges: Dict[str, float] = {}
+        self.histograms: Dict[Tuple[str, Tuple], LatencyHistogram] = {}  # (name, labels) -> histogram
+        self.caches: Dict[str, LruCache] = {}
+
+    @contextlib.contextmanager
+    def timer(self, stage: str):
+        """Adds the wall time of the with block to stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_time(stage, time.perf_counter() - start)
+
+    def record_time(self, stage: str, seconds: float) -> None:
+        timing = self.stages.setdefault(stage, {"runs": 0, "total_seconds": 0.0, "last_seconds": 0.0})
+        timing["runs"] += 1
+        timing["total_seconds"] += seconds
+        timing["last_seconds"] = seconds
+
+    def increment(self, name: str, value: float = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        self.gauges[name] = value
+
+    def observe(self, name: str, seconds: float, **labels: str) -> None:
+        """Records a latency in the histogram of name and labels, e.g. observe("search", t, mode="exact")"""
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = LatencyHistogram()
+        histogram.observe(seconds)
+
+    def track_cache(self, name: str, cache: LruCache) -> None:
+        self.caches[name] = cache
+
+    def reset(self) -> None:
+        """Zeroes everything but the gauges, including the hit/miss counters of tracked caches"""
+        self.stages = {}
+        self.counters = {}
+        self.histograms = {}
+        for cache in self.caches.values():
+            cache.hits = 0
+            cache.misses = 0
+
+    def snapshot(self) -> Dict:
+        """Returns all statistics as plain data"""
+        caches = {}
+        for name, cache in self.caches.items():
+            cache_stats = cache.stats()
+            lookups = cache.hits + cache.misses
+            cache_stats["hit_rate"] = cache.hits / lookups if lookups else 0.0
+            caches[name] = cache_stats
+
+        histograms: Dict[str, List[Dict]] = {}
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            entry = {"labels": dict(labels)}
+            entry.update(histogram.to_dict())
+            histograms.setdefault(name, []).append(entry)
+
+        return {
+            "stages": {stage: dict(timing) for stage, timing in self.stages.items()},
+            "counters": dict(self.counters),
+            "gauges": dict(self.gauges),
+            "histograms": histograms,
+            "caches": caches
+        }
+
+    def to_json(self, indent: Optional[int] = 2) -> str:
+        return json.dumps(self.snapshot(), indent=indent)
+
+    def to_prometheus(self, prefix: str = "rag") -> str:
+        """Renders the statistics in the Prometheus text exposition format"""
+        lines = []
+
+        def family(name: str, metric_type: str, help_text: str, samples: List[Tuple[str, Dict, float]]) -> None:
+            if not samples:
+                return
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {metric_type}")
+            for suffix, labels, value in samples:
+                label_text = ','.join(f'{key}="{_prometheus_label(str(val))}"' for key, val in labels.items())
+                lines.append(f"{prefix}_{name}{suffix}{{{label_text}}} {_prometheus_number(value)}"
+                             if label_text else f"{prefix}_{name}{suffix} {_prometheus_number(value)}")
+
+        snapshot = self.snapshot()
+        stages = sorted(snapshot["stages"].items())
+        family("stage_seconds_total", "counter", "Wall time spent in each stage",
+               [("", {"stage": stage}, timing["total_seconds"]) for stage, timing in stages])
+        family("stage_runs_total", "counter", "Times each stage ran",
+               [("", {"stage": stage}, timing["runs"]) for stage, timing in stages])
+        for name, value in sorted(snapshot["counters"].items()):
+            family(f"{name}_total", "counter", name.replace('_', ' ').capitalize(), [("", {}, value)])
+        for name, value in sorted(snapshot["gauges"].items()):
+            family(name, "gauge", name.replace('_', ' ').capitalize(), [("", {}, value)])
+
+        for name, entries in sorted(snapshot["histograms"].items()):
+            samples = []
+            for entry in entries:
+                for bound, count in entry["buckets"].items():
+                    samples.append(("_bucket", dict(entry["labels"], le=bound), count))
+                samples.append(("_sum", entry["labels"], entry["sum_seconds"]))
+                samples.append(("_count", entry["labels"], entry["count"]))
+            family(f"{name}_seconds", "histogram", f"{name.replace('_', ' ').capitalize()} latency", samples)
+
+        caches = sorted(snapshot["caches"].items())
+        family("cache_hits_total", "counter", "Cache hits",
+               [("", {"cache": name}, cache["hits"]) for name, cache in caches])
+        family("cache_misses_total", "counter", "Cache misses",
+               [("", {"cache": name}, cache["misses"]) for name, cache in caches])
+        family("cache_entries", "gauge", "Cached entries",
+               [("", {"cache": name}, cache["size"]) for name, cache in caches])
+
+        return '\n'.join(lines) + '\n'
+
+
+def _prometheus_number(value: float) -> str:
+    """Formats a sample value or bucket bound the way Prometheus prints them"""
+    if value == float('inf'):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _prometheus_label(value: str) -> str:
+    """Escapes a label value"""
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
 
 class DocumentIndexer:
     """
@@ -196,125 +2085,792 @@ class DocumentIndexer:
     CHUNK_SIZE = 500
     CHUNK_OVERLAP = 50
 
-    def __init__(self, docs_path: str):
+    # Bump when the cache file layout or the indexing logic changes
+    CACHE_VERSION = 5
+
+    def __init__(
+        self,
+        docs_path: str,
+        use_numpy: bool = True,
+        cache_path: Optional[str] = None,
+        max_idf_drift: float = 0.1,
+        max_new_top_terms: int = 20,
+        include: Optional[List[str]] = None,
+        exclude: Optional[List[str]] = None,
+        max_workers: Optional[int] = None,
+        use_processes: bool = False,
+        ann_lists: Optional[int] = None,
+        ann_probes: int = 4,
+        bm25: bool = False,
+        query_cache_size: int = 256,
+        hashing_features: Optional[int] = None,
+        verbose: bool = True
+    ):
+        """
+        Args:
+            docs_path: Directory with .md/.txt documents (searched recursively)
+            use_numpy: Use numpy postings when available
+            cache_path: Optional JSON file to persist the index between runs
+            max_idf_drift: Relative IDF drift that triggers a full refit after incremental updates
+            max_new_top_terms: New top-frequency terms that trigger a full refit after incremental updates
+            include: Glob patterns for paths relative to docs_path (default: *.md, *.txt)
+            exclude: Glob patterns for paths to skip, checked after include
+            max_workers: Concurrent file loaders (default: min(8, CPU count)); 1 loads serially
+            use_processes: Load and chunk files in a process pool instead of a thread pool
+            ann_lists: IVF clusters for approximate search (mode="ann"); None disables the ANN index,
+                0 picks about sqrt(number of chunks)
+            ann_probes: IVF clusters scanned per approximate query; more probes raise recall
+            bm25: Build the BM25 index while indexing; otherwise it is built on the first mode="bm25" query
+            query_cache_size: Entries in each LRU cache for query embeddings and search results; 0 disables them
+            hashing_features: Embed with a HashingTfidfVectorizer of this many buckets instead of a fitted
+                vocabulary; indexes one stream pass and allows merge() of separately built shards
+            verbose: Print progress lines; warnings and errors are printed either way
+        """
         self.docs_path = docs_path
-        self.vectorizer = TfidfVectorizer()
+        self.include = include if include is not None else list(DEFAULT_INCLUDE)
+        self.exclude = exclude if exclude is not None else []
+        self.max_workers = max_workers or min(8, os.cpu_count() or 1)
+        self.use_processes = use_processes
+        self.cache_path = cache_path
+        self.loaded_from_cache = False
+        self.max_idf_drift = max_idf_drift
+        self.max_new_top_terms = max_new_top_terms
+        self.hashing = hashing_features is not None
+        self.verbose = verbose
+        self.vectorizer = HashingTfidfVectorizer(hashing_features) if self.hashing else TfidfVectorizer()
+        self.vectorizer.verbose = verbose
         self.chunks: List[Tuple[str, str, int]] = []  # (text, filename, chunk_index)
-        self.embeddings: List[List[float]] = []
+        self.embeddings: List[SparseVector] = []
+        # Postings are numpy arrays when numpy is available, otherwise Python arrays
+        self.use_numpy = use_numpy and np is not None
+        self.inverted_index = InvertedIndex(use_numpy=self.use_numpy)
+        self.ann_index: Optional[IvfIndex] = None
+        if ann_lists is not None:
+            self.ann_index = IvfIndex(
+                self.vectorizer.MAX_FEATURES,
+                num_lists=ann_lists,
+                num_probes=ann_probes,
+                use_numpy=self.use_numpy
+            )
+        self.build_bm25 = bm25
+        self.bm25_index: Optional[Bm25Index] = None
+        # Built on the first filtered search
+        self.metadata_index: Optional[MetadataIndex] = None
+        # Both caches are cleared whenever the vocabulary or the indexed chunks change
+        self.query_embedding_cache = LruCache(query_cache_size)
+        self.search_result_cache = LruCache(query_cache_size)
+        # Set by rag_mmap.open_index_file(): the index is then a read-only view of that mapping
+        self.mapped_file = None
+        # Stage timings, counters and latency histograms; see get_stats()
+        self.stats = IndexerStats()
+        self.stats.track_cache("embeddings", self.query_embedding_cache)
+        self.stats.track_cache("results", self.search_result_cache)
+
+    def _log(self, message: str) -> None:
+        """Prints a progress line when verbose"""
+        if self.verbose:
+            print(message)
+
+    def _check_writable(self, action: str) -> None:
+        """Raises if the index is a read-only view of a mapped index file"""
+        if self.mapped_file is not None:
+            raise RuntimeError(f"[DocumentIndexer] Cannot {action}: index is mapped read-only from {self.docs_path}")
 
     def _chunk_text(self, text: str) -> List[str]:
-        """
-        Chunks text with overlap
-        Port from DocumentRepositoryImpl.kt chunkText() method
-        """
-        if len(text) <= self.CHUNK_SIZE:
-            return [text]
-
-        chunks = []
-        start = 0
+        """Chunks text with overlap using CHUNK_SIZE and CHUNK_OVERLAP"""
+        return chunk_text(text, self.CHUNK_SIZE, self.CHUNK_OVERLAP)
 
-        while start < len(text):
-            end = min(start + self.CHUNK_SIZE, len(text))
-            chunk = text[start:end]
-            chunks.append(chunk)
+    def _discover_files(self) -> List[str]:
+        """Matching paths relative to docs_path; see discover_files()"""
+        return discover_files(self.docs_path, self.include, self.exclude)
 
-            # Move start by (CHUNK_SIZE - CHUNK_OVERLAP) for next chunk
-            start += (self.CHUNK_SIZE - self.CHUNK_OVERLAP)
+    def _load_documents(self) -> List[Tuple[str, str, List[str]]]:
+        """
+        Reads, hashes and chunks all matching files, with bounded concurrency
+        Returns list of (filename, content sha256, chunks) in discovery order
+        """
+        tasks = [
+            (os.path.join(self.docs_path, filename), filename, self.CHUNK_SIZE, self.CHUNK_OVERLAP)
+            for filename in self._discover_files()
+        ]
 
-            # Break if we've covered the entire text
-            if end >= len(text):
-                break
+        if self.max_workers <= 1 or len(tasks) <= 1:
+            loaded = [_load_and_chunk(*task) for task in tasks]
+        else:
+            executor_class = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+            with executor_class(max_workers=self.max_workers) as executor:
+                # map() yields in submission order whatever order the workers finish in
+                loaded = list(executor.map(_load_and_chunk, *zip(*tasks)))
+
+        documents = []
+        for filename, content_hash, doc_chunks, error in loaded:
+            if error is not None:
+                print(f"[ERROR] Failed to read {filename}: {error}")
+                self.stats.increment("read_errors")
+                continue
+            documents.append((filename, content_hash, doc_chunks))
+            self.stats.increment("files_loaded")
+            self.stats.increment("bytes_read", os.path.getsize(os.path.join(self.docs_path, filename)))
 
-        return chunks
+        return documents
 
     def index_documents(self) -> int:
         """
-        Load and index all .md files from docs_path
+        Load and index all matching files under docs_path
+        Uses the cache file when no document changed since it was written
         Returns number of chunks indexed
         """
+        self._check_writable("index documents")
         self.chunks.clear()
-        self.embeddings.clear()
+        self.embeddings = []
+        self._build_indexes()
+        self.loaded_from_cache = False
 
         if not os.path.exists(self.docs_path):
             print(f"[ERROR] Documentation path does not exist: {self.docs_path}")
             return 0
 
-        # Load all .md and .txt files
-        all_texts = []
+        stats = self.stats
+        # Files are read, hashed and chunked in one streaming pass, so load covers chunking too
+        with stats.timer("load"):
+            documents = self._load_documents()
 
-        for filename in os.listdir(self.docs_path):
-            if not (filename.endswith('.md') or filename.endswith('.txt')):
-                continue
+        cache_key = self._cache_key(documents)
+        if self.cache_path:
+            with stats.timer("cache_load"):
+                self.loaded_from_cache = self._load_cache(cache_key)
+            if self.loaded_from_cache:
+                self._log(f"[DocumentIndexer] Loaded {len(self.chunks)} chunks from cache {self.cache_path}")
+                return len(self.chunks)
 
-            filepath = os.path.join(self.docs_path, filename)
+        for filename, _, doc_chunks in documents:
+            # Store chunks with metadata
+            for idx, chunk_text in enumerate(doc_chunks):
+                self.chunks.append((chunk_text, filename, idx))
 
-            try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    content = f.read()
+            self._log(f"[DocumentIndexer] Indexed {filename}: {len(doc_chunks)} chunks")
 
-                # Chunk the document
-                doc_chunks = self._chunk_text(content)
+        if not self.chunks:
+            print("[WARNING] No documents found to index")
+            return 0
+        stats.increment("chunks_indexed", len(self.chunks))
+
+        # Train vectorizer and generate sparse embeddings in a single tokenization pass over the chunk stream
+        if self.hashing:
+            # Embeds each chunk as it is read; no per-chunk counts are kept
+            with stats.timer("fit_embed"):
+                self.embeddings = self.vectorizer.fit_transform_sparse(chunk[0] for chunk in self.chunks)
+            self._build_indexes()
+        else:
+            with stats.timer("fit"):
+                doc_counts = self.vectorizer.fit_counts(chunk[0] for chunk in self.chunks)
+            with stats.timer("embed"):
+                self.embeddings = [self.vectorizer.transform_counts(counts) for counts in doc_counts]
+            self._build_indexes(doc_counts=doc_counts)
 
-                # Store chunks with metadata
-                for idx, chunk_text in enumerate(doc_chunks):
-                    self.chunks.append((chunk_text, filename, idx))
-                    all_texts.append(chunk_text)
+        self._log(f"[DocumentIndexer] Indexed {len(self.chunks)} chunks from {len(set(c[1] for c in self.chunks))} documents")
 
-                print(f"[DocumentIndexer] Indexed {filename}: {len(doc_chunks)} chunks")
+        if self.cache_path:
+            with stats.timer("cache_save"):
+                self._save_cache(cache_key)
 
-            except Exception as e:
-                print(f"[ERROR] Failed to read {filename}: {e}")
-                continue
+        return len(self.chunks)
 
-        if not all_texts:
-            print("[WARNING] No documents found to index")
+    def _cache_key(self, documents: List[Tuple[str, str, List[str]]]) -> Dict:
+        """
+        Builds the cache key: per-file content hashes plus every parameter
+        that affects chunking or vectorization
+        """
+        return {
+            "version": self.CACHE_VERSION,
+            "chunk_size": self.CHUNK_SIZE,
+            "chunk_overlap": self.CHUNK_OVERLAP,
+            "max_features": self.vectorizer.MAX_FEATURES,
+            "hashing": self.hashing,
+            "min_word_length": self.vectorizer.MIN_WORD_LENGTH,
+            "ann": self.ann_index.params() if self.ann_index else None,
+            "files": {filename: content_hash for filename, content_hash, _ in documents}
+        }
+
+    def _load_cache(self, cache_key: Dict) -> bool:
+        """
+        Restores the index from cache_path if its key matches
+        Returns True if the index was loaded
+        """
+        if not os.path.exists(self.cache_path):
+            return False
+
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+
+            if data.get("key") != cache_key:
+                self._log("[DocumentIndexer] Cache is stale, rebuilding index")
+                return False
+
+            vectorizer = self.vectorizer
+            vectorizer.load_dict(data["vectorizer"])
+
+            self.chunks = [tuple(chunk) for chunk in data["chunks"]]
+            self.embeddings = [
+                SparseVector(indices, values, vectorizer.MAX_FEATURES)
+                for indices, values in data["embeddings"]
+            ]
+            self._build_indexes(ann_state=data.get("ann"))
+            return True
+
+        except Exception as e:
+            print(f"[WARNING] Failed to load index cache {self.cache_path}: {e}")
+            self.chunks = []
+            self.embeddings = []
+            self._build_indexes()
+            return False
+
+    def _save_cache(self, cache_key: Dict) -> None:
+        """Writes the index to cache_path (atomically via a temp file)"""
+        self._check_writable("save the cache")
+        data = {
+            "key": cache_key,
+            "vectorizer": self.vectorizer.to_dict(),
+            "chunks": self.chunks,
+            "embeddings": [[list(v.indices), list(v.values)] for v in self.embeddings],
+            "ann": self.ann_index.to_dict() if self.ann_index else None
+        }
+
+        try:
+            cache_dir = os.path.dirname(self.cache_path)
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+
+            tmp_path = f"{self.cache_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.cache_path)
+
+            self._log(f"[DocumentIndexer] Saved index cache to {self.cache_path}")
+
+        except Exception as e:
+            print(f"[WARNING] Failed to save index cache {self.cache_path}: {e}")
+
+    def add_document(self, filename: str, content: str) -> int:
+        """
+        Adds a document to the index, replacing any document with the same filename
+        Only the new chunks are embedded unless the IDF drift triggers a refit
+        Returns number of chunks added
+        """
+        self._check_writable("add documents")
+        start = time.perf_counter()
+        self.remove_document(filename, refit=False)
+        self.clear_query_cache()
+        self.metadata_index = None
+
+        doc_chunks = self._chunk_text(content)
+        new_chunks = [(chunk_text, filename, idx) for idx, chunk_text in enumerate(doc_chunks)]
+        self.chunks.extend(new_chunks)
+
+        if not self.vectorizer.idf_scores:
+            self._refit()
+        else:
+            new_texts = [chunk[0] for chunk in new_chunks]
+            new_counts = self.vectorizer.partial_fit_counts(new_texts)
+            new_embeddings = [self.vectorizer.transform_counts(counts) for counts in new_counts]
+            self.embeddings.extend(new_embeddings)
+            self.inverted_index.add(new_embeddings)
+            if self.ann_index:
+                self.ann_index.add(new_embeddings)
+            if self.bm25_index:
+                self.bm25_index.add(self._bm25_counts(new_texts, new_counts))
+            self._refit_if_drifted()
+
+        self._set_size_gauges()
+        self.stats.increment("documents_added")
+        self.stats.record_time("add_document", time.perf_counter() - start)
+        self._log(f"[DocumentIndexer] Added {filename}: {len(doc_chunks)} chunks")
+        return len(doc_chunks)
+
+    def update_document(self, filename: str, content: str) -> int:
+        """Replaces the chunks of a document; returns number of chunks indexed"""
+        return self.add_document(filename, content)
+
+    def remove_document(self, filename: str, refit: bool = True) -> int:
+        """
+        Removes all chunks of a document from the index
+        Returns number of chunks removed
+        """
+        self._check_writable("remove documents")
+        start = time.perf_counter()
+        removed_ids = [idx for idx, chunk in enumerate(self.chunks) if chunk[1] == filename]
+        if not removed_ids:
             return 0
 
-        # Train vectorizer on all chunks
-        self.vectorizer.fit(all_texts)
-
-        # Generate embeddings for all chunks
-        self.embeddings = [self.vectorizer.transform(text) for text in all_texts]
+        removed_texts = [self.chunks[idx][0] for idx in removed_ids]
+        removed_set = set(removed_ids)
+        self.chunks = [chunk for idx, chunk in enumerate(self.chunks) if idx not in removed_set]
+        self.embeddings = [vector for idx, vector in enumerate(self.embeddings) if idx not in removed_set]
+        self.inverted_index.remove(removed_ids)
+        if self.ann_index:
+            self.ann_index.remove(removed_ids)
+        if self.bm25_index:
+            self.bm25_index.remove(removed_ids)
+        self.vectorizer.partial_forget(removed_texts)
+        self.clear_query_cache()
+        self.metadata_index = None
+
+        if refit:
+            self._refit_if_drifted()
+
+        self._set_size_gauges()
+        self.stats.increment("documents_removed")
+        self.stats.record_time("remove_document", time.perf_counter() - start)
+        self._log(f"[DocumentIndexer] Removed {filename}: {len(removed_ids)} chunks")
+        return len(removed_ids)
+
+    def _refit_if_drifted(self) -> bool:
+        """
+        Refits the vocabulary when the IDF scores drifted too far from the
+        counts or too many new terms reached the top MAX_FEATURES
+        Returns True if the index was refitted
+        """
+        drift = self.vectorizer.idf_drift()
+        new_terms = self.vectorizer.count_new_top_terms()
+
+        if drift <= self.max_idf_drift and new_terms <= self.max_new_top_terms:
+            return False
+
+        self._log(f"[DocumentIndexer] IDF drift {drift:.3f}, {new_terms} new top terms - refitting")
+        self.stats.increment("refits")
+        self._refit()
+        return True
+
+    def _refit(self) -> None:
+        """Refits the vectorizer on all chunks and re-embeds them"""
+        if self.hashing and self.vectorizer.idf_scores and len(self.embeddings) == len(self.chunks):
+            # Bucket counts are already current; only the IDF weights change
+            old_idf_scores, old_unseen_idf = self.vectorizer.idf_scores, self.vectorizer.unseen_idf
+            with self.stats.timer("fit"):
+                self.vectorizer.fix_idf()
+            with self.stats.timer("embed"):
+                self.embeddings = self.vectorizer.reweight(self.embeddings, old_idf_scores, old_unseen_idf)
+            self._build_indexes(keep_bm25=True)
+            return
 
-        print(f"[DocumentIndexer] Indexed {len(self.chunks)} chunks from {len(set(c[1] for c in self.chunks))} documents")
+        texts = [chunk[0] for chunk in self.chunks]
+        with self.stats.timer("fit"):
+            doc_counts = self.vectorizer.fit_counts(texts)
+        with self.stats.timer("embed"):
+            self.embeddings = [self.vectorizer.transform_counts(counts) for counts in doc_counts]
+        self._build_indexes(doc_counts=self._bm25_counts(texts, doc_counts))
 
-        return len(self.chunks)
+    def _bm25_counts(self, texts: List[str], doc_counts: List[Counter]) -> List[Counter]:
+        """Term counts for BM25: the vectorizer counts unless they are hashed buckets"""
+        if self.hashing:
+            return [Counter(self.vectorizer.tokenize(text)) for text in texts]
+        return doc_counts
 
-    def search(self, query: str, top_k: int = 5) -> List[SearchResult]:
+    def merge(self, other: 'DocumentIndexer') -> int:
+        """
+        Adds the documents of an index built separately (e.g. another shard)
+        Both indexes must use hashing_features with the same number of buckets;
+        the frequency counts are summed and every vector is re-weighted to the
+        combined IDF, so no chunk is tokenized again
+        Returns number of chunks added
+        """
+        self._check_writable("merge")
+        if not (self.hashing and other.hashing):
+            raise ValueError("Only indexes built with hashing_features can be merged")
+        if self.vectorizer.MAX_FEATURES != other.vectorizer.MAX_FEATURES:
+            raise ValueError(
+                f"Cannot merge {other.vectorizer.MAX_FEATURES} buckets into {self.vectorizer.MAX_FEATURES}"
+            )
+        overlap = {chunk[1] for chunk in self.chunks} & {chunk[1] for chunk in other.chunks}
+        if overlap:
+            raise ValueError(f"Documents present in both indexes: {sorted(overlap)}")
+
+        vectorizer = self.vectorizer
+        old_idf_scores, old_unseen_idf = vectorizer.idf_scores, vectorizer.unseen_idf
+        vectorizer.merge(other.vectorizer)
+
+        self.embeddings = (
+            vectorizer.reweight(self.embeddings, old_idf_scores, old_unseen_idf)
+            + vectorizer.reweight(other.embeddings, other.vectorizer.idf_scores, other.vectorizer.unseen_idf)
+        )
+        self.chunks = list(self.chunks) + list(other.chunks)
+        self._build_indexes()
+
+        self._log(f"[DocumentIndexer] Merged {len(other.chunks)} chunks, {len(self.chunks)} in total")
+        return len(other.chunks)
+
+    def _build_indexes(
+        self,
+        ann_state: Optional[Dict] = None,
+        doc_counts: Optional[List[Counter]] = None,
+        keep_bm25: bool = False
+    ) -> None:
+        """
+        Rebuilds the inverted index, the ANN index and the BM25 index from self.embeddings
+        ann_state restores a persisted clustering instead of re-clustering
+        doc_counts are the chunk term counts from the fit pass; without them the
+        BM25 index is dropped and rebuilt on the next BM25 query
+        keep_bm25 keeps the BM25 index when only the TF-IDF weights changed
+        """
+        self.clear_query_cache()
+        self.metadata_index = None
+        with self.stats.timer("build_index"):
+            self.inverted_index.build(self.embeddings)
+        with self.stats.timer("build_metadata"):
+            self._ensure_metadata_index()
+        if self.ann_index:
+            with self.stats.timer("build_ann"):
+                if ann_state:
+                    self.ann_index.restore(ann_state["centroids"], ann_state["assignments"])
+                else:
+                    self.ann_index.build(self.embeddings)
+                if self.use_numpy:
+                    # Scoring blocks are built here rather than on the first query
+                    self.ann_index._ensure_blocks(self.embeddings)
+        self._set_size_gauges()
+
+        if keep_bm25:
+            return
+        self.bm25_index = None
+        if self.build_bm25:
+            self._ensure_bm25_index(doc_counts)
+
+    def _set_size_gauges(self) -> None:
+        """Updates the chunk, document and vocabulary gauges"""
+        self.stats.set_gauge("chunks", len(self.chunks))
+        self.stats.set_gauge("documents", len({chunk[1] for chunk in self.chunks}))
+        self.stats.set_gauge("vocabulary_size", self.vectorizer.get_vocabulary_size())
+
+    def clear_query_cache(self) -> None:
+        """Drops cached query embeddings and search results"""
+        self.query_embedding_cache.clear()
+        self.search_result_cache.clear()
+
+    def get_stats(self) -> Dict:
+        """
+        Returns stage timings, counters, gauges, search latency histograms
+        and cache hit rates as plain data
+        """
+        return self.stats.snapshot()
+
+    def export_stats(self, format: str = "json") -> str:
+        """Renders get_stats() as "json" or in the Prometheus text format ("prometheus")"""
+        if format == "json":
+            return self.stats.to_json()
+        if format == "prometheus":
+            return self.stats.to_prometheus()
+        raise ValueError(f"Unknown stats format: {format}")
+
+    def query_cache_stats(self) -> Dict[str, Dict[str, int]]:
+        """Returns size and hit/miss counters of the query caches"""
+        return {
+            "embeddings": self.query_embedding_cache.stats(),
+            "results": self.search_result_cache.stats()
+        }
+
+    def chunk_metadata(self, idx: int) -> ChunkMetadata:
+        """Metadata of chunk idx, looked up in the metadata index"""
+        return self._ensure_metadata_index().metadata[idx]
+
+    def _ensure_metadata_index(self) -> MetadataIndex:
+        """
+        Builds the metadata and its bitsets if they do not exist yet
+        Built with the other indexes; after add/remove_document it is rebuilt once, on first use
+        """
+        if self.metadata_index is None:
+            step = self.CHUNK_SIZE - self.CHUNK_OVERLAP
+            metadata: List[ChunkMetadata] = []
+            start = 0
+            # Chunks of a document are contiguous and in chunk_index order
+            while start < len(self.chunks):
+                filename = self.chunks[start][1]
+                end = start
+                while end < len(self.chunks) and self.chunks[end][1] == filename:
+                    end += 1
+                texts = [self.chunks[idx][0] for idx in range(start, end)]
+                metadata.extend(ChunkMetadata.from_path(filename, heading) for heading in chunk_headings(texts, step))
+                start = end
+
+            self.metadata_index = MetadataIndex()
+            self.metadata_index.build(metadata)
+        return self.metadata_index
+
+    def _filter_ranges(self, filters: Optional[Dict]) -> Optional[List[Tuple[int, int]]]:
+        """Chunk id ranges matching the filters; None when there are no filters"""
+        if not filters:
+            return None
+        return bitset_ranges(self._ensure_metadata_index().select(filters))
+
+    @staticmethod
+    def _filters_key(filters: Optional[Dict]):
+        """Hashable form of filters for the result cache"""
+        if not filters:
+            return None
+        return tuple(sorted(
+            (field, (wanted,) if isinstance(wanted, str) else tuple(wanted)) for field, wanted in filters.items()
+        ))
+
+    def _ensure_bm25_index(self, doc_counts: Optional[List[Counter]] = None) -> Bm25Index:
+        """Builds the BM25 index if it does not exist yet, tokenizing the chunks unless doc_counts is given"""
+        if self.bm25_index is None:
+            with self.stats.timer("build_bm25"):
+                if doc_counts is None:
+                    doc_counts = [Counter(self.vectorizer.tokenize(chunk[0])) for chunk in self.chunks]
+                self.bm25_index = Bm25Index()
+                self.bm25_index.build(doc_counts)
+            self._log(f"[DocumentIndexer] Built BM25 index: {len(self.bm25_index.postings)} terms")
+        return self.bm25_index
+
+    def search(self, query: str, top_k: int = 5, mode: str = "exact", filters: Optional[Dict] = None) -> List[SearchResult]:
         """
         Search for relevant document chunks
         Port from DocumentRepositoryImpl.kt searchDocuments() method
+
+        Args:
+            query: Search query
+            top_k: Number of results
+            mode: "exact" scores every chunk sharing a term with the query,
+                  "ann" scores only the chunks in the nearest IVF clusters (needs ann_lists),
+                  "bm25" ranks by BM25 over the full vocabulary; similarity holds the BM25 score
+            filters: Metadata constraints, e.g. {"doc_type": "md", "path": ["API_*", "RAG_*"]};
+                     see MetadataIndex.select(). Only matching chunks are scored
+
+        Rankings are cached per normalized query until the index changes
         """
+        start = time.perf_counter()
         if not self.chunks or not self.embeddings:
             print("[WARNING] No documents indexed")
             return []
 
-        # Generate query embedding
-        query_embedding = self.vectorizer.transform(query)
+        if mode == "ann" and self.ann_index is None:
+            print("[WARNING] ANN index is disabled, using exact search")
+            mode = "exact"
+        if mode not in ("exact", "ann", "bm25"):
+            raise ValueError(f"Unknown search mode: {mode}")
+
+        # Tokenization lowercases and splits on whitespace, so these queries are equivalent
+        normalized_query = " ".join(query.lower().split())
+        cache_key = (
+            normalized_query, top_k, mode,
+            self.ann_index.num_probes if mode == "ann" else None,
+            self._filters_key(filters)
+        )
+        ranked = self.search_result_cache.get(cache_key)
+        if ranked is None:
+            ranked = self._rank(normalized_query, top_k, mode, self._filter_ranges(filters))
+            self.search_result_cache.put(cache_key, ranked)
+
+        results = self._make_results(*ranked)
+        self.stats.observe("search", time.perf_counter() - start, mode=mode)
+        return results
 
-        # Calculate similarity for all chunks
-        similarities = []
-        for idx, chunk_embedding in enumerate(self.embeddings):
-            similarity = self.vectorizer.cosine_similarity(query_embedding, chunk_embedding)
-            text, filename, chunk_index = self.chunks[idx]
-            similarities.append((similarity, text, filename, chunk_index))
+    def search_many(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        fuse: bool = True,
+        rrf_k: int = 60,
+        filters: Optional[Dict] = None
+    ):
+        """
+        Searches several queries at roughly the cost of one exact search
+        Uncached queries are scored together in one pass over the postings
+
+        Args:
+            queries: Search queries
+            top_k: Number of results per query, and of the fused list
+            fuse: Return one list fused with reciprocal rank fusion instead of one list per query
+            rrf_k: RRF constant; larger values flatten the rank weights
+            filters: Metadata constraints, as in search()
+
+        Returns:
+            fuse=True: List[SearchResult] deduplicated by (filename, chunk_index)
+            fuse=False: List[List[SearchResult]] in query order, same as search() for each query
+        """
+        start = time.perf_counter()
+        if not self.chunks or not self.embeddings:
+            print("[WARNING] No documents indexed")
+            return [] if fuse else [[] for _ in queries]
+
+        normalized_queries = [" ".join(query.lower().split()) for query in queries]
+        filters_key = self._filters_key(filters)
+        cache_keys = [(query, top_k, "exact", None, filters_key) for query in normalized_queries]
+        rankings = [self.search_result_cache.get(key) for key in cache_keys]
+
+        pending = list(dict.fromkeys(
+            query for query, ranked in zip(normalized_queries, rankings) if ranked is None
+        ))
+        if pending:
+            scored = self.inverted_index.score_many(
+                [self._query_embedding(query) for query in pending], self._filter_ranges(filters)
+            )
+            computed = {
+                query: self._select_top_k(candidates, scores, top_k)
+                for query, (candidates, scores) in zip(pending, scored)
+            }
+            for i, query in enumerate(normalized_queries):
+                if rankings[i] is None:
+                    rankings[i] = computed[query]
+                    self.search_result_cache.put(cache_keys[i], rankings[i])
+
+        result_lists = [self._make_results(*ranked) for ranked in rankings]
+        if fuse:
+            result_lists = reciprocal_rank_fusion(result_lists, top_k, rrf_k)
+        self.stats.observe("search_many", time.perf_counter() - start)
+        return result_lists
+
+    def retrieve(
+        self,
+        queries,
+        top_k: int = 5,
+        min_similarity: float = 0.0,
+        candidate_pool: Optional[int] = None,
+        rerank: bool = True,
+        merge_adjacent: bool = True,
+        mode: str = "exact",
+        filters: Optional[Dict] = None
+    ) -> List[SearchResult]:
+        """
+        Two-stage retrieval of prompt context
+        Port of the RagComparisonViewModel.kt pipeline (RAG_RERANKING_FILTERING.md):
+          1. candidate_pool chunks (default 4 * top_k) from the cheap embedding search in mode;
+             a list of queries is searched with search_many() and fused
+          2. candidates are rescored by TF-IDF cosine over the full vocabulary
+             (best over the queries), so terms outside MAX_FEATURES count too
+          3. candidates below min_similarity are dropped
+          4. rerank=True adds the diversity, length and position bonuses
+          5. the top_k are kept and merge_adjacent=True joins neighbouring chunks of a file,
+             so their shared overlap reaches the prompt once
+
+        Args:
+            queries: A query or a list of queries
+            filters: Metadata constraints, as in search()
+        """
+        start = time.perf_counter()
+        if isinstance(queries, str):
+            queries = [queries]
+        pool_size = candidate_pool or 4 * top_k
+
+        if len(queries) == 1:
+            candidates = self.search(queries[0], top_k=pool_size, mode=mode, filters=filters)
+        else:
+            candidates = self.search_many(queries, top_k=pool_size, filters=filters)
+
+        # Precise rescoring; index files carry no frequency counts, so the first-stage score stays
+        if self.vectorizer.document_frequency:
+            query_counts = [self.vectorizer.count_terms(query) for query in queries]
+            for result in candidates:
+                doc_counts = self.vectorizer.count_terms(result.text)
+                result.similarity = max(
+                    self.vectorizer.full_similarity(counts, doc_counts) for counts in query_counts
+                )
+            candidates.sort(key=lambda result: -result.similarity)
+
+        candidates = filter_by_similarity(candidates, min_similarity)
+        if rerank:
+            candidates = rerank_results(candidates)
+
+        results = candidates[:top_k]
+        for rank, result in enumerate(results, 1):
+            result.rank = rank
+        if merge_adjacent:
+            results = merge_adjacent_chunks(results, self.CHUNK_OVERLAP)
+
+        self.stats.observe("retrieve", time.perf_counter() - start, mode=mode)
+        return results
 
-        # Sort by similarity descending
-        similarities.sort(key=lambda x: x[0], reverse=True)
+    def _query_embedding(self, normalized_query: str) -> SparseVector:
+        """Returns the TF-IDF embedding of a normalized query, cached"""
+        query_embedding = self.query_embedding_cache.get(normalized_query)
+        if query_embedding is None:
+            query_embedding = self.vectorizer.transform_sparse(normalized_query)
+            self.query_embedding_cache.put(normalized_query, query_embedding)
+        return query_embedding
+
+    def _rank(
+        self,
+        query: str,
+        top_k: int,
+        mode: str,
+        ranges: Optional[List[Tuple[int, int]]] = None
+    ) -> Tuple[List[int], List[float]]:
+        """
+        Scores chunks for a query; returns (chunk ids, scores), best first
+        ranges limits scoring to chunk ids in sorted [start, end) ranges
+        """
+        if ranges == []:
+            return [], []
+
+        if mode == "bm25":
+            query_terms = self.vectorizer.tokenize(query)
+            ranked = self._ensure_bm25_index().search(query_terms, top_k, ranges=ranges)
+            return [doc_id for doc_id, _ in ranked], [score for _, score in ranked]
 
-        # Take top K
+        # Generate query embedding
+        query_embedding = self._query_embedding(query)
+
+        if mode == "exact":
+            # Score chunks sharing a term with the query
+            candidates, scores = self.inverted_index.score(query_embedding, ranges)
+        elif mode == "ann":
+            # Score only the chunks in the clusters nearest to the query
+            candidates, scores = self.ann_index.score(query_embedding, self.embeddings, ranges)
+
+        return self._select_top_k(candidates, scores, top_k)
+
+    def _select_top_k(self, candidates, scores, top_k: int) -> Tuple[List[int], List[float]]:
+        """Picks the top_k scored candidates; returns (chunk ids, scores), best first"""
+        if self.use_numpy:
+            top_positions = self._top_k_indices(scores, top_k)
+            top_indices = [int(candidates[pos]) for pos in top_positions]
+            similarities = [float(scores[pos]) for pos in top_positions]
+        else:
+            top_positions = heapq.nsmallest(
+                top_k, range(len(scores)), key=lambda pos: (-scores[pos], pos)
+            )
+            top_indices = [candidates[pos] for pos in top_positions]
+            similarities = [scores[pos] for pos in top_positions]
+
+        return top_indices, similarities
+
+    def _make_results(self, top_indices: List[int], similarities: List[float]) -> List[SearchResult]:
+        """Wraps ranked chunk ids and their scores into SearchResults"""
         results = []
-        for rank, (similarity, text, filename, chunk_index) in enumerate(similarities[:top_k], 1):
+        for rank, (idx, similarity) in enumerate(zip(top_indices, similarities), 1):
+            text, filename, chunk_index = self.chunks[idx]
             results.append(SearchResult(
                 text=text,
                 filename=filename,
                 chunk_index=chunk_index,
                 similarity=similarity,
-                rank=rank
+                rank=rank,
+                metadata=self.chunk_metadata(idx)
             ))
 
         return results
 
+    @staticmethod
+    def _top_k_indices(scores, top_k: int) -> List[int]:
+        """
+        Returns indices of the top_k scores, highest first.
+        Uses partial selection instead of a full sort; ties are broken by
+        chunk order, same as a stable descending sort.
+        """
+        n = len(scores)
+        k = min(top_k, n)
+        if k <= 0:
+            return []
+
+        # k-th largest score is the selection threshold
+        kth = np.partition(scores, n - k)[n - k]
+        above = np.flatnonzero(scores > kth)
+        ties = np.flatnonzero(scores == kth)[:k - len(above)]
+        selected = np.concatenate((above, ties))
+
+        order = np.lexsort((selected, -scores[selected]))
+        return selected[order].tolist()
+
 
 if __name__ == '__main__':
     # Test the implementation
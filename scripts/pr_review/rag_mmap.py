@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Memory-mapped index file for DocumentIndexer
+Lets several processes share one index: every array is read straight from
+the mapped pages, so opening the file does not depend on the corpus size
+
+File layout (native byte order, sections aligned to 8 bytes):
+    magic       8 bytes  b'RAGIDX\\x00\\x01'
+    header_len  uint32
+    header      JSON (counts, byte order, section offsets and lengths)
+    sections    vocabulary (JSON list of terms ordered by index)
+                idf float64[dim]
+                embeddings as CSR: indptr int64[n + 1], indices int32[nnz], data float32[nnz]
+                postings as CSC:   ptr int64[dim + 1], ids int32[nnz], weights float32[nnz]
+                chunk text: offsets int64[n + 1] + UTF-8 blob
+                chunk metadata: file_ids int32[n], chunk_indices int32[n]
+                filenames: offsets int64[files + 1] + UTF-8 blob
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Dict, List, Tuple
+
+from rag_engine import DocumentIndexer, SparseVector, np
+
+MAGIC = b'RAGIDX\x00\x01'
+FORMAT_VERSION = 1
+
+# array typecode -> numpy dtype
+_DTYPES = {'q': 'int64', 'i': 'int32', 'f': 'float32', 'd': 'float64'}
+
+
+class _MappedChunks:
+    """Read-only sequence of (text, filename, chunk_index) decoded on access"""
+
+    def __init__(self, text_offsets, text_blob, file_ids, chunk_indices, file_offsets, file_blob):
+        self._text_offsets = text_offsets
+        self._text_blob = text_blob
+        self._file_ids = file_ids
+        self._chunk_indices = chunk_indices
+        self._file_offsets = file_offsets
+        self._file_blob = file_blob
+        self._filenames: Dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._file_ids)
+
+    def __getitem__(self, idx: int) -> Tuple[str, str, int]:
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(idx)
+        start, end = int(self._text_offsets[idx]), int(self._text_offsets[idx + 1])
+        text = bytes(self._text_blob[start:end]).decode('utf-8')
+        return text, self._filename(int(self._file_ids[idx])), int(self._chunk_indices[idx])
+
+    def _filename(self, file_id: int) -> str:
+        """Decodes a filename once and remembers it"""
+        filename = self._filenames.get(file_id)
+        if filename is None:
+            start, end = int(self._file_offsets[file_id]), int(self._file_offsets[file_id + 1])
+            filename = bytes(self._file_blob[start:end]).decode('utf-8')
+            self._filenames[file_id] = filename
+        return filename
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+
+class _MappedEmbeddings:
+    """Read-only sequence of SparseVector rows backed by the mapped CSR arrays"""
+
+    def __init__(self, indptr, indices, data, dim: int):
+        self._indptr = indptr
+        self._indices = indices
+        self._data = data
+        self._dim = dim
+
+    def __len__(self) -> int:
+        return len(self._indptr) - 1
+
+    def __getitem__(self, idx: int) -> SparseVector:
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(idx)
+        start, end = int(self._indptr[idx]), int(self._indptr[idx + 1])
+        return SparseVector(self._indices[start:end], self._data[start:end], self._dim)
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+
+def write_index_file(indexer: DocumentIndexer, path: str) -> None:
+    """Writes an indexed DocumentIndexer to path in the memory-mapped format"""
+    vectorizer = indexer.vectorizer
+    if indexer.hashing:
+        raise ValueError("Index files store a fitted vocabulary; hashing indexes are not supported")
+    dim = vectorizer.MAX_FEATURES
+    num_chunks = len(indexer.chunks)
+
+    terms = sorted(vectorizer.vocabulary, key=vectorizer.vocabulary.get)
+    idf = array('d', [0.0] * dim)
+    for term, index in vectorizer.vocabulary.items():
+        idf[index] = vectorizer.idf_scores[term]
+
+    # Embeddings as CSR
+    csr_indptr, csr_indices, csr_data = array('q', [0]), array('i'), array('f')
+    for vector in indexer.embeddings:
+        csr_indices.extend(vector.indices)
+        csr_data.fromlist(vector.values.tolist())
+        csr_indptr.append(len(csr_indices))
+
+    # Postings as CSC, ids ascending within each term
+    term_ids: Dict[int, array] = {index: array('i') for index in range(dim)}
+    term_weights: Dict[int, array] = {index: array('f') for index in range(dim)}
+    for doc_id, vector in enumerate(indexer.embeddings):
+        for index, value in vector.items():
+            term_ids[index].append(doc_id)
+            term_weights[index].append(value)
+    post_ptr, post_ids, post_weights = array('q', [0]), array('i'), array('f')
+    for index in range(dim):
+        post_ids.extend(term_ids[index])
+        post_weights.extend(term_weights[index])
+        post_ptr.append(len(post_ids))
+
+    # Chunk text and metadata
+    filenames: List[str] = []
+    file_numbers: Dict[str, int] = {}
+    text_offsets, text_blob = array('q', [0]), bytearray()
+    file_ids, chunk_indices = array('i'), array('i')
+    for text, filename, chunk_index in indexer.chunks:
+        text_blob.extend(text.encode('utf-8'))
+        text_offsets.append(len(text_blob))
+        if filename not in file_numbers:
+            file_numbers[filename] = len(filenames)
+            filenames.append(filename)
+        file_ids.append(file_numbers[filename])
+        chunk_indices.append(chunk_index)
+
+    file_offsets, file_blob = array('q', [0]), bytearray()
+    for filename in filenames:
+        file_blob.extend(filename.encode('utf-8'))
+        file_offsets.append(len(file_blob))
+
+    sections = [
+        ('vocabulary', json.dumps(terms).encode('utf-8'), None),
+        ('idf', idf.tobytes(), 'd'),
+        ('csr_indptr', csr_indptr.tobytes(), 'q'),
+        ('csr_indices', csr_indices.tobytes(), 'i'),
+        ('csr_data', csr_data.tobytes(), 'f'),
+        ('post_ptr', post_ptr.tobytes(), 'q'),
+        ('post_ids', post_ids.tobytes(), 'i'),
+        ('post_weights', post_weights.tobytes(), 'f'),
+        ('text_offsets', text_offsets.tobytes(), 'q'),
+        ('text_blob', bytes(text_blob), None),
+        ('file_ids', file_ids.tobytes(), 'i'),
+        ('chunk_indices', chunk_indices.tobytes(), 'i'),
+        ('file_offsets', file_offsets.tobytes(), 'q'),
+        ('file_blob', bytes(file_blob), None),
+    ]
+
+    # Section offsets are relative to the start of the data area
+    layout = {}
+    position = 0
+    for name, payload, typecode in sections:
+        layout[name] = {"offset": position, "length": len(payload), "type": typecode}
+        position += _padded(len(payload))
+
+    header = json.dumps({
+        "version": FORMAT_VERSION,
+        "byteorder": sys.byteorder,
+        "num_chunks": num_chunks,
+        "num_files": len(filenames),
+        "dim": dim,
+        "nnz": len(csr_indices),
+        "sections": layout
+    }).encode('utf-8')
+    data_start = _padded(len(MAGIC) + 4 + len(header))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<I', len(header)))
+        f.write(header)
+        f.write(b'\x00' * (data_start - len(MAGIC) - 4 - len(header)))
+        for _, payload, _ in sections:
+            f.write(payload)
+            f.write(b'\x00' * (_padded(len(payload)) - len(payload)))
+
+    os.replace(tmp_path, path)
+
+    print(f"[rag_mmap] Wrote {num_chunks} chunks to {path}")
+
+
+def open_index_file(path: str, use_numpy: bool = True) -> DocumentIndexer:
+    """
+    Opens an index file written by write_index_file()
+    Returns a read-only DocumentIndexer whose chunks, embeddings and postings
+    are views over the shared mapping; only search() is supported, and
+    index_documents(), add/remove_document() and merge() raise RuntimeError
+    """
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if mapped[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"Not a RAG index file: {path}")
+
+    header_len = struct.unpack_from('<I', mapped, len(MAGIC))[0]
+    header_start = len(MAGIC) + 4
+    header = json.loads(mapped[header_start:header_start + header_len].decode('utf-8'))
+
+    if header["version"] != FORMAT_VERSION:
+        raise ValueError(f"Unsupported index file version {header['version']}: {path}")
+    if header["byteorder"] != sys.byteorder:
+        raise ValueError(f"Index file byte order {header['byteorder']} does not match this machine: {path}")
+
+    data_start = _padded(header_start + header_len)
+    use_numpy = use_numpy and np is not None
+    buffer = memoryview(mapped)
+
+    def section(name: str):
+        info = header["sections"][name]
+        start = data_start + info["offset"]
+        raw = buffer[start:start + info["length"]]
+        if info["type"] is None:
+            return raw
+        if use_numpy:
+            return np.frombuffer(raw, dtype=_DTYPES[info["type"]])
+        return raw.cast(info["type"])
+
+    dim = header["dim"]
+    # docs_path names the index file; nothing can be re-indexed from it
+    indexer = DocumentIndexer(path, use_numpy=use_numpy)
+
+    # Vocabulary and IDF are bounded by MAX_FEATURES, not by the corpus
+    vectorizer = indexer.vectorizer
+    idf = section('idf')
+    terms = json.loads(bytes(section('vocabulary')).decode('utf-8'))
+    vectorizer.vocabulary = {term: index for index, term in enumerate(terms)}
+    vectorizer.idf_scores = {term: float(idf[index]) for index, term in enumerate(terms)}
+    vectorizer.num_documents = header["num_chunks"]
+
+    indexer.chunks = _MappedChunks(
+        section('text_offsets'), section('text_blob'),
+        section('file_ids'), section('chunk_indices'),
+        section('file_offsets'), section('file_blob')
+    )
+    indexer.embeddings = _MappedEmbeddings(
+        section('csr_indptr'), section('csr_indices'), section('csr_data'), dim
+    )
+
+    post_ptr = section('post_ptr')
+    post_ids = section('post_ids')
+    post_weights = section('post_weights')
+    postings = {}
+    for index in range(dim):
+        start, end = int(post_ptr[index]), int(post_ptr[index + 1])
+        if end > start:
+            postings[index] = (post_ids[start:end], post_weights[start:end])
+    indexer.inverted_index.postings = postings
+    indexer.inverted_index.num_docs = header["num_chunks"]
+
+    # Keeps the mapping alive for as long as the indexer and marks it read-only
+    indexer.mapped_file = mapped
+
+    return indexer
+
+
+def _padded(length: int) -> int:
+    """Rounds length up to a multiple of 8"""
+    return (length + 7) & ~7
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Sharded document index: chunks are partitioned across worker processes
+Each worker loads, tokenizes and embeds its own contiguous range of files and
+keeps that shard's embeddings and postings. The coordinator merges the
+frequency counts into one global vocabulary, fans queries out to every
+shard and merges the per-shard top k with a heap, so results are identical
+to a single DocumentIndexer over the same files.
+"""
+
+import heapq
+import multiprocessing
+import os
+from itertools import islice
+from typing import List, Optional, Tuple
+
+from rag_engine import (
+    DEFAULT_INCLUDE, DocumentIndexer, SearchResult, SparseVector, TfidfVectorizer, _load_and_chunk, discover_files
+)
+
+
+def _shard_worker(conn, docs_path: str, use_numpy: bool) -> None:
+    """
+    Worker process loop; serves one shard until it receives "close"
+    Every request is (command, args) and every reply is ("ok", value) or ("error", message)
+    """
+    indexer = DocumentIndexer(docs_path, use_numpy=use_numpy, max_workers=1, query_cache_size=0)
+    doc_counts = []
+    offset = 0
+
+    while True:
+        command, args = conn.recv()
+        try:
+            if command == "load":
+                # Load, chunk and count this shard's files
+                filenames = args
+                indexer.chunks = []
+                for filename in filenames:
+                    path = os.path.join(docs_path, filename)
+                    _, _, chunks, error = _load_and_chunk(path, filename, indexer.CHUNK_SIZE, indexer.CHUNK_OVERLAP)
+                    if error is not None:
+                        print(f"[ERROR] Failed to read {filename}: {error}")
+                        continue
+                    indexer.chunks.extend((chunk, filename, idx) for idx, chunk in enumerate(chunks))
+
+                indexer.vectorizer = TfidfVectorizer()
+                doc_counts = indexer.vectorizer.partial_fit_counts(chunk[0] for chunk in indexer.chunks)
+                vectorizer = indexer.vectorizer
+                reply = (len(indexer.chunks), vectorizer.document_frequency, vectorizer.total_frequency)
+
+            elif command == "embed":
+                # Embed with the global vocabulary and build the shard's postings
+                vocabulary, idf_scores, offset = args
+                indexer.vectorizer.vocabulary = vocabulary
+                indexer.vectorizer.idf_scores = idf_scores
+                indexer.embeddings = [indexer.vectorizer.transform_counts(counts) for counts in doc_counts]
+                indexer.inverted_index.build(indexer.embeddings)
+                # Files are never split across shards, so headings match the single index
+                indexer.metadata_index = None
+                indexer._ensure_metadata_index()
+                doc_counts = []
+                reply = len(indexer.embeddings)
+
+            elif command == "search":
+                indices, values, top_k = args
+                query = SparseVector(indices, values, indexer.vectorizer.MAX_FEATURES)
+                candidates, scores = indexer.inverted_index.score(query)
+                top_indices, similarities = indexer._select_top_k(candidates, scores, top_k)
+                reply = [
+                    (offset + idx, similarity) + tuple(indexer.chunks[idx]) + (indexer.chunk_metadata(idx),)
+                    for idx, similarity in zip(top_indices, similarities)
+                ]
+
+            elif command == "close":
+                conn.send(("ok", None))
+                conn.close()
+                return
+
+            else:
+                raise ValueError(f"Unknown command: {command}")
+
+            conn.send(("ok", reply))
+
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+class ShardedDocumentIndexer:
+    """
+    DocumentIndexer whose chunks live in num_shards worker processes
+    Supports index_documents() and exact search(); results match DocumentIndexer
+    """
+
+    def __init__(
+        self,
+        docs_path: str,
+        num_shards: Optional[int] = None,
+        use_numpy: bool = True,
+        include: Optional[List[str]] = None,
+        exclude: Optional[List[str]] = None
+    ):
+        """
+        Args:
+            docs_path: Directory with .md/.txt documents (searched recursively)
+            num_shards: Worker processes (default: CPU count)
+            use_numpy: Use numpy postings in the workers when available
+            include: Glob patterns for paths relative to docs_path (default: *.md, *.txt)
+            exclude: Glob patterns for paths to skip
+        """
+        self.docs_path = docs_path
+        self.num_shards = max(1, num_shards or os.cpu_count() or 1)
+        self.use_numpy = use_numpy
+        self.include = include if include is not None else list(DEFAULT_INCLUDE)
+        self.exclude = exclude if exclude is not None else []
+        self.vectorizer = TfidfVectorizer()
+        self.num_chunks = 0
+        self.shard_sizes: List[int] = []
+        self._workers: List[Tuple] = []  # (process, connection)
+
+    def _start_workers(self) -> None:
+        """Starts the worker processes if they are not running"""
+        if self._workers:
+            return
+        for _ in range(self.num_shards):
+            parent_conn, child_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_shard_worker,
+                args=(child_conn, self.docs_path, self.use_numpy),
+                daemon=True
+            )
+            process.start()
+            child_conn.close()
+            self._workers.append((process, parent_conn))
+
+    def _scatter(self, command: str, args_per_shard: List) -> List:
+        """Sends a command to every shard, then gathers the replies in shard order"""
+        for (_, conn), args in zip(self._workers, args_per_shard):
+            conn.send((command, args))
+
+        replies = []
+        errors = []
+        for shard, (_, conn) in enumerate(self._workers):
+            status, value = conn.recv()
+            if status == "error":
+                errors.append(f"shard {shard}: {value}")
+            replies.append(value)
+
+        if errors:
+            raise RuntimeError(f"[ShardedDocumentIndexer] {command} failed: {'; '.join(errors)}")
+        return replies
+
+    def _partition(self, filenames: List[str]) -> List[List[str]]:
+        """
+        Splits files into num_shards contiguous groups of similar total size
+        Contiguous groups keep the global chunk order, which ties are broken by
+        """
+        sizes = [os.path.getsize(os.path.join(self.docs_path, filename)) for filename in filenames]
+        total = sum(sizes)
+        groups: List[List[str]] = [[] for _ in range(self.num_shards)]
+        cumulative = 0
+        for filename, size in zip(filenames, sizes):
+            # Shard by the midpoint of the file in the cumulative byte range
+            shard = min(self.num_shards - 1, int((cumulative + size / 2) * self.num_shards / max(total, 1)))
+            groups[shard].append(filename)
+            cumulative += size
+        return groups
+
+    def index_documents(self) -> int:
+        """
+        Loads and indexes all matching files across the shards
+        Returns number of chunks indexed
+        """
+        if not os.path.exists(self.docs_path):
+            print(f"[ERROR] Documentation path does not exist: {self.docs_path}")
+            return 0
+
+        self._start_workers()
+        # Same files in the same order as DocumentIndexer
+        groups = self._partition(discover_files(self.docs_path, self.include, self.exclude))
+
+        # Pass 1: every shard chunks and counts its files
+        loaded = self._scatter("load", groups)
+        self.shard_sizes = [num_chunks for num_chunks, _, _ in loaded]
+
+        # Merge counts in shard order, so first-occurrence order matches one sequential pass
+        vectorizer = TfidfVectorizer()
+        for num_chunks, document_frequency, total_frequency in loaded:
+            for term, df in document_frequency.items():
+                vectorizer.document_frequency[term] = vectorizer.document_frequency.get(term, 0) + df
+            for term, tf in total_frequency.items():
+                vectorizer.total_frequency[term] = vectorizer.total_frequency.get(term, 0) + tf
+            vectorizer.num_documents += num_chunks
+        vectorizer.fit_vocabulary()
+        self.vectorizer = vectorizer
+        self.num_chunks = vectorizer.num_documents
+
+        # Pass 2: every shard embeds with the global vocabulary; chunk ids continue in shard order
+        offsets = [sum(self.shard_sizes[:shard]) for shard in range(self.num_shards)]
+        self._scatter("embed", [(vectorizer.vocabulary, vectorizer.idf_scores, offset) for offset in offsets])
+
+        print(f"[ShardedDocumentIndexer] Indexed {self.num_chunks} chunks in {self.num_shards} shards: {self.shard_sizes}")
+        return self.num_chunks
+
+    def search(self, query: str, top_k: int = 5) -> List[SearchResult]:
+        """Exact search over all shards; same results as DocumentIndexer.search()"""
+        if not self.num_chunks:
+            print("[WARNING] No documents indexed")
+            return []
+
+        query_embedding = self.vectorizer.transform_sparse(query)
+        args = (list(query_embedding.indices), list(query_embedding.values), top_k)
+        shard_results = self._scatter("search", [args] * self.num_shards)
+
+        # Each shard list is sorted by (-score, chunk id); merge them and keep the global top k
+        merged = heapq.merge(*shard_results, key=lambda item: (-item[1], item[0]))
+        return [
+            SearchResult(
+                text=text, filename=filename, chunk_index=chunk_index,
+                similarity=similarity, rank=rank, metadata=metadata
+            )
+            for rank, (_, similarity, text, filename, chunk_index, metadata) in enumerate(islice(merged, top_k), 1)
+        ]
+
+    def close(self) -> None:
+        """Stops the worker processes"""
+        for process, conn in self._workers:
+            try:
+                conn.send(("close", None))
+                conn.recv()
+            except (EOFError, OSError):
+                pass
+            conn.close()
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self._workers = []
+
+    def __enter__(self) -> 'ShardedDocumentIndexer':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
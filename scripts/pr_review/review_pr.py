@@ -7,7 +7,9 @@ Orchestrates the entire PR review process
 import os
 import sys
 import json
-from typing import Optional
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
 
 from mcp_client import McpClient
 from rag_engine import DocumentIndexer
@@ -24,12 +26,30 @@ class PRReviewSystem:
         anthropic_key: str,
         repo: str,
         mcp_url: str = "http://localhost:3002",
-        docs_path: str = "../../app/src/main/assets/docs"
+        docs_path: str = "../../app/src/main/assets/docs",
+        rag_cache_path: Optional[str] = None
     ):
         self.mcp_client = McpClient(mcp_url)
-        self.rag_indexer = DocumentIndexer(docs_path)
+        self.rag_indexer = DocumentIndexer(docs_path, cache_path=rag_cache_path)
         self.claude_reviewer = ClaudeReviewer(anthropic_key)
         self.github_api = GitHubAPI(github_token, repo)
+        self.stage_timings: Dict[str, Tuple[float, float]] = {}  # stage -> (start offset, seconds)
+        self._review_start = 0.0
+
+    def _run_stage(self, name: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Runs one stage and records its start offset and duration in stage_timings"""
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            finished = time.perf_counter()
+            self.stage_timings[name] = (started - self._review_start, finished - started)
+
+    def _print_stage_timings(self) -> None:
+        """Prints when each stage started and how long it took, in start order"""
+        print("\nStage timings (start offset / duration):")
+        for name, (offset, duration) in sorted(self.stage_timings.items(), key=lambda item: item[1][0]):
+            print(f"  {name:<14}{offset:>8.2f}s{duration:>9.2f}s")
 
     def review_pr(
         self,
@@ -40,6 +60,15 @@ class PRReviewSystem:
         """
         Perform complete PR review
 
+        Stages run as soon as their inputs are ready:
+            health, pr_data, index, comment_lookup   start together
+            search   <- pr_data, index
+            review   <- health, pr_data, search
+            post     <- review, comment_lookup
+        pr_data fetches the diff and the changed files in one JSON-RPC batch,
+        so the critical path is MCP fetch -> search -> model call -> post.
+        Per-stage timings are kept in stage_timings.
+
         Args:
             pr_number: Pull request number
             base_ref: Base branch reference (e.g., 'origin/master')
@@ -53,92 +82,115 @@ class PRReviewSystem:
         print(f"Base: {base_ref} -> Head: {head_ref}")
         print("=" * 60)
 
-        # Step 1: Check MCP server
-        print("\n[1/6] Checking MCP Git Server...")
-        if not self.mcp_client.health_check():
-            print("[ERROR] MCP server is not available!")
-            print("Please start: cd mcp_servers && python git_server.py")
-            return False
-        print("[OK] MCP server is healthy")
-
-        # Step 2: Get PR diff
-        print("\n[2/6] Fetching PR diff...")
-        pr_diff = self.mcp_client.get_pr_diff(base_ref, head_ref, context_lines=3)
-        if pr_diff is None:
-            print("[ERROR] Failed to get PR diff")
-            return False
-
-        if not pr_diff:
-            print("[WARNING] PR has no changes")
-            return True
-
-        print(f"[OK] Fetched diff: {len(pr_diff)} characters")
-
-        # Step 3: Get changed files
-        print("\n[3/6] Getting changed files...")
-        changed_files = self.mcp_client.get_changed_files(base_ref, head_ref)
-        file_paths = [f.filepath for f in changed_files]
-        print(f"[OK] Found {len(file_paths)} changed files")
-
-        # Step 4: Index documentation and search
-        print("\n[4/6] Indexing project documentation...")
-        chunk_count = self.rag_indexer.index_documents()
-        print(f"[OK] Indexed {chunk_count} documentation chunks")
-
-        print("\n[4/6] Searching relevant documentation...")
-        # Create search query from changed files and diff
-        search_query = f"code review best practices {' '.join(file_paths[:10])}"
-        search_results = self.rag_indexer.search(search_query, top_k=5)
-
-        relevant_docs = []
-        for result in search_results:
-            doc_text = f"[{result.filename}] (similarity: {result.similarity:.2f})\n{result.text}"
-            relevant_docs.append(doc_text)
-
-        print(f"[OK] Found {len(relevant_docs)} relevant documentation chunks")
-
-        # Step 5: Perform AI review
-        print("\n[5/6] Performing AI code review with Claude...")
-        context = ReviewContext(
-            pr_diff=pr_diff,
-            changed_files=file_paths,
-            relevant_docs=relevant_docs,
-            base_ref=base_ref,
-            head_ref=head_ref
-        )
-
-        review = self.claude_reviewer.review_code(context)
-        if not review:
-            print("[ERROR] Failed to perform code review")
-            return False
-
-        print("[OK] Review completed")
-
-        # Format review as markdown
-        markdown = self.claude_reviewer.format_review_markdown(review)
-
-        # Step 6: Post to GitHub
-        print("\n[6/6] Posting review to GitHub...")
-
-        # Check for existing bot comment
-        existing_comment_id = self.github_api.find_bot_comment(pr_number)
-
-        if existing_comment_id:
-            print(f"[INFO] Updating existing comment {existing_comment_id}")
-            success = self.github_api.update_pr_comment(existing_comment_id, markdown)
-        else:
-            print("[INFO] Creating new comment")
-            success = self.github_api.post_pr_comment(pr_number, markdown)
-
-        if success:
-            print("[OK] Review posted to GitHub")
-            print("=" * 60)
-            print("PR Review Complete!")
-            print("=" * 60)
-            return True
-        else:
-            print("[ERROR] Failed to post review")
-            return False
+        self.stage_timings = {}
+        self._review_start = time.perf_counter()
+        executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="review-stage")
+        try:
+            # Independent stages: MCP server, documentation index and GitHub all at once
+            print("\nStarting stages: health, pr_data, index, comment_lookup")
+            health = executor.submit(self._run_stage, "health", self.mcp_client.health_check)
+            # Diff and changed files in one round trip; the PR context is not used here
+            pr_data = executor.submit(
+                self._run_stage, "pr_data", self.mcp_client.get_pr_data, base_ref, head_ref, include_context=False
+            )
+            chunk_count = executor.submit(self._run_stage, "index", self.rag_indexer.index_documents)
+            existing_comment = executor.submit(
+                self._run_stage, "comment_lookup", self.github_api.find_bot_comment, pr_number
+            )
+
+            # Step 1: Check MCP server
+            print("\n[1/6] Checking MCP Git Server...")
+            if not health.result():
+                print("[ERROR] MCP server is not available!")
+                print("Please start: cd mcp_servers && python git_server.py")
+                return False
+            print("[OK] MCP server is healthy")
+
+            # Step 2: Get PR diff
+            print("\n[2/6] Fetching PR diff...")
+            data = pr_data.result()
+            pr_diff = data["diff"] if data else None
+            if pr_diff is None:
+                print("[ERROR] Failed to get PR diff")
+                return False
+
+            if not pr_diff:
+                print("[WARNING] PR has no changes")
+                return True
+
+            print(f"[OK] Fetched diff: {len(pr_diff)} characters")
+
+            # Step 3: Get changed files
+            print("\n[3/6] Getting changed files...")
+            file_paths = [f.filepath for f in data["changed_files"]]
+            print(f"[OK] Found {len(file_paths)} changed files")
+
+            # Step 4: Index documentation and search
+            print("\n[4/6] Indexing project documentation...")
+            print(f"[OK] Indexed {chunk_count.result()} documentation chunks")
+
+            print("\n[4/6] Searching relevant documentation...")
+            # One query per changed file plus a general one, fused, rescored and reranked;
+            # neighbouring chunks are merged so their overlap is sent once
+            search_queries = ["code review best practices"] + file_paths[:10]
+            search_results = self._run_stage("search", self.rag_indexer.retrieve, search_queries, 5)
+
+            relevant_docs = []
+            for result in search_results:
+                doc_text = f"[{result.filename}] (similarity: {result.similarity:.2f})\n{result.text}"
+                relevant_docs.append(doc_text)
+
+            print(f"[OK] Found {len(relevant_docs)} relevant documentation chunks")
+
+            # Step 5: Perform AI review
+            print("\n[5/6] Performing AI code review with Claude...")
+            context = ReviewContext(
+                pr_diff=pr_diff,
+                changed_files=file_paths,
+                relevant_docs=relevant_docs,
+                base_ref=base_ref,
+                head_ref=head_ref
+            )
+
+            review = self._run_stage("review", self.claude_reviewer.review_code, context)
+            if not review:
+                print("[ERROR] Failed to perform code review")
+                return False
+
+            print("[OK] Review completed")
+
+            # Format review as markdown
+            markdown = self.claude_reviewer.format_review_markdown(review)
+
+            # Step 6: Post to GitHub
+            print("\n[6/6] Posting review to GitHub...")
+
+            # Existing bot comment was looked up while the review ran
+            existing_comment_id = existing_comment.result()
+
+            if existing_comment_id:
+                print(f"[INFO] Updating existing comment {existing_comment_id}")
+                success = self._run_stage(
+                    "post", self.github_api.update_pr_comment, existing_comment_id, markdown
+                )
+            else:
+                print("[INFO] Creating new comment")
+                success = self._run_stage("post", self.github_api.post_pr_comment, pr_number, markdown)
+
+            if success:
+                print("[OK] Review posted to GitHub")
+                print("=" * 60)
+                print("PR Review Complete!")
+                print("=" * 60)
+                return True
+            else:
+                print("[ERROR] Failed to post review")
+                return False
+
+        finally:
+            # Stages still running after an early return finish in the background
+            executor.shutdown(wait=False, cancel_futures=True)
+            self._print_stage_timings()
 
 
 def main():
@@ -151,6 +203,7 @@ def main():
     base_ref = os.getenv("BASE_REF", "origin/master")
     head_ref = os.getenv("HEAD_REF", "HEAD")
     mcp_url = os.getenv("MCP_URL", "http://localhost:3002")
+    rag_cache_path = os.getenv("RAG_CACHE_PATH", ".rag_cache/index.json")
 
     # Validate required variables
     if not github_token:
@@ -181,7 +234,8 @@ def main():
         github_token=github_token,
         anthropic_key=anthropic_key,
         repo=repo,
-        mcp_url=mcp_url
+        mcp_url=mcp_url,
+        rag_cache_path=rag_cache_path or None
     )
 
     # Perform review
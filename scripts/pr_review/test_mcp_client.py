@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""Test script for MCP client against a local stand-in Git MCP server"""
+
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from mcp_client import AsyncMcpClient, McpClient
+
+
+class StandInServer:
+    """
+    Minimal JSON-RPC server answering like mcp_servers/git_server.py, batches included
+    fail_statuses: HTTP statuses returned (in order) before answering normally
+    delay: Seconds to wait before every answer
+    """
+
+    def __init__(self):
+        self.requests = []  # (tool name, arguments) in arrival order
+        self.posts = 0
+        self.connections = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.fail_statuses = []
+        self.delay = 0.0
+        self.lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with server.lock:
+                    server.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                self._send(200, {"status": "healthy", "git": True})
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                messages = body if isinstance(body, list) else [body]
+                with server.lock:
+                    server.posts += 1
+                    for message in messages:
+                        params = message.get("params", {})
+                        server.requests.append((params.get("name"), params.get("arguments", {})))
+                    status = server.fail_statuses.pop(0) if server.fail_statuses else 200
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                if server.delay:
+                    time.sleep(server.delay)
+                with server.lock:
+                    server.in_flight -= 1
+                if status != 200:
+                    self._send(status, {"error": "unavailable"})
+                    return
+                if isinstance(body, list):
+                    # Answer out of order; clients match responses by id
+                    self._send(200, [server.answer(message) for message in reversed(body)])
+                else:
+                    self._send(200, server.answer(body))
+
+            def _send(self, status, data):
+                payload = json.dumps(data).encode('utf-8')
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                try:
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client timed out and closed the connection
+                    self.close_connection = True
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @staticmethod
+    def tool_output(name, arguments):
+        if name == "git_diff_unified":
+            return f"diff --git a/app.kt b/app.kt\n-{arguments['base']}\n+{arguments['head']}"
+        if name == "git_diff_files":
+            return "M\tapp.kt\nA\tREADME.md"
+        if name == "git_show_file":
+            if arguments["filepath"] == "missing.kt":
+                return None
+            return f"content of {arguments['filepath']} at {arguments['commit']}"
+        if name == "git_show_files":
+            files = []
+            for filepath in arguments["filepaths"]:
+                content = f"content of {filepath} at {arguments['commit']}"
+                entry = {"path": filepath, "content": None, "size": len(content), "truncated": False, "error": None}
+                if filepath == "missing.kt":
+                    entry.update(size=0, error="Not found")
+                else:
+                    max_bytes = arguments.get("max_bytes", len(content))
+                    entry.update(content=content[:max_bytes], truncated=len(content) > max_bytes)
+                files.append(entry)
+            return json.dumps({"commit": "abc123", "files": files})
+        if name == "git_pr_context":
+            return "Merge Base: abc123\nCommits: 2\nFiles Changed: 2"
+        return "(empty output)"
+
+    def answer(self, request):
+        if request.get("method") != "tools/call":
+            return {"jsonrpc": "2.0", "id": request.get("id"), "error": {"code": -32601, "message": "Method not found"}}
+        params = request["params"]
+        text = self.tool_output(params["name"], params.get("arguments", {}))
+        if text is None:
+            return {"jsonrpc": "2.0", "id": request.get("id"), "error": {"code": -32000, "message": "Not found"}}
+        return {"jsonrpc": "2.0", "id": request.get("id"), "result": {"content": [{"type": "text", "text": text}]}}
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def test_tool_calls():
+    """Test tool methods and connection reuse"""
+    print("\nTesting tool calls...")
+
+    with StandInServer() as server, McpClient(server.url) as client:
+        assert client.health_check()
+        assert client.get_pr_diff("main", "HEAD") == "diff --git a/app.kt b/app.kt\n-main\n+HEAD"
+        assert [(c.status, c.filepath) for c in client.get_changed_files("main", "HEAD")] == [
+            ("M", "app.kt"), ("A", "README.md")
+        ]
+        assert client.get_file_content("HEAD", "app.kt") == "content of app.kt at HEAD"
+        assert client.get_pr_context("main", "feature")["merge_base"] == "abc123"
+
+        # Every call went over the one pooled keep-alive connection
+        assert len(server.requests) == 4
+        assert server.connections == 1
+
+    print("[OK] Tool calls work correctly")
+
+
+def test_thread_sessions():
+    """Test that every calling thread uses its own session"""
+    print("\nTesting per-thread sessions...")
+
+    with StandInServer() as server, McpClient(server.url) as client:
+        sessions = {}
+
+        def call(name):
+            assert client.get_file_content("HEAD", f"{name}.kt") == f"content of {name}.kt at HEAD"
+            assert client.session is client.session
+            sessions[name] = client.session
+
+        threads = [threading.Thread(target=call, args=(f"file{i}",)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len({id(session) for session in sessions.values()}) == 4
+        assert client.session not in sessions.values()
+        assert len(client._sessions) == 5
+
+    # close() closed every thread's session
+    assert client._sessions == []
+
+    print("[OK] Per-thread sessions work correctly")
+
+
+def test_retry_backoff():
+    """Test retries of idempotent calls and their limits"""
+    print("\nTesting retry with backoff...")
+
+    with StandInServer() as server, McpClient(server.url, max_retries=2, backoff_base=0.001) as client:
+        # Transient 503s are retried
+        server.fail_statuses = [503, 502]
+        assert client.get_file_content("HEAD", "app.kt") == "content of app.kt at HEAD"
+        assert len(server.requests) == 3
+
+        # Retries are bounded
+        server.requests.clear()
+        server.fail_statuses = [503] * 5
+        assert client.get_file_content("HEAD", "app.kt") is None
+        assert len(server.requests) == 3
+
+        # Tools that may have side effects are sent once
+        server.requests.clear()
+        server.fail_statuses = [503]
+        try:
+            client._call_tool("execute_command", {"command": "git", "args": ["status"]})
+            assert False, "non-idempotent calls should not be retried"
+        except Exception:
+            pass
+        assert len(server.requests) == 1
+
+        # Other errors are not retried
+        server.requests.clear()
+        server.fail_statuses = [500]
+        assert client.get_pr_diff("main", "HEAD") is None
+        assert len(server.requests) == 1
+
+    client = McpClient("http://127.0.0.1:9", backoff_base=1.0, backoff_max=3.0)
+    for attempt in range(6):
+        assert 0 <= client._backoff_delay(attempt) <= min(3.0, 2 ** attempt)
+    client.close()
+
+    print("[OK] Retry with backoff works correctly")
+
+
+def test_timeouts():
+    """Test per-call timeouts"""
+    print("\nTesting timeouts...")
+
+    with StandInServer() as server:
+        server.delay = 0.3
+        client = McpClient(server.url, max_retries=1, backoff_base=0.001, timeouts={"git_show_file": (1, 0.05)})
+
+        # Timed out reads of idempotent tools are retried, then reported
+        assert client.get_file_content("HEAD", "app.kt") is None
+        assert len(server.requests) == 2
+
+        # A per-call timeout overrides the tool default
+        result = client._call_tool("git_show_file", {"commit": "HEAD", "filepath": "app.kt"}, timeout=(1, 5))
+        assert result == {"success": True, "output": "content of app.kt at HEAD"}
+        client.close()
+
+    print("[OK] Timeouts work correctly")
+
+
+def test_batch_calls():
+    """Test JSON-RPC batches: one round trip, responses matched by id"""
+    print("\nTesting batch calls...")
+
+    with StandInServer() as server, McpClient(server.url, max_retries=1, backoff_base=0.001) as client:
+        results = client.call_tools([
+            ("git_show_file", {"commit": "HEAD", "filepath": "a.kt"}),
+            ("git_show_file", {"commit": "HEAD", "filepath": "missing.kt"}),
+            ("git_diff_files", {"base": "main", "head": "HEAD"}),
+        ])
+        assert server.posts == 1
+        assert results[0] == {"success": True, "output": "content of a.kt at HEAD"}
+        assert not results[1]["success"] and "Not found" in results[1]["error"]
+        assert results[2]["output"] == "M\tapp.kt\nA\tREADME.md"
+        assert client.call_tools([]) == []
+
+        server.posts = 0
+        data = client.get_pr_data("main", "HEAD", ["a.kt", "b.kt", "missing.kt"])
+        assert server.posts == 1
+        assert data["diff"] == client.get_pr_diff("main", "HEAD")
+        assert data["changed_files"] == client.get_changed_files("main", "HEAD")
+        assert data["context"] == client.get_pr_context("main", "HEAD")
+        assert data["files"] == {"a.kt": "content of a.kt at HEAD", "b.kt": "content of b.kt at HEAD", "missing.kt": None}
+
+        # Without the PR context the batch has no git_pr_context call
+        server.requests = []
+        data = client.get_pr_data("main", "HEAD", include_context=False)
+        assert [name for name, _ in server.requests] == ["git_diff_unified", "git_diff_files"]
+        assert data["context"] is None and data["diff"] is not None
+
+        # A batch of idempotent tools is retried as a whole
+        server.posts = 0
+        server.fail_statuses = [503]
+        assert client.get_pr_data("main", "HEAD")["diff"] is not None
+        assert server.posts == 2
+
+        # A batch with a non-idempotent tool is not
+        server.posts = 0
+        server.fail_statuses = [503]
+        try:
+            client.call_tools([("git_status", {}), ("execute_command", {"command": "git", "args": ["gc"]})])
+            assert False, "batches with side effects should not be retried"
+        except Exception:
+            pass
+        assert server.posts == 1
+
+    print("[OK] Batch calls work correctly")
+
+
+def test_file_contents():
+    """Test bulk file content retrieval in one call"""
+    print("\nTesting bulk file contents...")
+
+    filepaths = [f"src/file{i}.kt" for i in range(60)] + ["missing.kt"]
+    with StandInServer() as server, McpClient(server.url) as client:
+        files = client.get_file_contents("HEAD", filepaths)
+        assert server.requests == [("git_show_files", {"commit": "HEAD", "filepaths": filepaths})]
+        assert list(files) == filepaths
+        assert files["src/file7.kt"] == client.get_file_content("HEAD", "src/file7.kt")
+        assert files["missing.kt"] is None
+
+        # Files over the size cap are truncated
+        files = client.get_file_contents("HEAD", ["a.kt"], max_bytes=10)
+        assert server.requests[-1][1]["max_bytes"] == 10
+        assert files == {"a.kt": "content of"}
+
+        # No call for no files; a failed call reports every file as missing
+        server.requests.clear()
+        assert client.get_file_contents("HEAD", []) == {}
+        assert server.requests == []
+        server.fail_statuses = [500]
+        assert client.get_file_contents("HEAD", ["a.kt", "b.kt"]) == {"a.kt": None, "b.kt": None}
+
+    print("[OK] Bulk file contents work correctly")
+
+
+def test_async_client():
+    """Test concurrent tool calls with bounded concurrency"""
+    print("\nTesting async client...")
+
+    async def review_calls(client):
+        return await asyncio.gather(
+            client.get_pr_diff("main", "HEAD"),
+            client.get_changed_files("main", "HEAD"),
+            client.get_pr_context("main", "feature"),
+            *[client.get_file_content("HEAD", f"file{i}.kt") for i in range(5)],
+            client.get_file_contents("HEAD", ["a.kt", "b.kt"])
+        )
+
+    with StandInServer() as server:
+        server.delay = 0.1
+
+        async def run(max_concurrency):
+            async with AsyncMcpClient(server.url, max_concurrency=max_concurrency) as client:
+                assert await client.health_check()
+                start = time.perf_counter()
+                results = await review_calls(client)
+                return results, time.perf_counter() - start
+
+        results, elapsed = asyncio.run(run(8))
+        diff, changes, context = results[:3]
+        assert diff == "diff --git a/app.kt b/app.kt\n-main\n+HEAD"
+        assert [c.filepath for c in changes] == ["app.kt", "README.md"]
+        assert context["commits"] == "2"
+        assert results[3:8] == [f"content of file{i}.kt at HEAD" for i in range(5)]
+        assert results[8] == {"a.kt": "content of a.kt at HEAD", "b.kt": "content of b.kt at HEAD"}
+        # Nine 0.1s calls overlap instead of taking 0.9s
+        assert server.max_in_flight > 1
+        assert elapsed < 0.5, elapsed
+
+        server.max_in_flight = 0
+        results_bounded, _ = asyncio.run(run(2))
+        assert results_bounded[3:] == results[3:]
+        assert server.max_in_flight == 2
+
+    print("[OK] Async client works correctly")
+
+
+if __name__ == '__main__':
+    try:
+        test_tool_calls()
+        test_thread_sessions()
+        test_retry_backoff()
+        test_timeouts()
+        test_batch_calls()
+        test_file_contents()
+        test_async_client()
+        print("\n[PASS] All tests passed!")
+    except AssertionError as e:
+        print(f"\n[FAIL] Test failed: {e}")
+        raise
+    except Exception as e:
+        print(f"\n[FAIL] Error: {e}")
+        raise
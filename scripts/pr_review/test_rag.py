@@ -1,7 +1,18 @@
 #!/usr/bin/env python3
 """Test script for RAG engine"""
 
-from rag_engine import TfidfVectorizer, DocumentIndexer
+import json
+import os
+import tempfile
+import time
+
+from rag_engine import (
+    TfidfVectorizer, HashingTfidfVectorizer, DocumentIndexer, InvertedIndex, SearchResult, LatencyHistogram,
+    chunk_text, iter_file_chunks, merge_adjacent_chunks
+)
+from rag_mmap import write_index_file, open_index_file
+from rag_shards import ShardedDocumentIndexer
+from benchmark_rag import benchmark_size, compare_results, generate_documents
 
 
 def test_vectorizer():
@@ -37,6 +48,111 @@ def test_vectorizer():
     print("[OK] TfidfVectorizer tests passed")
 
 
+def test_tokenizer():
+    """Test that the tokenizer variants match the original tokenizer"""
+    print("\nTesting tokenizer...")
+
+    from benchmark_tokenizer import reference_tokenize, load_chunks
+
+    vectorizer = TfidfVectorizer()
+    texts = load_chunks('../../app/src/main/assets/docs') + [
+        '', 'a', 'Don\'t re-use x86_64 C++ APIs!',
+        'KELVIN \u212a and \u0130stanbul', 'caf\u00e9 na\u00efve \u00b2 x\u00b2y',
+        'tab\tnbsp\u00a0ideographic\u3000line\u2028sep\x1fend',
+        'THE quick brown fox is at the door of 42 houses'
+    ]
+
+    for text in texts:
+        expected = reference_tokenize(text)
+        assert vectorizer.tokenize(text) == expected, text
+        assert list(vectorizer.iter_tokens(text)) == expected, text
+    assert vectorizer.tokenize_batch(texts) == [reference_tokenize(text) for text in texts]
+
+    print("[OK] Tokenizer matches the original implementation")
+
+
+def test_sparse_vectors():
+    """Test sparse vectors and inverted index scoring"""
+    print("\nTesting sparse vectors...")
+
+    vectorizer = TfidfVectorizer()
+    docs = [
+        "Android application with Clean Architecture and MVVM pattern",
+        "Kotlin coroutines for asynchronous operations",
+        "Jetpack Compose for modern UI development"
+    ]
+    vectorizer.fit(docs)
+
+    # Sparse vectors expand to exactly the dense vectors
+    sparse = [vectorizer.transform_sparse(doc) for doc in docs]
+    for doc, vector in zip(docs, sparse):
+        assert vector.to_dense() == vectorizer.transform(doc)
+        assert 0 < len(vector) < vectorizer.MAX_FEATURES
+
+    # Only documents sharing a term with the query are scored
+    for use_numpy in (True, False):
+        index = InvertedIndex(use_numpy=use_numpy)
+        index.build(sparse)
+        query = vectorizer.transform_sparse("Kotlin coroutines")
+        candidates, scores = index.score(query)
+
+        assert list(candidates) == [1]
+        assert abs(scores[0] - query.dot(sparse[1])) < 1e-6
+
+    print("[OK] Sparse vector tests passed")
+
+
+def test_fit_transform_single_pass():
+    """Test fused fit_transform matches fit followed by transform"""
+    print("\nTesting single-pass fit_transform...")
+
+    indexer = DocumentIndexer('../../app/src/main/assets/docs')
+    indexer.index_documents()
+    texts = [chunk[0] for chunk in indexer.chunks]
+
+    fused = TfidfVectorizer()
+    fused_vectors = fused.fit_transform(texts)
+
+    separate = TfidfVectorizer()
+    separate.fit(texts)
+    separate_vectors = [separate.transform(text) for text in texts]
+
+    assert list(fused.vocabulary.items()) == list(separate.vocabulary.items())
+    assert fused.idf_scores == separate.idf_scores
+    assert fused_vectors == separate_vectors
+
+    print("[OK] fit_transform matches fit + transform")
+
+
+def test_transform_batch():
+    """Test batch transform matches per-text transform"""
+    print("\nTesting transform_batch...")
+
+    indexer = DocumentIndexer('../../app/src/main/assets/docs')
+    indexer.index_documents()
+    vectorizer = indexer.vectorizer
+    texts = [chunk[0] for chunk in indexer.chunks] + ["", "the and of", "Ünïcödé MVVM\tRoom"]
+
+    assert vectorizer.tokenize_batch(texts) == [vectorizer.tokenize(text) for text in texts]
+
+    expected = [vectorizer.transform_sparse(text) for text in texts]
+
+    # Small batch size forces several batches to be stacked
+    sparse = vectorizer.transform_batch(texts, sparse=True, batch_size=50)
+    assert sparse.shape == (len(texts), vectorizer.MAX_FEATURES)
+    for i, vector in enumerate(expected):
+        row = sparse.row(i)
+        assert list(row.indices) == list(vector.indices)
+        assert all(abs(a - b) < 1e-6 for a, b in zip(row.values, vector.values))
+
+    dense = vectorizer.transform_batch(texts, batch_size=50)
+    assert len(dense) == len(texts)
+    for i, vector in enumerate(expected):
+        assert all(abs(a - b) < 1e-6 for a, b in zip(dense[i], vector.to_dense()))
+
+    print(f"[OK] transform_batch matches transform for {len(texts)} texts")
+
+
 def test_document_indexer():
     """Test DocumentIndexer"""
     print("\nTesting DocumentIndexer...")
@@ -57,6 +173,689 @@ def test_document_indexer():
     print(f"[OK] Top result similarity: {results[0].similarity:.4f}")
 
 
+def test_search_matches_fallback():
+    """Test numpy search returns the same ranking as the pure Python loop"""
+    print("\nTesting numpy search against fallback...")
+
+    docs_path = '../../app/src/main/assets/docs'
+    fast = DocumentIndexer(docs_path)
+    slow = DocumentIndexer(docs_path, use_numpy=False)
+    fast.index_documents()
+    slow.index_documents()
+
+    for query in ['Clean Architecture', 'MCP server setup', 'reranking filtering threshold']:
+        fast_results = fast.search(query, top_k=5)
+        slow_results = slow.search(query, top_k=5)
+
+        assert [(r.filename, r.chunk_index) for r in fast_results] == \
+            [(r.filename, r.chunk_index) for r in slow_results]
+        for f, s in zip(fast_results, slow_results):
+            assert abs(f.similarity - s.similarity) < 1e-5
+
+    print("[OK] numpy and fallback search agree")
+
+
+def test_index_cache():
+    """Test index cache is reused until a document changes"""
+    print("\nTesting index cache...")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        docs_dir = os.path.join(tmp_dir, 'docs')
+        os.makedirs(docs_dir)
+        cache_path = os.path.join(tmp_dir, 'cache', 'index.json')
+
+        with open(os.path.join(docs_dir, 'architecture.md'), 'w', encoding='utf-8') as f:
+            f.write("Clean Architecture with domain, data and presentation layers. " * 20)
+        with open(os.path.join(docs_dir, 'compose.md'), 'w', encoding='utf-8') as f:
+            f.write("Jetpack Compose screens observe ViewModel state flows.")
+
+        first = DocumentIndexer(docs_dir, cache_path=cache_path)
+        count = first.index_documents()
+        assert not first.loaded_from_cache
+        assert os.path.exists(cache_path)
+
+        # Unchanged documents load from cache with identical results
+        second = DocumentIndexer(docs_dir, cache_path=cache_path)
+        assert second.index_documents() == count
+        assert second.loaded_from_cache
+
+        query = 'Compose ViewModel architecture'
+        assert [(r.filename, r.chunk_index, round(r.similarity, 6)) for r in first.search(query)] == \
+            [(r.filename, r.chunk_index, round(r.similarity, 6)) for r in second.search(query)]
+
+        # Any content change rebuilds the index
+        with open(os.path.join(docs_dir, 'compose.md'), 'a', encoding='utf-8') as f:
+            f.write(" Navigation uses NavGraph.")
+
+        third = DocumentIndexer(docs_dir, cache_path=cache_path)
+        third.index_documents()
+        assert not third.loaded_from_cache
+        assert third.search('NavGraph')[0].filename == 'compose.md'
+
+    print("[OK] Index cache works correctly")
+
+
+def test_incremental_updates():
+    """Test adding, replacing and removing documents without a full rebuild"""
+    print("\nTesting incremental updates...")
+
+    docs = {
+        'architecture.md': "Clean Architecture separates domain, data and presentation layers. " * 15,
+        'compose.md': "Jetpack Compose screens observe ViewModel state flows. " * 10,
+        'room.md': "Room database entities, DAOs and migrations. " * 10,
+    }
+
+    for use_numpy in (True, False):
+        # Any new top term triggers a refit, so the result matches a full fit
+        indexer = DocumentIndexer('.', use_numpy=use_numpy, max_new_top_terms=0)
+        for filename, content in docs.items():
+            indexer.add_document(filename, content)
+
+        full = TfidfVectorizer()
+        full.fit([chunk[0] for chunk in indexer.chunks])
+        assert indexer.vectorizer.vocabulary == full.vocabulary
+        assert indexer.search('Room migrations')[0].filename == 'room.md'
+
+        # Thresholds high enough that no refit happens
+        indexer.max_idf_drift = 10.0
+        indexer.max_new_top_terms = 1000
+        vocabulary = dict(indexer.vectorizer.vocabulary)
+
+        # Replacing a document swaps its chunks
+        indexer.update_document('room.md', "Hilt modules provide Room repositories. " * 10)
+        assert all(r.filename != 'room.md' for r in indexer.search('migrations'))
+        assert indexer.search('Room')[0].filename == 'room.md'
+        assert indexer.vectorizer.vocabulary == vocabulary
+        assert indexer.vectorizer.idf_drift() > 0.0
+
+        # Removing a document keeps postings consistent with the remaining chunks
+        removed = indexer.remove_document('architecture.md')
+        assert removed > 0
+        assert all(chunk[1] != 'architecture.md' for chunk in indexer.chunks)
+
+        rebuilt = InvertedIndex(use_numpy=use_numpy)
+        rebuilt.build(indexer.embeddings)
+        assert sorted(rebuilt.postings) == sorted(indexer.inverted_index.postings)
+        for term, (ids, weights) in rebuilt.postings.items():
+            assert list(indexer.inverted_index.postings[term][0]) == list(ids)
+
+        results = indexer.search('Compose ViewModel')
+        assert results and results[0].filename == 'compose.md'
+
+    print("[OK] Incremental updates work correctly")
+
+
+def test_mmap_index_file():
+    """Test memory-mapped index file returns the same results as the in-memory index"""
+    print("\nTesting memory-mapped index file...")
+
+    indexer = DocumentIndexer('../../app/src/main/assets/docs')
+    indexer.index_documents()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'index.rag')
+        write_index_file(indexer, path)
+
+        for use_numpy in (True, False):
+            mapped = open_index_file(path, use_numpy=use_numpy)
+            assert len(mapped.chunks) == len(indexer.chunks)
+            assert mapped.chunks[7] == indexer.chunks[7]
+            assert list(mapped.embeddings[7].indices) == list(indexer.embeddings[7].indices)
+
+            for query in ['Clean Architecture', 'MCP server setup', 'reranking threshold']:
+                expected = indexer.search(query, top_k=5)
+                actual = mapped.search(query, top_k=5)
+                assert [(r.filename, r.chunk_index, r.text) for r in actual] == \
+                    [(r.filename, r.chunk_index, r.text) for r in expected]
+                for a, e in zip(actual, expected):
+                    assert abs(a.similarity - e.similarity) < 1e-5
+
+            # The mapping is read-only; mutating it is an error, not silent corruption
+            for mutate in (mapped.index_documents, lambda: mapped.add_document('NEW.md', 'text'),
+                           lambda: mapped.remove_document(mapped.chunks[0][1]), lambda: mapped._save_cache({})):
+                try:
+                    mutate()
+                    assert False, "mapped indexes should be read-only"
+                except RuntimeError:
+                    pass
+            assert len(mapped.chunks) == len(indexer.chunks)
+
+            del mapped
+
+    print("[OK] Memory-mapped index matches in-memory index")
+
+
+def test_recursive_parallel_loading():
+    """Test recursive discovery with globs gives the same index for any concurrency"""
+    print("\nTesting recursive parallel loading...")
+
+    with tempfile.TemporaryDirectory() as docs_dir:
+        files = {
+            'README.md': "Project overview. " * 40,
+            'guides/rag.md': "RAG retrieval with TF-IDF vectors. " * 30,
+            'guides/mcp/setup.txt': "Start the MCP git server on port 3002. " * 20,
+            'drafts/todo.md': "Unfinished draft notes.",
+            'assets/logo.svg': "<svg></svg>",
+        }
+        for relative, content in files.items():
+            filepath = os.path.join(docs_dir, *relative.split('/'))
+            os.makedirs(os.path.dirname(filepath), exist_ok=True)
+            with open(filepath, 'w', encoding='utf-8') as f:
+                f.write(content)
+
+        serial = DocumentIndexer(docs_dir, exclude=['drafts/*'], max_workers=1)
+        serial.index_documents()
+        filenames = sorted(set(chunk[1] for chunk in serial.chunks))
+        assert filenames == ['README.md', 'guides/mcp/setup.txt', 'guides/rag.md']
+
+        for use_processes in (False, True):
+            parallel = DocumentIndexer(docs_dir, exclude=['drafts/*'], max_workers=4, use_processes=use_processes)
+            parallel.index_documents()
+            assert parallel.chunks == serial.chunks
+            assert parallel.vectorizer.vocabulary == serial.vectorizer.vocabulary
+
+        only_guides = DocumentIndexer(docs_dir, include=['guides/*.md'])
+        only_guides.index_documents()
+        assert set(chunk[1] for chunk in only_guides.chunks) == {'guides/rag.md'}
+
+    print("[OK] Recursive parallel loading is deterministic")
+
+
+def test_ann_search():
+    """Test IVF approximate search against exact search"""
+    print("\nTesting approximate search...")
+
+    docs_path = '../../app/src/main/assets/docs'
+    queries = ['Clean Architecture', 'MCP server setup', 'reranking threshold', 'Room database']
+
+    for use_numpy in (True, False):
+        # Probing every cluster scans every chunk, so results equal exact search
+        indexer = DocumentIndexer(docs_path, use_numpy=use_numpy, ann_lists=8, ann_probes=8)
+        indexer.index_documents()
+        assert len(indexer.ann_index.lists) == 8
+        assert sum(len(ids) for ids in indexer.ann_index.lists) == len(indexer.chunks)
+
+        for query in queries:
+            exact = indexer.search(query, top_k=5)
+            approximate = indexer.search(query, top_k=5, mode='ann')
+            assert [round(r.similarity, 5) for r in approximate] == [round(r.similarity, 5) for r in exact]
+
+        # Added and removed documents are scored too
+        indexer.add_document('EXTRA.md', '# Extra\nClean Architecture layers for the Room database. ' * 20)
+        indexer.remove_document(indexer.chunks[0][1])
+        for query in queries:
+            exact = indexer.search(query, top_k=5)
+            approximate = indexer.search(query, top_k=5, mode='ann')
+            assert [(r.filename, r.chunk_index) for r in approximate] == [(r.filename, r.chunk_index) for r in exact]
+
+        # Fewer probes scan fewer chunks
+        indexer.ann_index.num_probes = 2
+        query_vector = indexer.vectorizer.transform_sparse(queries[0])
+        assert len(indexer.ann_index.candidates(query_vector)) < len(indexer.chunks)
+        assert len(indexer.search(queries[0], top_k=5, mode='ann')) > 0
+
+    # The clustering is persisted with the index cache
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache_path = os.path.join(tmp_dir, 'index.json')
+        first = DocumentIndexer(docs_path, cache_path=cache_path, ann_lists=0)
+        first.index_documents()
+        second = DocumentIndexer(docs_path, cache_path=cache_path, ann_lists=0)
+        second.index_documents()
+        assert second.loaded_from_cache
+        assert second.ann_index.assignments == first.ann_index.assignments
+
+    print("[OK] Approximate search works correctly")
+
+
+def test_bm25_search():
+    """Test BM25 mode: MaxScore pruning returns the exhaustive top-k"""
+    print("\nTesting BM25 search...")
+
+    docs_path = '../../app/src/main/assets/docs'
+    queries = ['Clean Architecture', 'MCP server setup', 'reranking threshold', 'Room database migration']
+
+    for use_numpy in (True, False):
+        indexer = DocumentIndexer(docs_path, use_numpy=use_numpy)
+        indexer.index_documents()
+        assert indexer.bm25_index is None  # built lazily
+
+        for query in queries:
+            results = indexer.search(query, top_k=5, mode='bm25')
+            assert len(results) > 0
+            scores = [r.similarity for r in results]
+            assert scores == sorted(scores, reverse=True)
+
+            terms = indexer.vectorizer.tokenize(query)
+            for top_k in (1, 5, 20):
+                pruned = indexer.bm25_index.search(terms, top_k)
+                exhaustive = indexer.bm25_index.search(terms, top_k, prune=False)
+                assert pruned == exhaustive
+
+        # Terms outside the TF-IDF vocabulary are still searchable
+        rare = min(indexer.bm25_index.postings, key=lambda term: len(indexer.bm25_index.postings[term][0]))
+        assert rare not in indexer.vectorizer.vocabulary
+        results = indexer.search(rare, top_k=3, mode='bm25')
+        assert results and rare in indexer.vectorizer.tokenize(results[0].text)
+
+    # Incremental updates keep the BM25 index in sync
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with open(os.path.join(tmp_dir, 'a.md'), 'w') as f:
+            f.write('Gradle build cache configuration ' * 20)
+        with open(os.path.join(tmp_dir, 'b.md'), 'w') as f:
+            f.write('Kotlin coroutines and flows ' * 20)
+
+        indexer = DocumentIndexer(tmp_dir, bm25=True)
+        indexer.index_documents()
+        assert indexer.bm25_index is not None
+
+        indexer.add_document('c.md', 'Zebrafish quantum entanglement ' * 20)
+        assert indexer.search('zebrafish', top_k=1, mode='bm25')[0].filename == 'c.md'
+
+        indexer.remove_document('a.md')
+        assert indexer.bm25_index.num_docs == len(indexer.chunks)
+        assert all(r.filename != 'a.md' for r in indexer.search('gradle cache', top_k=5, mode='bm25'))
+        assert indexer.search('coroutines', top_k=1, mode='bm25')[0].filename == 'b.md'
+
+    print("[OK] BM25 search works correctly")
+
+
+def test_query_cache():
+    """Test LRU caching of query embeddings and search results"""
+    print("\nTesting query cache...")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with open(os.path.join(tmp_dir, 'a.md'), 'w') as f:
+            f.write('Gradle build cache configuration ' * 20)
+        with open(os.path.join(tmp_dir, 'b.md'), 'w') as f:
+            f.write('Kotlin coroutines and flows ' * 20)
+
+        indexer = DocumentIndexer(tmp_dir, query_cache_size=2)
+        indexer.index_documents()
+
+        first = indexer.search('Gradle cache', top_k=3)
+        assert indexer.search_result_cache.misses == 1
+        # Case and whitespace differences hit the same entry
+        second = indexer.search('  gradle   CACHE ', top_k=3)
+        assert indexer.search_result_cache.hits == 1
+        assert [(r.filename, r.chunk_index, r.similarity) for r in second] == \
+            [(r.filename, r.chunk_index, r.similarity) for r in first]
+        # A different top_k is a different result but reuses the embedding
+        indexer.search('gradle cache', top_k=1)
+        assert indexer.query_embedding_cache.hits == 1
+
+        # Bounded: the least recently used entry is evicted
+        indexer.search('kotlin', top_k=3)
+        indexer.search('flows', top_k=3)
+        assert len(indexer.search_result_cache) == 2
+        misses = indexer.search_result_cache.misses
+        indexer.search('gradle cache', top_k=3)
+        assert indexer.search_result_cache.misses == misses + 1
+
+        # Any index change invalidates both caches
+        indexer.add_document('c.md', 'Gradle cache eviction policies ' * 20)
+        assert len(indexer.search_result_cache) == 0 and len(indexer.query_embedding_cache) == 0
+        assert 'c.md' in [r.filename for r in indexer.search('gradle cache', top_k=3)]
+
+        indexer.remove_document('c.md')
+        assert 'c.md' not in [r.filename for r in indexer.search('gradle cache', top_k=3)]
+
+        stats = indexer.query_cache_stats()
+        assert stats["results"]["max_size"] == 2 and stats["results"]["hits"] >= 1
+
+    print("[OK] Query cache works correctly")
+
+
+def test_search_many():
+    """Test batched multi-query search and reciprocal rank fusion"""
+    print("\nTesting multi-query search...")
+
+    docs_path = '../../app/src/main/assets/docs'
+    queries = ['Clean Architecture', 'MCP server setup', 'reranking threshold', 'Room database',
+               'zzzz unknown words', 'MCP server setup']
+
+    for use_numpy in (True, False):
+        indexer = DocumentIndexer(docs_path, use_numpy=use_numpy, query_cache_size=0)
+        indexer.index_documents()
+
+        # Per-query lists equal separate searches
+        result_lists = indexer.search_many(queries, top_k=5, fuse=False)
+        assert len(result_lists) == len(queries)
+        assert result_lists[4] == []
+        for query, results in zip(queries, result_lists):
+            single = indexer.search(query, top_k=5)
+            assert [(r.filename, r.chunk_index, r.similarity) for r in results] == \
+                [(r.filename, r.chunk_index, r.similarity) for r in single]
+
+        # Fused list is deduplicated and ranked by RRF
+        fused = indexer.search_many(queries, top_k=8)
+        keys = [(r.filename, r.chunk_index) for r in fused]
+        assert len(fused) == 8 and len(set(keys)) == len(keys)
+        assert [r.rank for r in fused] == list(range(1, 9))
+        # The repeated query puts its top chunk first
+        top = result_lists[1][0]
+        assert keys[0] == (top.filename, top.chunk_index)
+
+    print("[OK] Multi-query search works correctly")
+
+
+def test_hashing_vectorizer():
+    """Test the hashing vectorizer mode, its cache and merging of shards"""
+    print("\nTesting hashing vectorizer...")
+
+    docs_path = '../../app/src/main/assets/docs'
+    filenames = sorted(f for f in os.listdir(docs_path) if f.endswith('.md'))
+
+    # Single-pass streaming gives the same vectors as counting first
+    texts = ['Kotlin coroutines and flows', 'Gradle build cache', 'Kotlin build scripts', 'flows of data']
+    streamed = HashingTfidfVectorizer(n_features=1024).fit_transform_sparse(iter(texts))
+    counted = HashingTfidfVectorizer(n_features=1024)
+    counted_vectors = [counted.transform_counts(counts) for counts in counted.fit_counts(texts)]
+    for a, b in zip(streamed, counted_vectors):
+        assert list(a.indices) == list(b.indices)
+        assert all(abs(x - y) < 1e-12 for x, y in zip(a.values, b.values))
+    assert counted.bucket('kotlin') == HashingTfidfVectorizer(n_features=1024).bucket('kotlin')
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        shard_dirs = [os.path.join(tmp_dir, name) for name in ('all', 'shard0', 'shard1')]
+        for shard_dir in shard_dirs:
+            os.makedirs(shard_dir)
+        for i, filename in enumerate(filenames):
+            with open(os.path.join(docs_path, filename), encoding='utf-8') as f:
+                content = f.read()
+            for shard_dir in (shard_dirs[0], shard_dirs[1 + i % 2]):
+                with open(os.path.join(shard_dir, filename), 'w', encoding='utf-8') as f:
+                    f.write(content)
+
+        full = DocumentIndexer(shard_dirs[0], hashing_features=4096)
+        full.index_documents()
+        results = full.search('Clean Architecture', top_k=5)
+        assert len(results) == 5
+        # Every term has a bucket, not only the top MAX_FEATURES
+        assert full.vectorizer.get_vocabulary_size() > TfidfVectorizer.MAX_FEATURES
+
+        # Shards indexed separately and merged equal the full index
+        merged = DocumentIndexer(shard_dirs[1], hashing_features=4096)
+        merged.index_documents()
+        shard = DocumentIndexer(shard_dirs[2], hashing_features=4096)
+        shard.index_documents()
+        assert merged.merge(shard) == len(shard.chunks)
+        assert merged.vectorizer.num_documents == full.vectorizer.num_documents
+        assert merged.vectorizer.document_frequency == full.vectorizer.document_frequency
+
+        by_chunk = {(c[1], c[2]): v for c, v in zip(full.chunks, full.embeddings)}
+        for chunk, vector in zip(merged.chunks, merged.embeddings):
+            expected = by_chunk[(chunk[1], chunk[2])]
+            assert list(vector.indices) == list(expected.indices)
+            assert all(abs(x - y) < 1e-9 for x, y in zip(vector.values, expected.values))
+        merged_results = merged.search('Clean Architecture', top_k=5)
+        assert [(r.filename, r.chunk_index) for r in merged_results] == \
+            [(r.filename, r.chunk_index) for r in results]
+
+        try:
+            merged.merge(shard)
+            assert False, "merging the same documents twice should fail"
+        except ValueError:
+            pass
+
+        # Cache round trip keeps the bucket state
+        cache_path = os.path.join(tmp_dir, 'index.json')
+        first = DocumentIndexer(shard_dirs[0], cache_path=cache_path, hashing_features=4096)
+        first.index_documents()
+        second = DocumentIndexer(shard_dirs[0], cache_path=cache_path, hashing_features=4096)
+        second.index_documents()
+        assert second.loaded_from_cache
+        assert second.vectorizer.idf_scores == first.vectorizer.idf_scores
+        assert [r.similarity for r in second.search('MCP server', top_k=3)] == \
+            [r.similarity for r in first.search('MCP server', top_k=3)]
+
+        # A drift refit only re-weights the vectors
+        second.max_idf_drift = 0.0
+        second.add_document('extra.md', 'Zebrafish quantum entanglement ' * 20)
+        assert second.search('zebrafish', top_k=1)[0].filename == 'extra.md'
+        assert abs(second.vectorizer.idf_drift()) < 1e-12
+
+    print("[OK] Hashing vectorizer works correctly")
+
+
+def test_retrieve_pipeline():
+    """Test two-stage retrieval: rescoring, threshold, reranking and overlap merging"""
+    print("\nTesting retrieval pipeline...")
+
+    # Consecutive chunks merge back into the original text
+    text = ''.join(f"sentence {i} about chunk overlap. " for i in range(60))
+    chunks = chunk_text(text, 500, 50)
+    results = [
+        SearchResult(text=chunks[i], filename='a.md', chunk_index=i, similarity=0.5 - i / 100, rank=rank)
+        for rank, i in enumerate([1, 0, 3, 2], 1)
+    ] + [SearchResult(text='other', filename='b.md', chunk_index=1, similarity=0.9, rank=5)]
+    merged = merge_adjacent_chunks(results, 50)
+    assert [(r.filename, r.chunk_index, r.chunk_span) for r in merged] == [('a.md', 0, 4), ('b.md', 1, 1)]
+    assert merged[0].text == text[:len(merged[0].text)] and len(merged[0].text) == 4 * 450 + 50
+    assert merged[0].similarity == 0.5
+
+    indexer = DocumentIndexer('../../app/src/main/assets/docs')
+    indexer.index_documents()
+    query = 'similarity threshold reranking'
+
+    results = indexer.retrieve(query, top_k=5, rerank=False, merge_adjacent=False)
+    assert len(results) == 5
+    scores = [r.similarity for r in results]
+    assert scores == sorted(scores, reverse=True)
+
+    # Cutoff applies to the rescored similarity
+    threshold = scores[2]
+    filtered = indexer.retrieve(query, top_k=5, min_similarity=threshold, rerank=False, merge_adjacent=False)
+    assert all(r.similarity >= threshold for r in filtered) and len(filtered) >= 3
+    assert indexer.retrieve(query, top_k=5, min_similarity=1.01) == []
+
+    # Merged results never leave two neighbouring chunks of a file apart
+    results = indexer.retrieve(['MCP server setup', 'reranking threshold'], top_k=6)
+    assert 0 < len(results) <= 6
+    assert [r.rank for r in results] == list(range(1, len(results) + 1))
+    spans = {}
+    for r in results:
+        for other_start, other_span in spans.get(r.filename, []):
+            assert r.chunk_index + r.chunk_span < other_start or other_start + other_span < r.chunk_index
+        spans.setdefault(r.filename, []).append((r.chunk_index, r.chunk_span))
+
+    print("[OK] Retrieval pipeline works correctly")
+
+
+def test_metadata_filters():
+    """Test chunk metadata and filtered search"""
+    print("\nTesting metadata filters...")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.makedirs(os.path.join(tmp_dir, 'api'))
+        os.makedirs(os.path.join(tmp_dir, 'guides'))
+        sections = ''.join(
+            f"## Section {i}\n" + f"Gradle cache and Kotlin flows, part {i}. " * 12 + "\n" for i in range(6)
+        )
+        files = {
+            'api/API_CACHE.md': '# Cache API\n' + sections,
+            'api/API_FLOWS.md': '# Flows API\n' + sections,
+            'guides/GUIDE.md': '# Guide\n' + sections,
+            'notes.txt': 'Gradle cache notes ' * 40
+        }
+        for path, content in files.items():
+            with open(os.path.join(tmp_dir, path), 'w') as f:
+                f.write(content)
+
+        for use_numpy in (True, False):
+            indexer = DocumentIndexer(tmp_dir, use_numpy=use_numpy, ann_lists=4, ann_probes=4)
+            indexer.index_documents()
+
+            # Metadata is computed while indexing; results look it up
+            assert indexer.metadata_index is not None
+            lazy = [indexer.chunk_metadata(idx) for idx in range(len(indexer.chunks))]
+            assert lazy == indexer.metadata_index.metadata
+            assert lazy[0].directory == 'api' and lazy[0].doc_type == 'md' and lazy[0].heading == 'Cache API'
+            assert {m.heading for m in lazy if m.path == 'api/API_CACHE.md'} >= {'Section 0', 'Section 5'}
+            assert {m.doc_type for m in lazy} == {'md', 'txt'}
+
+            everything = indexer.search('gradle cache kotlin', top_k=len(indexer.chunks))
+            for filters in ({'directory': 'api'}, {'path': 'api/API_F*'}, {'doc_type': ['txt', 'md'], 'heading': 'Section 3'},
+                            {'directory': 'guides', 'doc_type': 'txt'}):
+                selected = indexer._ensure_metadata_index().select(filters)
+                expected = [(r.filename, r.chunk_index) for r in everything
+                            if selected >> indexer.chunks.index((r.text, r.filename, r.chunk_index)) & 1][:5]
+                for mode in ('exact', 'ann', 'bm25'):
+                    results = indexer.search('gradle cache kotlin', top_k=5, mode=mode, filters=filters)
+                    assert all(selected >> indexer.chunks.index((r.text, r.filename, r.chunk_index)) & 1
+                               for r in results)
+                    if mode == 'exact':
+                        assert [(r.filename, r.chunk_index) for r in results] == expected
+
+            results = indexer.search_many(['gradle cache', 'kotlin flows'], top_k=3, fuse=False,
+                                          filters={'heading': ['Guide', 'Section 1']})
+            assert all(r.metadata.heading in ('Guide', 'Section 1') for rs in results for r in rs)
+            assert indexer.search('gradle', filters={'path': 'missing.md'}) == []
+
+            try:
+                indexer.search('gradle', filters={'author': 'me'})
+                assert False, "unknown fields should be rejected"
+            except ValueError:
+                pass
+
+    print("[OK] Metadata filters work correctly")
+
+
+def test_metadata_large_file():
+    """Test that results of a large file without headings get metadata in constant time"""
+    print("\nTesting metadata lookup on a large file...")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        lines = [f"Filler line {i} about builds and caches." for i in range(60000)]
+        lines[-20:] = ["Zebra migration notes for the final section."] * 20
+        with open(os.path.join(tmp_dir, 'LARGE.txt'), 'w') as f:
+            f.write('\n'.join(lines))
+
+        indexer = DocumentIndexer(tmp_dir, verbose=False)
+        indexer.index_documents()
+        assert len(indexer.chunks) > 5000
+
+        results = indexer.search('zebra migration', top_k=5)
+        assert results and all(r.chunk_index > len(indexer.chunks) - 10 for r in results)
+        assert all(r.metadata.heading == '' and r.metadata.doc_type == 'txt' for r in results)
+
+        # Cache hits only wrap the cached ranking; no walk back through the file per result
+        start = time.perf_counter()
+        for _ in range(200):
+            indexer.search('zebra migration', top_k=5)
+        elapsed = time.perf_counter() - start
+        assert elapsed < 0.5, elapsed
+
+    print("[OK] Metadata lookup is constant time")
+
+
+def test_sharded_search():
+    """Test that sharded scatter-gather search matches the single index"""
+    print("\nTesting sharded search...")
+
+    docs_path = '../../app/src/main/assets/docs'
+    if not os.path.exists(docs_path):
+        print("[SKIP] Docs directory not found")
+        return
+
+    indexer = DocumentIndexer(docs_path)
+    indexer.index_documents()
+
+    with ShardedDocumentIndexer(docs_path, num_shards=3) as sharded:
+        assert sharded.index_documents() == len(indexer.chunks)
+        assert sum(sharded.shard_sizes) == len(indexer.chunks)
+        assert list(sharded.vectorizer.vocabulary.items()) == list(indexer.vectorizer.vocabulary.items())
+
+        for query in ["Clean Architecture", "MCP server setup", "kotlin coroutines flow", "zzzz"]:
+            for top_k in (5, 50):
+                expected = indexer.search(query, top_k)
+                results = sharded.search(query, top_k)
+                assert results == expected, f"Sharded results differ for {query!r}"
+
+    print("[OK] Sharded search matches the single index")
+
+
+def test_benchmark_suite():
+    """Test the synthetic corpus generator and baseline comparison"""
+    print("\nTesting benchmark suite...")
+
+    documents = generate_documents(120, chunks_per_doc=50, seed=7)
+    assert documents == generate_documents(120, chunks_per_doc=50, seed=7)
+    assert documents != generate_documents(120, chunks_per_doc=50, seed=8)
+    assert sum(len(chunk_text(content, DocumentIndexer.CHUNK_SIZE, DocumentIndexer.CHUNK_OVERLAP))
+               for _, content in documents) == 120
+
+    results = benchmark_size(120, repeat=1, num_queries=10, modes=("exact", "ann", "bm25"), seed=7)
+    assert [r["stage"] for r in results] == [
+        "tokenize", "fit", "transform", "index_documents", "search_exact", "search_ann", "search_bm25"
+    ]
+    # ANN latency is reported relative to exact search, so an ANN slower than exact shows up
+    assert results[5]["p50_vs_exact"] > 0 and 0 <= results[5]["recall_vs_exact"] <= 1
+    assert "p50_vs_exact" not in results[4] and "p50_vs_exact" not in results[6]
+    assert all(r["num_chunks"] == 120 and r["seconds"] > 0 for r in results)
+    assert all(r["peak_memory_mb"] > 0 for r in results[:4])
+    assert results[-1]["queries"] == 10 and results[-1]["p50_ms"] <= results[-1]["p95_ms"]
+
+    slower = [dict(r, seconds=r["seconds"] * 2) if r["stage"] == "fit" else r for r in results]
+    comparisons = compare_results(slower, results, threshold=0.5)
+    assert [(c["stage"], c["metric"]) for c in comparisons if c["regression"]] == [("fit", "seconds")]
+    assert compare_results(results, [], threshold=0.5) == []
+
+    print("[OK] Benchmark suite works correctly")
+
+
+def test_indexer_stats():
+    """Test stage timings, counters, latency histograms and their exports"""
+    print("\nTesting indexer stats...")
+
+    histogram = LatencyHistogram(buckets=(0.001, 0.01, 0.1))
+    for seconds in (0.0005, 0.002, 0.004, 0.05, 5.0):
+        histogram.observe(seconds)
+    assert histogram.counts == [1, 2, 1, 1]
+    assert histogram.to_dict()["buckets"] == {"0.001": 1, "0.01": 3, "0.1": 4, "+Inf": 5}
+    assert 0.001 < histogram.quantile(0.5) <= 0.01
+    assert histogram.quantile(1.0) == 0.1
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name in ("a.md", "b.md"):
+            with open(os.path.join(tmp_dir, name), 'w') as f:
+                f.write(f"Kotlin coroutines and flows in {name}. " * 40)
+
+        indexer = DocumentIndexer(tmp_dir, verbose=False)
+        indexer.index_documents()
+        for query in ("kotlin flows", "kotlin flows", "coroutines"):
+            indexer.search(query)
+        indexer.search("kotlin", mode="bm25")
+        indexer.add_document("c.md", "Gradle builds " * 50)
+
+        stats = indexer.get_stats()
+        for stage in ("load", "fit", "embed", "build_index", "build_bm25", "add_document"):
+            assert stats["stages"][stage]["runs"] >= 1, stage
+        assert stats["counters"]["files_loaded"] == 2
+        assert stats["counters"]["bytes_read"] == sum(
+            os.path.getsize(os.path.join(tmp_dir, name)) for name in ("a.md", "b.md")
+        )
+        assert stats["gauges"]["chunks"] == len(indexer.chunks)
+        assert stats["gauges"]["documents"] == 3
+        assert stats["gauges"]["vocabulary_size"] == indexer.vectorizer.get_vocabulary_size()
+        searches = {entry["labels"]["mode"]: entry["count"] for entry in stats["histograms"]["search"]}
+        assert searches == {"exact": 3, "bm25": 1}
+        assert stats["caches"]["results"]["hits"] == 1
+        assert stats["caches"]["results"]["hit_rate"] == 1 / 4
+
+        assert json.loads(indexer.export_stats("json"))["counters"] == stats["counters"]
+        prometheus = indexer.export_stats("prometheus")
+        assert '# TYPE rag_search_seconds histogram' in prometheus
+        assert 'rag_search_seconds_count{mode="exact"} 3' in prometheus
+        assert 'rag_search_seconds_bucket{mode="exact",le="+Inf"} 3' in prometheus
+        assert 'rag_files_loaded_total 2' in prometheus
+        assert 'rag_cache_hits_total{cache="results"} 1' in prometheus
+
+        indexer.stats.reset()
+        assert indexer.get_stats()["stages"] == {} and indexer.get_stats()["caches"]["results"]["hits"] == 0
+
+    print("[OK] Indexer stats work correctly")
+
+
 def test_chunking():
     """Test text chunking"""
     print("\nTesting text chunking...")
@@ -82,11 +881,69 @@ def test_chunking():
     print(f"[OK] Chunking works correctly ({len(chunks)} chunks for 1500 chars)")
 
 
+def test_streaming_chunker():
+    """Test streaming chunker matches in-memory chunking and reports byte offsets"""
+    print("\nTesting streaming chunker...")
+
+    indexer = DocumentIndexer('.')
+    samples = [
+        "",
+        "short text",
+        "A" * 1500,
+        "Українська документація з прикладами коду. " * 60,
+        "Windows line endings\r\nsecond line\r\n" * 80,
+        "Old Mac\rline endings\r" * 120 + "\r\n",
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'doc.md')
+
+        for sample in samples:
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                f.write(sample)
+            with open(path, 'r', encoding='utf-8') as f:
+                expected = indexer._chunk_text(f.read())
+            with open(path, 'rb') as f:
+                raw = f.read()
+
+            # Tiny blocks put '\r\n' pairs and multi-byte characters across block boundaries
+            for block_size in (7, 64, 65536):
+                chunks = list(iter_file_chunks(path, indexer.CHUNK_SIZE, indexer.CHUNK_OVERLAP, block_size=block_size))
+                assert [chunk.text for chunk in chunks] == expected
+
+                for chunk in chunks:
+                    decoded = raw[chunk.byte_start:chunk.byte_end].decode('utf-8')
+                    assert decoded.replace('\r\n', '\n').replace('\r', '\n') == chunk.text
+
+    print("[OK] Streaming chunker matches in-memory chunking")
+
+
 if __name__ == '__main__':
     try:
         test_vectorizer()
+        test_tokenizer()
+        test_sparse_vectors()
+        test_fit_transform_single_pass()
+        test_transform_batch()
         test_document_indexer()
+        test_search_matches_fallback()
+        test_index_cache()
+        test_incremental_updates()
+        test_mmap_index_file()
+        test_recursive_parallel_loading()
+        test_ann_search()
+        test_bm25_search()
+        test_query_cache()
+        test_search_many()
+        test_hashing_vectorizer()
+        test_retrieve_pipeline()
+        test_metadata_filters()
+        test_metadata_large_file()
+        test_sharded_search()
+        test_benchmark_suite()
+        test_indexer_stats()
         test_chunking()
+        test_streaming_chunker()
         print("\n[PASS] All tests passed!")
     except AssertionError as e:
         print(f"\n[FAIL] Test failed: {e}")
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""Test script for the PR review orchestration with stand-in components"""
+
+import threading
+import time
+
+from claude_reviewer import ReviewOutput
+from mcp_client import FileChange
+from rag_engine import SearchResult
+from review_pr import PRReviewSystem
+
+STAGE_DELAY = 0.1
+
+
+class FakeMcpClient:
+    def __init__(self, healthy=True, diff="diff --git a/app.kt b/app.kt\n+fun main() {}"):
+        self.healthy = healthy
+        self.diff = diff
+
+    def health_check(self):
+        time.sleep(STAGE_DELAY)
+        return self.healthy
+
+    def get_pr_data(self, base, head, filepaths=None, context_lines=3, include_context=True):
+        time.sleep(STAGE_DELAY)
+        assert not include_context, "review_pr does not use the PR context"
+        if self.diff is None:
+            return None
+        return {
+            "diff": self.diff,
+            "changed_files": [FileChange(status="M", filepath="app.kt")],
+            "context": None,
+            "files": {}
+        }
+
+
+class FakeIndexer:
+    def __init__(self):
+        self.indexed = threading.Event()
+        self.queries = None
+
+    def index_documents(self):
+        time.sleep(STAGE_DELAY)
+        self.indexed.set()
+        return 3
+
+    def retrieve(self, queries, top_k=5):
+        assert self.indexed.is_set(), "search must wait for indexing"
+        self.queries = queries
+        return [SearchResult(text="Use Clean Architecture", filename="ARCH.md", chunk_index=0, similarity=0.9, rank=1)]
+
+
+class FakeReviewer:
+    def __init__(self):
+        self.context = None
+
+    def review_code(self, context):
+        self.context = context
+        return ReviewOutput([], [], [], [], [], "Looks good")
+
+    def format_review_markdown(self, review):
+        return f"🤖 AI Code Review\n{review.summary}"
+
+
+class FakeGitHub:
+    def __init__(self, existing_comment=None):
+        self.existing_comment = existing_comment
+        self.posted = []
+
+    def find_bot_comment(self, pr_number):
+        time.sleep(STAGE_DELAY)
+        return self.existing_comment
+
+    def post_pr_comment(self, pr_number, body):
+        self.posted.append(("create", pr_number, body))
+        return True
+
+    def update_pr_comment(self, comment_id, body):
+        self.posted.append(("update", comment_id, body))
+        return True
+
+
+def make_system(mcp_client=None, github_api=None):
+    system = PRReviewSystem("test-token", "test-key", "owner/repo", docs_path="/nonexistent")
+    system.mcp_client = mcp_client or FakeMcpClient()
+    system.rag_indexer = FakeIndexer()
+    system.claude_reviewer = FakeReviewer()
+    system.github_api = github_api or FakeGitHub()
+    return system
+
+
+def test_overlapped_stages():
+    """Test that independent stages overlap and results flow to the dependent stages"""
+    print("\nTesting overlapped review stages...")
+
+    system = make_system(github_api=FakeGitHub(existing_comment=42))
+    start = time.perf_counter()
+    assert system.review_pr(7, "origin/master", "HEAD")
+    elapsed = time.perf_counter() - start
+
+    # Four 0.1s independent stages run together instead of taking 0.4s
+    assert elapsed < 0.3, elapsed
+    assert set(system.stage_timings) == {
+        "health", "pr_data", "index", "comment_lookup", "search", "review", "post"
+    }
+    independent = ["health", "pr_data", "index", "comment_lookup"]
+    assert max(system.stage_timings[name][0] for name in independent) < STAGE_DELAY
+    assert system.stage_timings["search"][0] >= STAGE_DELAY
+
+    assert system.rag_indexer.queries == ["code review best practices", "app.kt"]
+    assert system.claude_reviewer.context.changed_files == ["app.kt"]
+    assert "[ARCH.md]" in system.claude_reviewer.context.relevant_docs[0]
+    assert system.github_api.posted == [("update", 42, "🤖 AI Code Review\nLooks good")]
+
+    print("[OK] Review stages overlap correctly")
+
+
+def test_stage_failures():
+    """Test that failed or empty MCP stages stop the review before the model call"""
+    print("\nTesting review stage failures...")
+
+    system = make_system(mcp_client=FakeMcpClient(healthy=False))
+    assert not system.review_pr(7, "origin/master", "HEAD")
+    assert system.claude_reviewer.context is None
+    assert system.github_api.posted == []
+
+    system = make_system(mcp_client=FakeMcpClient(diff=None))
+    assert not system.review_pr(7, "origin/master", "HEAD")
+    assert system.claude_reviewer.context is None
+
+    system = make_system(mcp_client=FakeMcpClient(diff=""))
+    assert system.review_pr(7, "origin/master", "HEAD")
+    assert system.github_api.posted == []
+
+    # A new comment is created when no bot comment exists
+    system = make_system()
+    assert system.review_pr(7, "origin/master", "HEAD")
+    assert system.github_api.posted[0][:2] == ("create", 7)
+
+    print("[OK] Review stage failures are handled correctly")
+
+
+if __name__ == '__main__':
+    try:
+        test_overlapped_stages()
+        test_stage_failures()
+        print("\n[PASS] All tests passed!")
+    except AssertionError as e:
+        print(f"\n[FAIL] Test failed: {e}")
+        raise
+    except Exception as e:
+        print(f"\n[FAIL] Error: {e}")
+        raise